@@ -0,0 +1,160 @@
+from order_book import OrderBookBase
+from optimized_order import PriceLevels
+from order_store import OrderStore, OrderView
+
+
+class SlotLevels(PriceLevels):
+    """
+    PriceLevels whose levels are intrusive linked lists of store slots instead of dicts:
+    levels maps price -> head slot, tails maps price -> tail slot, and the store's prev/next
+    columns link the slots of a level in time priority. Same heap, dedup and compaction
+    (best_level returns the head slot).
+    """
+
+    def __init__(self, side, store, compact_min=64):
+        super().__init__(side, compact_min=compact_min)
+        self.store = store
+        self.tails = {}
+
+    def link(self, price, slot):
+        tail = self.tails.get(price)
+        if tail is None:
+            self.levels[price] = slot
+            if price not in self._in_heap:
+                self._in_heap.add(price)
+                self._push(price)
+        else:
+            self.store.next_slots[tail] = slot
+            self.store.prev_slots[slot] = tail
+        self.tails[price] = slot
+        self.n_orders += 1
+
+    def unlink(self, price, slot):
+        prev_slots, next_slots = self.store.prev_slots, self.store.next_slots
+        prev, nxt = prev_slots[slot], next_slots[slot]
+        if prev >= 0:
+            next_slots[prev] = nxt
+        else:
+            self.levels[price] = nxt
+        if nxt >= 0:
+            prev_slots[nxt] = prev
+        else:
+            self.tails[price] = prev
+        self.n_orders -= 1
+
+        if prev < 0 and nxt < 0:
+            del self.levels[price]
+            del self.tails[price]
+            if len(self._heap) > 2 * len(self.levels) + self.compact_min:
+                self._compact()
+
+    def slots_at(self, price):
+        slot = self.levels.get(price, -1)
+        next_slots = self.store.next_slots
+        while slot >= 0:
+            yield slot
+            slot = next_slots[slot]
+
+
+class CompactOrderBook(OrderBookBase):
+    """
+    OptimizedOrderBook's price-level heaps on top of an OrderStore: no Order object and no
+    per-level dict, just typed columns, the order_id -> slot index and one head/tail entry per
+    level. lookup_by_id / get_orders_at_price / best_bid / best_ask hand out OrderView objects.
+    """
+
+    def __init__(self):
+        self.store = OrderStore()
+        self.slot_by_id = {}
+
+        self.bids = SlotLevels("bid", self.store)
+        self.asks = SlotLevels("ask", self.store)
+
+    def _side(self, side):
+        if side == "bid":
+            return self.bids
+        if side == "ask":
+            return self.asks
+        raise ValueError(f"Invalid side: {side}")
+
+    def add_order(self, order_dict):
+        order_id = int(order_dict["order_id"])
+        if order_id in self.slot_by_id:
+            raise ValueError(f"Duplicate order_id: {order_id}")
+
+        side = order_dict["side"]
+        book_side = self._side(side)
+        price = float(order_dict["price"])
+        slot = self.store.alloc(order_id, price, int(order_dict["quantity"]), side)
+
+        self.slot_by_id[order_id] = slot
+        book_side.link(price, slot)
+
+    def amend_order(self, order_id, new_quantity):
+        order_id = int(order_id)
+        new_quantity = int(new_quantity)
+
+        slot = self.slot_by_id.get(order_id)
+        if slot is None:
+            return False
+
+        self.store.quantities[slot] = new_quantity
+        if new_quantity <= 0:
+            self.delete_order(order_id)
+        return True
+
+    def delete_order(self, order_id):
+        order_id = int(order_id)
+        slot = self.slot_by_id.pop(order_id, None)
+        if slot is None:
+            return False
+
+        store = self.store
+        (self.bids if store.sides[slot] == 0 else self.asks).unlink(store.prices[slot], slot)
+        store.free(slot)
+        return True
+
+    def lookup_by_id(self, order_id):
+        slot = self.slot_by_id.get(int(order_id))
+        return None if slot is None else OrderView(self.store, slot)
+
+    def get_orders_at_price(self, price, side=None):
+        price = float(price)
+        out = []
+
+        if side is None or side == "bid":
+            out.extend(OrderView(self.store, slot) for slot in self.bids.slots_at(price))
+
+        if side is None or side == "ask":
+            out.extend(OrderView(self.store, slot) for slot in self.asks.slots_at(price))
+
+        return out
+
+    def best_bid(self):
+        slot = self.bids.best_level()
+        return None if slot is None else OrderView(self.store, slot)
+
+    def best_ask(self):
+        slot = self.asks.best_level()
+        return None if slot is None else OrderView(self.store, slot)
+
+    # Live sizes
+    def level_count(self, side=None):
+        if side is None:
+            return len(self.bids) + len(self.asks)
+        return len(self._side(side))
+
+    def order_count(self, side=None):
+        if side is None:
+            return len(self.slot_by_id)
+        return self._side(side).n_orders
+
+    def stats(self):
+        return {
+            "orders": self.order_count(),
+            "levels": self.level_count(),
+            "heap_entries": self.bids.heap_size() + self.asks.heap_size(),
+            "compactions": self.bids.n_compactions + self.asks.n_compactions,
+            "store_slots": self.store.capacity(),
+            "store_bytes": self.store.nbytes(),
+        }
@@ -1,26 +1,52 @@
 import argparse
 import csv
+import gc
+import math
 import os
 import random
+import statistics
 import time
+import tracemalloc
 
 from naive_order import NaiveOrderBook
 from optimized_order import OptimizedOrderBook
+from matching_order import MatchingOrderBook
+from compact_order import CompactOrderBook
+from workload import ADD, CANCEL, AMEND, WorkloadGenerator, parse_mix, read_messages, write_messages
 
 
 # Generate benchmark orders
 class OrderGenerator:
-    def gen_orders(self, n, seed=42):
+    def gen_orders(self, n, seed=42, crossing=True):
+        # crossing=False keeps every bid below every ask (bids in [50, 125), asks in (125, 200]), so a
+        # matching book rests all of them instead of filling the insert / amend / delete workloads
         rng = random.Random(seed)
         orders = []
         for i in range(1, n + 1):
             side = "bid" if (i % 2 == 0) else "ask"
             price = rng.uniform(50.0, 200.0)
+            if not crossing:
+                price = rng.uniform(50.0, 124.99) if side == "bid" else rng.uniform(125.01, 200.0)
             qty = rng.randint(1, 100)
             orders.append({"order_id": i, "price": price, "quantity": qty, "side": side})
         return orders
 
 
+# One benchmark cell: (operation, n)
+class Phase:
+    # setup()          -> fresh state (the book, plus anything the loop mutates); not timed
+    # run(state)       -> all n operations in one inline loop; this is what gets timed
+    # step(state, i)   -> operation i alone; used for per-operation latency histograms
+    # report(state)    -> optional dict of extra result columns, from the state after run
+    def __init__(self, operation, n, setup, run, step, report=None):
+        self.operation = operation
+        self.n = n
+        self.setup = setup
+        self.run = run
+        self.step = step
+        self.report = report
+
+
 # Measure time
 class Timer:
     def timeit(self, fn):
@@ -29,13 +55,107 @@ class Timer:
         t1 = time.perf_counter()
         return t1 - t0
 
+    def repeat(self, phase, repeats=5, warmup=1):
+        # every repetition runs on fresh state; GC is collected before each run so garbage
+        # left by setup / the previous repetition is not charged to this one
+        times = []
+        state = None
+        for r in range(warmup + repeats):
+            state = None  # drop the previous repetition's book before building the next one
+            state = phase.setup()
+            gc.collect()
+            t = self.timeit(lambda: phase.run(state))
+            if r >= warmup:
+                times.append(t)
+        return times, state
+
+
+# Memory and allocations per phase (separate untimed pass: tracemalloc slows everything down)
+class MemoryProfiler:
+    # tracemalloc's own bookkeeping (the snapshots) is not charged to the phase
+    FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+    def profile(self, phase):
+        gc.collect()
+        tracemalloc.start()
+        setup_base = tracemalloc.get_traced_memory()[0]
+        state = phase.setup()
+        before = tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+        run_base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        gc0 = sum(s["collections"] for s in gc.get_stats())
+        phase.run(state)
+        gc1 = sum(s["collections"] for s in gc.get_stats())
+
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+        tracemalloc.stop()
+
+        # net live-block change per allocation site (file:line), split into sites that grew and sites
+        # that shrank, so growth in one place is not cancelled by frees elsewhere. A freed block counts
+        # against the site that allocated it, so blocks allocated and freed within the run cancel out
+        # (they only show up in peak_bytes); tracemalloc keeps no cumulative allocation count.
+        diff = after.compare_to(before, "lineno")
+        return {
+            "setup_bytes": run_base - setup_base,          # state before the run (e.g. the prefilled book)
+            "peak_bytes": peak - run_base,                 # high-water mark above that during the run
+            "net_bytes": current - run_base,               # still held after the run
+            "site_net_alloc_blocks": sum(d.count_diff for d in diff if d.count_diff > 0),
+            "site_net_freed_blocks": -sum(d.count_diff for d in diff if d.count_diff < 0),
+            "gc_collections": gc1 - gc0,
+        }
+
+
+# Per-operation latency histograms (separate pass: the per-call timer adds its own overhead)
+class LatencyRecorder:
+    # log2 buckets in ns: bucket k holds latencies in [2^k, 2^(k+1))
+    def __init__(self, max_samples=200000):
+        self.max_samples = max_samples
+
+    def record(self, phase):
+        state = phase.setup()
+        m = min(phase.n, self.max_samples) if self.max_samples else phase.n
+        clock = time.perf_counter_ns
+        step = phase.step
+        lat = [0] * m
+        gc.collect()
+        for i in range(m):
+            t0 = clock()
+            step(state, i)
+            lat[i] = clock() - t0
+
+        hist = {}
+        for v in lat:
+            k = v.bit_length() - 1 if v > 0 else 0
+            hist[k] = hist.get(k, 0) + 1
+        lat.sort()
+        return {
+            "samples": m,
+            "lat_p50_ns": lat[m // 2] if m else math.nan,
+            "lat_p99_ns": lat[min(m - 1, int(0.99 * m))] if m else math.nan,
+            "lat_max_ns": lat[-1] if m else math.nan,
+        }, hist
+
+
+def percentile(xs, q):
+    # linear interpolation between closest ranks (same as numpy's default)
+    s = sorted(xs)
+    if not s:
+        return math.nan
+    pos = (len(s) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
 
 # Save results
 class CsvWriter:
     def save(self, rows, path):
-        fieldnames = list(rows[0].keys())
+        # union of the row keys in first-seen order (some operations carry extra columns)
+        fieldnames = list(dict.fromkeys(k for r in rows for k in r))
         with open(path, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=fieldnames)
+            w = csv.DictWriter(f, fieldnames=fieldnames, restval="")
             w.writeheader()
             for r in rows:
                 w.writerow(r)
@@ -48,214 +168,473 @@ class OrderBookFactory:
             return NaiveOrderBook
         if mode == "optimized":
             return OptimizedOrderBook
+        if mode == "matching":
+            return MatchingOrderBook
+        if mode == "compact":
+            return CompactOrderBook
         raise ValueError(f"Invalid mode: {mode}")
 
 
 # Benchmark book operations
 class BenchmarkRunner:
-    def __init__(self, book_cls, orders, timer):
+    def __init__(self, book_cls, orders, timer, repeats=1, warmup=0, memory=None, latency=None):
         self.book_cls = book_cls
         self.orders = orders
         self.timer = timer
+        self.repeats = repeats
+        self.warmup = warmup
+        self.memory = memory
+        self.latency = latency
+        self.histograms = []  # (operation, n, {bucket: count}) of the latency passes
+
+    def _filled_book(self, n):
+        book = self.book_cls()
+        for i in range(n):
+            book.add_order(self.orders[i])
+        return book
+
+    # Time (and optionally profile) one phase
+    def measure(self, phase):
+        n = phase.n
+        times, state = self.timer.repeat(phase, repeats=self.repeats, warmup=self.warmup)
+        median = statistics.median(times)
+        res = {
+            "total_sec": median,
+            "avg_sec": median / n if n > 0 else float("nan"),
+            "p95_sec": percentile(times, 0.95),
+            "min_sec": min(times),
+            "stdev_sec": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "repeats": len(times),
+        }
+        if phase.report is not None:
+            res.update(phase.report(state))
+        del state
+
+        if self.memory is not None:
+            res.update(self.memory.profile(phase))
+        if self.latency is not None:
+            lat, hist = self.latency.record(phase)
+            res.update(lat)
+            self.histograms.append((phase.operation, n, hist))
+        return res
 
     # Benchmark insert
     def benchmark_insert(self, n):
-        book = self.book_cls()
+        orders = self.orders
 
-        def run():
+        def run(book):
             for i in range(n):
-                book.add_order(self.orders[i])
+                book.add_order(orders[i])
+
+        def step(book, i):
+            book.add_order(orders[i])
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        phase = Phase("insert", n, self.book_cls, run, step)
+        res = self.measure(phase)
+        # memory per resting order is always reported for insert (own tracemalloc pass if not profiling)
+        mem = res if "net_bytes" in res else MemoryProfiler().profile(phase)
+        res["bytes_per_order"] = mem["net_bytes"] / n if n > 0 else float("nan")
+        return res
 
     # Benchmark amend
     def benchmark_amend(self, n, seed=123):
         # before amending order, we need to add order first
-        book = self.book_cls()
-        for i in range(n):
-            book.add_order(self.orders[i])
-
         rng = random.Random(seed)
         order_ids = [self.orders[i]["order_id"] for i in range(n)]
+        # pre-drawn, so every repetition replays the same amends and the RNG is not timed
+        oids = [rng.choice(order_ids) for _ in range(n)]
+        qtys = [rng.randint(1, 100) for _ in range(n)]
 
         # amend order
-        def run():
-            for _ in range(n):
-                oid = rng.choice(order_ids)
-                new_qty = rng.randint(1, 100)
+        def run(book):
+            for oid, new_qty in zip(oids, qtys):
                 book.amend_order(oid, new_qty)
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        def step(book, i):
+            book.amend_order(oids[i], qtys[i])
+
+        return self.measure(Phase("amend", n, lambda: self._filled_book(n), run, step))
 
     # Benchmark delete
     def benchmark_delete(self, n, seed=999):
         # before deleting order, we need to add order first
-        book = self.book_cls()
-        for i in range(n):
-            book.add_order(self.orders[i])
-
         rng = random.Random(seed)
         order_ids = [self.orders[i]["order_id"] for i in range(n)]
 
         # the order id should be randomly shuffle
         rng.shuffle(order_ids)
 
-        def run():
+        def run(book):
             for oid in order_ids:
                 book.delete_order(oid)
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        def step(book, i):
+            book.delete_order(order_ids[i])
+
+        return self.measure(Phase("delete", n, lambda: self._filled_book(n), run, step))
 
     # Benchmark lookup_by_id
     def benchmark_lookup(self, n, seed=777):
-        book = self.book_cls()
-        for i in range(n):
-            book.add_order(self.orders[i])
-
         rng = random.Random(seed)
         order_ids = [self.orders[i]["order_id"] for i in range(n)]
+        oids = [rng.choice(order_ids) for _ in range(n)]
 
-        def run():
-            for _ in range(n):
-                oid = rng.choice(order_ids)
+        def run(book):
+            for oid in oids:
                 book.lookup_by_id(oid)
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        def step(book, i):
+            book.lookup_by_id(oids[i])
+
+        return self.measure(Phase("lookup_by_id", n, lambda: self._filled_book(n), run, step))
 
     # Benchmark get_orders_at_price
     def benchmark_retrieve_price(self, n, seed=888):
-        book = self.book_cls()
-        for i in range(n):
-            book.add_order(self.orders[i])
-
         rng = random.Random(seed)
 
         # Sample prices that actually exist in the book (from the inserted orders)
         prices = [self.orders[i]["price"] for i in range(n)]
         sides = [None, "bid", "ask"]
+        queries = [(rng.choice(prices), rng.choice(sides)) for _ in range(n)]
 
-        def run():
-            for _ in range(n):
-                p = rng.choice(prices)
-                s = rng.choice(sides)
+        def run(book):
+            for p, s in queries:
                 book.get_orders_at_price(p, side=s)
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        def step(book, i):
+            p, s = queries[i]
+            book.get_orders_at_price(p, side=s)
+
+        return self.measure(Phase("get_orders_at_price", n, lambda: self._filled_book(n), run, step))
 
     # Benchmark best_bid
     def benchmark_best_bid(self, n):
-        book = self.book_cls()
-        for i in range(n):
-            book.add_order(self.orders[i])
-
-        def run():
+        def run(book):
             for _ in range(n):
                 book.best_bid()
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        def step(book, i):
+            book.best_bid()
+
+        return self.measure(Phase("best_bid", n, lambda: self._filled_book(n), run, step))
 
     # Benchmark best_ask
     def benchmark_best_ask(self, n):
-        book = self.book_cls()
-        for i in range(n):
-            book.add_order(self.orders[i])
-
-        def run():
+        def run(book):
             for _ in range(n):
                 book.best_ask()
 
-        total = self.timer.timeit(run)
-        avg = total / n if n > 0 else float("nan")
-        return total, avg
+        def step(book, i):
+            book.best_ask()
+
+        return self.measure(Phase("best_ask", n, lambda: self._filled_book(n), run, step))
+
+    # Benchmark add/delete churn
+    def benchmark_churn(self, n, depth=1000, seed=321):
+        # the book holds `depth` live orders on a 0.01 tick grid around a drifting mid; each step adds
+        # one order, deletes a random live one and reads the top of book, so price levels keep
+        # appearing and disappearing (what makes stale heap entries pile up)
+        rng = random.Random(seed)
+        state = {"mid": 100.0, "next_id": len(self.orders) + 1}
+
+        def new_order():
+            state["mid"] += rng.gauss(0.0, 0.01)
+            side = "bid" if rng.random() < 0.5 else "ask"
+            offset = abs(rng.gauss(0.0, 0.5))
+            price = round(state["mid"] - offset if side == "bid" else state["mid"] + offset, 2)
+            o = {"order_id": state["next_id"], "price": price, "quantity": rng.randint(1, 100), "side": side}
+            state["next_id"] += 1
+            return o
+
+        # pre-draw the prefill and the workload so the timed loop only touches the book
+        prefill = [new_order() for _ in range(depth)]
+        adds = [new_order() for _ in range(n)]
+        picks = [rng.random() for _ in range(n)]
+
+        def setup():
+            book = self.book_cls()
+            for o in prefill:
+                book.add_order(o)
+            return book, [o["order_id"] for o in prefill]
+
+        def run(st):
+            book, live = st
+            for o, u in zip(adds, picks):
+                book.add_order(o)
+                live.append(o["order_id"])
+                j = int(u * len(live))
+                live[j], live[-1] = live[-1], live[j]
+                book.delete_order(live.pop())
+                book.best_bid()
+                book.best_ask()
+
+        def step(st, i):
+            book, live = st
+            book.add_order(adds[i])
+            live.append(adds[i]["order_id"])
+            j = int(picks[i] * len(live))
+            live[j], live[-1] = live[-1], live[j]
+            book.delete_order(live.pop())
+            book.best_bid()
+            book.best_ask()
+
+        def report(st):
+            book = st[0]
+            return book.stats() if hasattr(book, "stats") else {}
+
+        return self.measure(Phase("churn", n, setup, run, step, report))
+
+    # Benchmark matching throughput (matching books only)
+    def benchmark_matching(self, n, seed=654):
+        # message stream around a drifting mid: 60% limit orders (about a third priced through the
+        # opposite best, so they cross), 10% market orders, 20% cancels and 10% amends of recently
+        # submitted ids (some already filled, like real cancel/fill races)
+        rng = random.Random(seed)
+        mid = 100.0
+        next_id = len(self.orders) + 1
+        recent = []
+
+        msgs = []
+        for _ in range(n):
+            u = rng.random()
+            if u < 0.7 or not recent:
+                mid += rng.gauss(0.0, 0.01)
+                side = "bid" if rng.random() < 0.5 else "ask"
+                o = {"order_id": next_id, "quantity": rng.randint(1, 100), "side": side}
+                if u < 0.6 or not recent:
+                    offset = rng.gauss(0.1, 0.2)  # < 0: priced through the mid
+                    o["price"] = round(mid - offset if side == "bid" else mid + offset, 2)
+                else:
+                    o["type"] = "market"
+                msgs.append((0, o, None))
+                recent.append(next_id)
+                if len(recent) > 1000:
+                    recent.pop(0)
+                next_id += 1
+            elif u < 0.9:
+                msgs.append((1, rng.choice(recent), None))
+            else:
+                msgs.append((2, rng.choice(recent), rng.randint(1, 100)))
+
+        def run(book):
+            for kind, a, b in msgs:
+                if kind == 0:
+                    book.add_order(a)
+                elif kind == 1:
+                    book.delete_order(a)
+                else:
+                    book.amend_order(a, b)
+
+        def step(book, i):
+            kind, a, b = msgs[i]
+            if kind == 0:
+                book.add_order(a)
+            elif kind == 1:
+                book.delete_order(a)
+            else:
+                book.amend_order(a, b)
+
+        def report(book):
+            return {"trades": book.trade_count, **book.stats()}
+
+        res = self.measure(Phase("match", n, self.book_cls, run, step, report))
+        res["msgs_per_sec"] = n / res["total_sec"] if res["total_sec"] > 0 else float("nan")
+        return res
+
+    # Benchmark an interleaved workload (generated or replayed message stream)
+    def benchmark_mixed(self, n, workload):
+        # the first n messages of the stream on a book holding the workload's prefill;
+        # adds, cancels, amends and top-of-book reads are dispatched in stream order
+        prefill = workload.prefill
+        msgs = workload.messages[:n]
+
+        def setup():
+            book = self.book_cls()
+            for o in prefill:
+                book.add_order(o)
+            return book
+
+        def run(book):
+            for kind, a, b in msgs:
+                if kind == ADD:
+                    book.add_order(a)
+                elif kind == CANCEL:
+                    book.delete_order(a)
+                elif kind == AMEND:
+                    book.amend_order(a, b)
+                else:
+                    book.best_bid()
+                    book.best_ask()
+
+        def step(book, i):
+            kind, a, b = msgs[i]
+            if kind == ADD:
+                book.add_order(a)
+            elif kind == CANCEL:
+                book.delete_order(a)
+            elif kind == AMEND:
+                book.amend_order(a, b)
+            else:
+                book.best_bid()
+                book.best_ask()
+
+        def report(book):
+            return book.stats() if hasattr(book, "stats") else {}
+
+        res = self.measure(Phase("mixed", len(msgs), setup, run, step, report))
+        res.update({f"n_{name}": c for name, c in workload.counts(n).items()})
+        if not getattr(self.book_cls, "matching", False):
+            # replayed without a book, so fills are not seen: meaningless for a matching book
+            res.update(workload.level_profile(n))
+        res["msgs_per_sec"] = len(msgs) / res["total_sec"] if res["total_sec"] > 0 else float("nan")
+        return res
 
 
 # Benchmark
 class Benchmark:
-    def __init__(self, book_mode, include_queries=False):
+    def __init__(self, book_mode, include_queries=False, churn_depth=1000, ns=None,
+                 repeats=5, warmup=1, profile_memory=False, latency=False, latency_samples=200000,
+                 workload="isolated", replay=None, record=None, mix=None, tick=0.01, depth=1000):
         self.book_mode = book_mode
         self.include_queries = include_queries
+        self.churn_depth = churn_depth
+        self.ns = ns or [10, 100, 1000, 10000, 100000, 1000000]
+        if repeats < 1:
+            raise ValueError(f"Invalid repeats: {repeats} (need at least one timed repetition)")
+        if warmup < 0:
+            raise ValueError(f"Invalid warmup: {warmup}")
+        self.repeats = repeats
+        self.warmup = warmup
+        self.workload = "mixed" if replay else workload
+        self.replay = replay
+        self.record = record
+        self.depth = depth
+        self.workload_generator = WorkloadGenerator(tick=tick, mix=mix)
 
         self.generator = OrderGenerator()
         self.timer = Timer()
         self.writer = CsvWriter()
         self.factory = OrderBookFactory()
+        self.memory = MemoryProfiler() if profile_memory else None
+        self.latency = LatencyRecorder(max_samples=latency_samples) if latency else None
+
+    def _fmt(self, res):
+        s = f"{res['total_sec']:.6f}s (p95 {res['p95_sec']:.6f}s)"
+        if "peak_bytes" in res:
+            s += f" peak={res['peak_bytes'] / 1e6:.1f}MB site net blocks=+{res['site_net_alloc_blocks']}/-{res['site_net_freed_blocks']} gc={res['gc_collections']}"
+        if "lat_p50_ns" in res:
+            s += f" lat p50/p99={res['lat_p50_ns']}/{res['lat_p99_ns']}ns"
+        return s
+
+    def _load_workload(self, n_max):
+        if self.replay:
+            workload = read_messages(self.replay)
+            print(f"Replaying {len(workload)} messages ({len(workload.prefill)} prefill) from {os.path.basename(self.replay)}")
+        else:
+            workload = self.workload_generator.generate(n_max, depth=self.depth, seed=2024)
+        if self.record:
+            write_messages(workload, self.record)
+            print(f"Workload recorded to: {self.record}")
+        return workload
 
     def run(self):
-        ns = [10, 100, 1000, 10000, 100000, 1000000]
-        orders = self.generator.gen_orders(max(ns), seed=42)
-
+        ns = self.ns
         book_cls = self.factory.create(self.book_mode)
-        runner = BenchmarkRunner(book_cls=book_cls, orders=orders, timer=self.timer)
-
         rows = []
-        insert_total = []
-        amend_total = []
-        delete_total = []
 
-        lookup_total = []
-        retrieve_total = []
-        best_bid_total = []
-        best_ask_total = []
+        def add_row(operation, n, res):
+            rows.append({"method": self.book_mode, "operation": operation, "n": n, **res})
+            return res
 
-        for n in ns:
-            total, avg = runner.benchmark_insert(n)
-            insert_total.append(total)
-            rows.append({"method": self.book_mode, "operation": "insert", "n": n, "total_sec": total, "avg_sec": avg})
-
-            total, avg = runner.benchmark_amend(n, seed=123)
-            amend_total.append(total)
-            rows.append({"method": self.book_mode, "operation": "amend", "n": n, "total_sec": total, "avg_sec": avg})
-
-            total, avg = runner.benchmark_delete(n, seed=456)
-            delete_total.append(total)
-            rows.append({"method": self.book_mode, "operation": "delete", "n": n, "total_sec": total, "avg_sec": avg})
-
-            print(
-                f"[{self.book_mode} n={n}] "
-                f"insert={insert_total[-1]:.6f}s | amend={amend_total[-1]:.6f}s | delete={delete_total[-1]:.6f}s"
+        if self.workload == "mixed":
+            workload = self._load_workload(max(ns))
+            runner = BenchmarkRunner(
+                book_cls=book_cls, orders=[], timer=self.timer,
+                repeats=self.repeats, warmup=self.warmup, memory=self.memory, latency=self.latency,
             )
+            # a replay file may be shorter than the requested sizes: run what it has once
+            ns = sorted({min(n, len(workload)) for n in ns if len(workload)})
+            for n in ns:
+                res = add_row("mixed", n, runner.benchmark_mixed(n, workload))
+                print(f"[{self.book_mode} mixed n={n}]")
+                print(
+                    f"    {res['msgs_per_sec']:,.0f} msgs/sec | {self._fmt(res)}\n"
+                    f"    adds={res['n_add']} cancels={res['n_cancel']} amends={res['n_amend']} tops={res['n_top']} | "
+                    f"book: live orders={res['orders']} levels={res['levels']}"
+                )
+                if "stream_max_queue" in res:
+                    print(
+                        f"    stream queue shape (before fills): max queue={res['stream_max_queue']} "
+                        f"top10 share={res['stream_top10_share']:.2f}"
+                    )
+            self._save(rows, runner, suffix="_mixed")
+            return
+
+        matching = getattr(book_cls, "matching", False)
+        orders = self.generator.gen_orders(max(ns), seed=42, crossing=not matching)
+        runner = BenchmarkRunner(
+            book_cls=book_cls, orders=orders, timer=self.timer,
+            repeats=self.repeats, warmup=self.warmup, memory=self.memory, latency=self.latency,
+        )
 
-            if self.include_queries:
-                total, avg = runner.benchmark_lookup(n, seed=777)
-                lookup_total.append(total)
-                rows.append({"method": self.book_mode, "operation": "lookup_by_id", "n": n, "total_sec": total, "avg_sec": avg})
-
-                total, avg = runner.benchmark_retrieve_price(n, seed=888)
-                retrieve_total.append(total)
-                rows.append({"method": self.book_mode, "operation": "get_orders_at_price", "n": n, "total_sec": total, "avg_sec": avg})
-
-                total, avg = runner.benchmark_best_bid(n)
-                best_bid_total.append(total)
-                rows.append({"method": self.book_mode, "operation": "best_bid", "n": n, "total_sec": total, "avg_sec": avg})
+        for n in ns:
+            ins = add_row("insert", n, runner.benchmark_insert(n))
+            amd = add_row("amend", n, runner.benchmark_amend(n, seed=123))
+            dlt = add_row("delete", n, runner.benchmark_delete(n, seed=456))
+
+            print(f"[{self.book_mode} n={n}]")
+            print(f"    insert={self._fmt(ins)} ({ins['bytes_per_order']:.0f} B/order)")
+            print(f"    amend ={self._fmt(amd)}")
+            print(f"    delete={self._fmt(dlt)}")
+
+            # churn prices follow a drifting mid and would cross on a matching book; its interleaved
+            # add / cancel flow is measured by the match operation instead
+            if not matching:
+                chn = add_row("churn", n, runner.benchmark_churn(n, depth=self.churn_depth, seed=321))
+                print(f"    churn ={self._fmt(chn)}")
+                if "heap_entries" in chn:
+                    print(
+                        f"    churn book: orders={chn['orders']} levels={chn['levels']} "
+                        f"heap_entries={chn['heap_entries']} compactions={chn['compactions']}"
+                    )
+
+            if matching:
+                res = add_row("match", n, runner.benchmark_matching(n, seed=654))
+                print(
+                    f"    matching: {res['msgs_per_sec']:,.0f} msgs/sec | trades={res['trades']} | "
+                    f"resting orders={res['orders']} levels={res['levels']} | {self._fmt(res)}"
+                )
 
-                total, avg = runner.benchmark_best_ask(n)
-                best_ask_total.append(total)
-                rows.append({"method": self.book_mode, "operation": "best_ask", "n": n, "total_sec": total, "avg_sec": avg})
+            if self.include_queries:
+                lkp = add_row("lookup_by_id", n, runner.benchmark_lookup(n, seed=777))
+                ret = add_row("get_orders_at_price", n, runner.benchmark_retrieve_price(n, seed=888))
+                bb = add_row("best_bid", n, runner.benchmark_best_bid(n))
+                ba = add_row("best_ask", n, runner.benchmark_best_ask(n))
 
                 print(
-                    f"    queries: lookup={lookup_total[-1]:.6f}s | "
-                    f"retrieve={retrieve_total[-1]:.6f}s | "
-                    f"best_bid={best_bid_total[-1]:.6f}s | best_ask={best_ask_total[-1]:.6f}s"
+                    f"    queries: lookup={lkp['total_sec']:.6f}s | "
+                    f"retrieve={ret['total_sec']:.6f}s | "
+                    f"best_bid={bb['total_sec']:.6f}s | best_ask={ba['total_sec']:.6f}s"
                 )
 
+        self._save(rows, runner)
+
+    def _save(self, rows, runner, suffix=""):
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        results_csv = os.path.join(base_dir, f"benchmark_results_{self.book_mode}.csv")
+        results_csv = os.path.join(base_dir, f"benchmark_results_{self.book_mode}{suffix}.csv")
         self.writer.save(rows, results_csv)
-
         print(f"Results save to: {os.path.basename(results_csv)}")
 
+        if runner.histograms:
+            hist_rows = [
+                {"method": self.book_mode, "operation": op, "n": n, "bucket_lo_ns": 1 << k, "bucket_hi_ns": 1 << (k + 1), "count": c}
+                for op, n, hist in runner.histograms
+                for k, c in sorted(hist.items())
+            ]
+            hist_csv = os.path.join(base_dir, f"latency_hist_{self.book_mode}{suffix}.csv")
+            self.writer.save(hist_rows, hist_csv)
+            print(f"Latency histograms save to: {os.path.basename(hist_csv)}")
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -263,8 +642,8 @@ def main():
         "--book",
         type=str,
         default="naive",
-        choices=["naive", "optimized"],
-        help="choose method: naive or optimized"
+        choices=["naive", "optimized", "matching", "compact"],
+        help="choose method: naive, optimized, matching (optimized + order matching) or compact (typed-array order store)"
     )
     parser.add_argument(
         "--include-queries",
@@ -272,9 +651,70 @@ def main():
         default="True",
         help="benchmark lookup_by_id / get_orders_at_price / best_bid / best_ask"
     )
+    parser.add_argument(
+        "--churn-depth",
+        type=int,
+        default=1000,
+        help="live orders kept in the book during the churn benchmark"
+    )
+    parser.add_argument(
+        "--ns",
+        type=str,
+        default="10,100,1000,10000,100000,1000000",
+        help="comma-separated workload sizes"
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="timed repetitions per (operation, n), at least 1; reports median / p95. "
+                        "Every phase runs warmup + repeats times, so the defaults take ~6x as long as a single pass "
+                        "(use --repeats 1 --warmup 0 for a quick run)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed repetitions before the timed ones")
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="extra tracemalloc pass per phase: peak / net bytes, net live blocks per allocation site (+grown / -shrunk), GC collections"
+    )
+    parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="extra pass timing every operation individually; writes latency_hist_<book>.csv"
+    )
+    parser.add_argument("--latency-samples", type=int, default=200000, help="max operations timed per latency pass (0 = all)")
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default="isolated",
+        choices=["isolated", "mixed"],
+        help="isolated: one phase per operation on uniform random orders; "
+             "mixed: one interleaved add/cancel/amend/top-of-book stream on a tick grid around a drifting mid"
+    )
+    parser.add_argument("--replay", type=str, default=None, help="replay a recorded message CSV instead of generating (implies --workload mixed)")
+    parser.add_argument("--record", type=str, default=None, help="write the mixed workload's messages to this CSV")
+    parser.add_argument(
+        "--mix",
+        type=str,
+        default="add=0.4,cancel=0.4,amend=0.1,top=0.1",
+        help="message mix weights of the generated mixed workload"
+    )
+    parser.add_argument("--tick", type=float, default=0.01, help="tick size of the generated mixed workload")
+    parser.add_argument("--depth", type=int, default=1000, help="orders resting in the book before the mixed workload starts")
     args = parser.parse_args()
 
-    app = Benchmark(book_mode=args.book, include_queries=args.include_queries)
+    app = Benchmark(
+        book_mode=args.book,
+        include_queries=args.include_queries,
+        churn_depth=args.churn_depth,
+        ns=[int(x) for x in args.ns.split(",") if x.strip()],
+        repeats=args.repeats,
+        warmup=args.warmup,
+        profile_memory=args.profile_memory,
+        latency=args.latency,
+        latency_samples=args.latency_samples,
+        workload=args.workload,
+        replay=args.replay,
+        record=args.record,
+        mix=parse_mix(args.mix),
+        tick=args.tick,
+        depth=args.depth,
+    )
     app.run()
 
 
@@ -0,0 +1,81 @@
+from order import Order, Trade
+from optimized_order import OptimizedOrderBook
+
+
+class MatchingOrderBook(OptimizedOrderBook):
+    """
+    OptimizedOrderBook that matches incoming orders (price-time priority) instead of only resting them.
+
+    - Limit order: trades against the opposite side while the best price is at or better than its
+      limit (bid >= ask), best price first and oldest order first within a level; every fill is
+      executed at the resting order's price. The unfilled remainder rests on the book.
+    - Market order ("type": "market", price optional): trades against the opposite side at any price;
+      the unfilled remainder is cancelled, market orders never rest.
+    - add_order returns the Trade records of the fills (empty list if nothing crossed).
+    - Fully filled resting orders leave the book (lookup_by_id -> None); partially filled ones keep
+      their remaining quantity, so lookup_by_id / amend_order always see the live remainder.
+    """
+
+    matching = True
+
+    def __init__(self):
+        super().__init__()
+        self.next_trade_id = 1
+        self.trade_count = 0
+        self.traded_volume = 0
+
+    def add_order(self, order_dict):
+        order_id = int(order_dict["order_id"])
+        if order_id in self.orders_by_id:
+            raise ValueError(f"Duplicate order_id: {order_id}")
+
+        side = order_dict["side"]
+        if side not in ("bid", "ask"):
+            raise ValueError(f"Invalid side: {side}")
+        order_type = order_dict.get("type", "limit")
+        if order_type not in ("limit", "market"):
+            raise ValueError(f"Invalid order type: {order_type}")
+
+        quantity = int(order_dict["quantity"])
+        limit = None if order_type == "market" else float(order_dict["price"])
+
+        trades = self._match(order_id, side, quantity, limit)
+        remaining = quantity - sum(t.quantity for t in trades)
+
+        if limit is not None and remaining > 0:
+            o = Order(order_id=order_id, price=limit, quantity=remaining, side=side)
+            self.orders_by_id[order_id] = o
+            (self.bids if side == "bid" else self.asks).add(limit, order_id, o)
+        return trades
+
+    def _match(self, order_id, side, quantity, limit):
+        # incoming bid takes from the asks (lowest first), incoming ask from the bids (highest first)
+        book_side = self.asks if side == "bid" else self.bids
+        trades = []
+        while quantity > 0:
+            level = book_side.best_level()
+            if level is None:
+                break
+            resting = next(iter(level.values()))
+            price = resting.price
+            if limit is not None and (price > limit if side == "bid" else price < limit):
+                break
+
+            # walk the level in time priority
+            while quantity > 0 and level:
+                resting = next(iter(level.values()))
+                fill = min(quantity, resting.quantity)
+                quantity -= fill
+                resting.quantity -= fill
+                if side == "bid":
+                    trades.append(Trade(self.next_trade_id, price, fill, order_id, resting.order_id, side))
+                else:
+                    trades.append(Trade(self.next_trade_id, price, fill, resting.order_id, order_id, side))
+                self.next_trade_id += 1
+                self.trade_count += 1
+                self.traded_volume += fill
+
+                if resting.quantity <= 0:
+                    del self.orders_by_id[resting.order_id]
+                    book_side.remove(price, resting.order_id)  # drops the level once it is empty
+        return trades
@@ -97,3 +97,9 @@ class NaiveOrderBook(OrderBookBase):
         if not self.asks:
             return None
         return self.asks[0]
+
+    def stats(self):
+        return {
+            "orders": len(self.bids) + len(self.asks),
+            "levels": len({o.price for o in self.bids}) + len({o.price for o in self.asks}),
+        }
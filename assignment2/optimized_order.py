@@ -3,19 +3,109 @@ from order import Order
 from order_book import OrderBookBase
 
 
+class PriceLevels:
+    """
+    Live price levels of one side: price -> {order_id: item} (dict order = time priority),
+    plus a heap of level prices for best-price queries. The item is whatever the book stores
+    per order (an Order here, a store slot in CompactOrderBook).
+
+    - A price is pushed only if it is not already in the heap, so re-adding a price whose
+      old entry is still there (stale) revives that entry instead of duplicating it.
+    - Entries of removed levels are popped lazily when they reach the top. If stale entries
+      ever outnumber live levels (and the heap is past `compact_min`), the heap is rebuilt
+      from the live prices, so its size stays below 2 * live levels + compact_min.
+      Each rebuild is paid for by the deletions that made the entries stale, so updates and
+      top-of-book queries are O(1) amortized on top of the O(log L) push.
+    """
+
+    def __init__(self, side, compact_min=64):
+        if side not in ("bid", "ask"):
+            raise ValueError(f"Invalid side: {side}")
+        self.side = side
+        self._sign = -1.0 if side == "bid" else 1.0  # min-heap of sign * price
+        self.levels = {}
+        self._heap = []
+        self._in_heap = set()
+        self.compact_min = int(compact_min)
+        self.n_orders = 0
+        self.n_compactions = 0
+
+    def __len__(self):
+        return len(self.levels)
+
+    def get(self, price):
+        return self.levels.get(price)
+
+    def add(self, price, order_id, item):
+        level = self.levels.get(price)
+        if level is None:
+            level = self.levels[price] = {}
+            if price not in self._in_heap:
+                self._in_heap.add(price)
+                self._push(price)
+        level[order_id] = item
+        self.n_orders += 1
+
+    def remove(self, price, order_id):
+        levels = self.levels
+        level = levels.get(price)
+        if level is None or level.pop(order_id, None) is None:
+            return False
+        self.n_orders -= 1
+        if not level:
+            del levels[price]
+            if len(self._heap) > 2 * len(levels) + self.compact_min:
+                self._compact()
+        return True
+
+    def _push(self, price):
+        heapq.heappush(self._heap, self._sign * price)
+
+    def _compact(self):
+        self._heap = [self._sign * p for p in self.levels]
+        heapq.heapify(self._heap)
+        self._in_heap = set(self.levels)
+        self.n_compactions += 1
+
+    def best_level(self):
+        heap = self._heap
+        levels = self.levels
+        while heap:
+            price = self._sign * heap[0]
+            level = levels.get(price)
+            if level is not None:
+                return level
+            heapq.heappop(heap)
+            self._in_heap.discard(price)
+        return None
+
+    def best_price(self):
+        heap = self._heap
+        while heap:
+            price = self._sign * heap[0]
+            if price in self.levels:
+                return price
+            heapq.heappop(heap)
+            self._in_heap.discard(price)
+        return None
+
+    def heap_size(self):
+        return len(self._heap)
+
+
 class OptimizedOrderBook(OrderBookBase):
     def __init__(self):
         self.orders_by_id = {}
 
-        self.price_levels = {}
-
-        self._bid_heap = []  # store -price
-        self._ask_heap = []  # store +price
+        self.bids = PriceLevels("bid")
+        self.asks = PriceLevels("ask")
 
-    def _key(self, side, price):
-        if side not in ("bid", "ask"):
-            raise ValueError(f"Invalid side: {side}")
-        return (side, price)
+    def _side(self, side):
+        if side == "bid":
+            return self.bids
+        if side == "ask":
+            return self.asks
+        raise ValueError(f"Invalid side: {side}")
 
     def add_order(self, order_dict):
         order_id = int(order_dict["order_id"])
@@ -28,23 +118,15 @@ class OptimizedOrderBook(OrderBookBase):
             quantity=int(order_dict["quantity"]),
             side=order_dict["side"],
         )
-        if o.side not in ("bid", "ask"):
+        if o.side == "bid":
+            book_side = self.bids
+        elif o.side == "ask":
+            book_side = self.asks
+        else:
             raise ValueError(f"Invalid side: {o.side}")
 
         self.orders_by_id[order_id] = o
-
-        k = self._key(o.side, o.price)
-        level = self.price_levels.get(k)
-
-        if level is None:
-            level = {}
-            self.price_levels[k] = level
-            if o.side == "bid":
-                heapq.heappush(self._bid_heap, -o.price)
-            else:
-                heapq.heappush(self._ask_heap, o.price)
-
-        level[order_id] = o
+        book_side.add(o.price, order_id, o)
 
     def amend_order(self, order_id, new_quantity):
         order_id = int(order_id)
@@ -61,19 +143,11 @@ class OptimizedOrderBook(OrderBookBase):
 
     def delete_order(self, order_id):
         order_id = int(order_id)
-        o = self.orders_by_id.get(order_id)
+        o = self.orders_by_id.pop(order_id, None)
         if o is None:
             return False
 
-        k = self._key(o.side, o.price)
-        level = self.price_levels.get(k)
-
-        if level is not None and order_id in level:
-            del level[order_id]
-            if not level:
-                del self.price_levels[k]
-
-        del self.orders_by_id[order_id]
+        (self.bids if o.side == "bid" else self.asks).remove(o.price, order_id)
         return True
 
     def lookup_by_id(self, order_id):
@@ -84,31 +158,40 @@ class OptimizedOrderBook(OrderBookBase):
         out = []
 
         if side is None or side == "bid":
-            lvl = self.price_levels.get(("bid", price))
+            lvl = self.bids.get(price)
             if lvl:
                 out.extend(lvl.values())
 
         if side is None or side == "ask":
-            lvl = self.price_levels.get(("ask", price))
+            lvl = self.asks.get(price)
             if lvl:
                 out.extend(lvl.values())
 
         return out
 
     def best_bid(self):
-        while self._bid_heap:
-            price = -self._bid_heap[0]
-            lvl = self.price_levels.get(("bid", price))
-            if lvl:
-                return next(iter(lvl.values()))
-            heapq.heappop(self._bid_heap)
-        return None
+        lvl = self.bids.best_level()
+        return None if lvl is None else next(iter(lvl.values()))
 
     def best_ask(self):
-        while self._ask_heap:
-            price = self._ask_heap[0]
-            lvl = self.price_levels.get(("ask", price))
-            if lvl:
-                return next(iter(lvl.values()))
-            heapq.heappop(self._ask_heap)
-        return None
+        lvl = self.asks.best_level()
+        return None if lvl is None else next(iter(lvl.values()))
+
+    # Live sizes
+    def level_count(self, side=None):
+        if side is None:
+            return len(self.bids) + len(self.asks)
+        return len(self._side(side))
+
+    def order_count(self, side=None):
+        if side is None:
+            return len(self.orders_by_id)
+        return self._side(side).n_orders
+
+    def stats(self):
+        return {
+            "orders": self.order_count(),
+            "levels": self.level_count(),
+            "heap_entries": self.bids.heap_size() + self.asks.heap_size(),
+            "compactions": self.bids.n_compactions + self.asks.n_compactions,
+        }
@@ -1,8 +1,22 @@
 
 
 class Order:
+    __slots__ = ("order_id", "price", "quantity", "side")
+
     def __init__(self, order_id, price, quantity, side):
         self.order_id = int(order_id)
         self.price = float(price)
         self.quantity = int(quantity)
-        self.side = str(side)
\ No newline at end of file
+        self.side = str(side)
+
+
+class Trade:
+    __slots__ = ("trade_id", "price", "quantity", "buy_order_id", "sell_order_id", "aggressor")
+
+    def __init__(self, trade_id, price, quantity, buy_order_id, sell_order_id, aggressor):
+        self.trade_id = int(trade_id)
+        self.price = float(price)
+        self.quantity = int(quantity)
+        self.buy_order_id = int(buy_order_id)
+        self.sell_order_id = int(sell_order_id)
+        self.aggressor = str(aggressor)  # side of the incoming order: "bid" = buyer-initiated
@@ -0,0 +1,93 @@
+from array import array
+
+SIDES = ("bid", "ask")
+SIDE_CODES = {"bid": 0, "ask": 1}
+
+
+class OrderStore:
+    """
+    Orders as parallel typed columns (id, price, quantity, side), one slot per live order.
+    Freed slots go on a free list and are reused by the next alloc, so the columns only
+    grow to the peak number of live orders.
+    prev_slots / next_slots are free for the book to link the orders of a price level (-1 = none).
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.prices = array("d")
+        self.quantities = array("q")
+        self.sides = array("b")
+        self.prev_slots = array("q")
+        self.next_slots = array("q")
+        self._free = []
+
+    def __len__(self):
+        return len(self.ids) - len(self._free)
+
+    def alloc(self, order_id, price, quantity, side):
+        code = SIDE_CODES.get(side)
+        if code is None:
+            raise ValueError(f"Invalid side: {side}")
+        if self._free:
+            slot = self._free.pop()
+            self.ids[slot] = order_id
+            self.prices[slot] = price
+            self.quantities[slot] = quantity
+            self.sides[slot] = code
+            self.prev_slots[slot] = -1
+            self.next_slots[slot] = -1
+            return slot
+        self.ids.append(order_id)
+        self.prices.append(price)
+        self.quantities.append(quantity)
+        self.sides.append(code)
+        self.prev_slots.append(-1)
+        self.next_slots.append(-1)
+        return len(self.ids) - 1
+
+    def free(self, slot):
+        self.ids[slot] = -1
+        self._free.append(slot)
+
+    def capacity(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        cols = (self.ids, self.prices, self.quantities, self.sides, self.prev_slots, self.next_slots)
+        return sum(c.itemsize * len(c) for c in cols)
+
+
+class OrderView:
+    """
+    Read/write view of one store slot with the Order attributes. Only valid while the order
+    is live: once it is deleted (or filled) the slot may be reused by another order.
+    """
+
+    __slots__ = ("_store", "_slot")
+
+    def __init__(self, store, slot):
+        self._store = store
+        self._slot = slot
+
+    @property
+    def order_id(self):
+        return self._store.ids[self._slot]
+
+    @property
+    def price(self):
+        return self._store.prices[self._slot]
+
+    @property
+    def quantity(self):
+        return self._store.quantities[self._slot]
+
+    @quantity.setter
+    def quantity(self, value):
+        self._store.quantities[self._slot] = int(value)
+
+    @property
+    def side(self):
+        return SIDES[self._store.sides[self._slot]]
+
+    def __repr__(self):
+        return f"OrderView(order_id={self.order_id}, price={self.price}, quantity={self.quantity}, side={self.side!r})"
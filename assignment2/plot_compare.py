@@ -13,32 +13,84 @@ def resolve_under_script_dir(path):
     return os.path.join(base_dir, path)
 
 
+def _num(s):
+    try:
+        return float(s)
+    except (TypeError, ValueError):
+        return math.nan
+
+
 def read_results(csv_path):
+    # data[op][n] = {column: float} (total_sec is the median over repetitions in newer CSVs)
     data = {}
     with open(csv_path, "r", encoding="utf-8") as f:
         r = csv.DictReader(f)
         for row in r:
             op = row["operation"].strip()
             n = int(row["n"])
-            total = float(row["total_sec"])
             if op not in data:
                 data[op] = {}
-            data[op][n] = total
+            data[op][n] = {k: _num(v) for k, v in row.items() if k not in ("method", "operation", "n")}
     return data
 
 
+def read_histograms(csv_path):
+    # hist[op][n] = [(bucket_lo_ns, bucket_hi_ns, count), ...]; empty if the file does not exist
+    hist = {}
+    if not os.path.isfile(csv_path):
+        return hist
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            op = row["operation"].strip()
+            n = int(row["n"])
+            hist.setdefault(op, {}).setdefault(n, []).append(
+                (int(row["bucket_lo_ns"]), int(row["bucket_hi_ns"]), int(row["count"]))
+            )
+    return hist
+
+
 def align_ns_union(naive, opt, op):
     return sorted(set(naive.get(op, {}).keys()) | set(opt.get(op, {}).keys()))
 
 
-def plot_compare_allow_missing(out_path, title, xs, ys_naive, ys_opt):
+def column(data, op, xs, key):
+    return [data.get(op, {}).get(n, {}).get(key, math.nan) for n in xs]
+
+
+def plot_compare_allow_missing(out_path, title, xs, ys_naive, ys_opt, band_naive=None, band_opt=None,
+                               ylabel="total time (seconds, log)"):
+    # band_*: (low, high) per x, drawn as a shaded range around the line (min .. p95 over repetitions)
     plt.figure()
-    plt.plot(xs, ys_naive, marker="o", label="naive")
-    plt.plot(xs, ys_opt, marker="o", label="optimized")
+    for label, ys, band in (("naive", ys_naive, band_naive), ("optimized", ys_opt, band_opt)):
+        line, = plt.plot(xs, ys, marker="o", label=label)
+        if band is not None and not all(math.isnan(v) for v in band[1]):
+            plt.fill_between(xs, band[0], band[1], color=line.get_color(), alpha=0.2, linewidth=0)
     plt.xscale("log")
     plt.yscale("log")
     plt.xlabel("number of operations (log)")
-    plt.ylabel("total time (seconds, log)")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.legend()
+    plt.grid(True, which="both", linestyle="--", linewidth=0.5)
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=200)
+    plt.close()
+
+
+def plot_latency_hist(out_path, title, hist_naive, hist_opt):
+    # per-operation latency distribution on log2 ns buckets, as a share of the timed operations
+    plt.figure()
+    for label, buckets in (("naive", hist_naive), ("optimized", hist_opt)):
+        if not buckets:
+            continue
+        total = sum(c for _, _, c in buckets)
+        los = [lo for lo, _, _ in buckets]
+        widths = [hi - lo for lo, hi, _ in buckets]
+        shares = [c / total for _, _, c in buckets]
+        plt.bar(los, shares, width=widths, align="edge", alpha=0.5, label=label, edgecolor="black", linewidth=0.3)
+    plt.xscale("log", base=2)
+    plt.xlabel("latency per operation (ns, log2 buckets)")
+    plt.ylabel("share of operations")
     plt.title(title)
     plt.legend()
     plt.grid(True, which="both", linestyle="--", linewidth=0.5)
@@ -53,6 +105,10 @@ def main():
                         help="Path to benchmark_results_naive.csv")
     parser.add_argument("--opt_csv", type=str, default="benchmark_results_optimized.csv",
                         help="Path to benchmark_results_optimized.csv")
+    parser.add_argument("--naive_hist", type=str, default="latency_hist_naive.csv",
+                        help="Path to latency_hist_naive.csv (optional, from main.py --latency)")
+    parser.add_argument("--opt_hist", type=str, default="latency_hist_optimized.csv",
+                        help="Path to latency_hist_optimized.csv (optional, from main.py --latency)")
     parser.add_argument("--out_dir", type=str, default="out_compare",
                         help="Output directory")
     args = parser.parse_args()
@@ -68,7 +124,7 @@ def main():
 
     all_ops = sorted(set(naive.keys()) | set(opt.keys()))
 
-    preferred = ["insert", "amend", "delete", "lookup_by_id", "get_orders_at_price", "best_bid", "best_ask"]
+    preferred = ["insert", "amend", "delete", "churn", "match", "mixed", "lookup_by_id", "get_orders_at_price", "best_bid", "best_ask"]
     ops_ordered = [op for op in preferred if op in all_ops] + [op for op in all_ops if op not in preferred]
 
     for op in ops_ordered:
@@ -77,8 +133,8 @@ def main():
             print(f"Skip {op}: no n values found.")
             continue
 
-        ys_naive = [naive.get(op, {}).get(n, math.nan) for n in xs]
-        ys_opt = [opt.get(op, {}).get(n, math.nan) for n in xs]
+        ys_naive = column(naive, op, xs, "total_sec")
+        ys_opt = column(opt, op, xs, "total_sec")
 
         if all(math.isnan(y) for y in ys_naive) and all(math.isnan(y) for y in ys_opt):
             print(f"Skip {op}: both series missing.")
@@ -90,7 +146,39 @@ def main():
             f"{op.replace('_', ' ').title()} Performance: naive vs optimized",
             xs,
             ys_naive,
-            ys_opt
+            ys_opt,
+            band_naive=(column(naive, op, xs, "min_sec"), column(naive, op, xs, "p95_sec")),
+            band_opt=(column(opt, op, xs, "min_sec"), column(opt, op, xs, "p95_sec")),
+            ylabel="total time (seconds, log; median, band = min..p95)",
+        )
+
+        # memory (present with main.py --profile-memory)
+        ys_naive = column(naive, op, xs, "peak_bytes")
+        ys_opt = column(opt, op, xs, "peak_bytes")
+        if not (all(math.isnan(y) for y in ys_naive) and all(math.isnan(y) for y in ys_opt)):
+            plot_compare_allow_missing(
+                os.path.join(out_dir_abs, f"{op}_peak_memory_naive_vs_optimized.png"),
+                f"{op.replace('_', ' ').title()} Peak Memory: naive vs optimized",
+                xs,
+                [max(y, 1.0) for y in ys_naive],   # log axis: clamp 0-byte peaks
+                [max(y, 1.0) for y in ys_opt],
+                ylabel="peak traced memory during the run (bytes, log)",
+            )
+
+    # per-operation latency histograms at the largest n both runs recorded (main.py --latency)
+    hist_naive = read_histograms(resolve_under_script_dir(args.naive_hist))
+    hist_opt = read_histograms(resolve_under_script_dir(args.opt_hist))
+    for op in ops_ordered:
+        common = set(hist_naive.get(op, {})) & set(hist_opt.get(op, {}))
+        ns = common or set(hist_naive.get(op, {})) | set(hist_opt.get(op, {}))
+        if not ns:
+            continue
+        n = max(ns)
+        plot_latency_hist(
+            os.path.join(out_dir_abs, f"{op}_latency_hist_naive_vs_optimized.png"),
+            f"{op.replace('_', ' ').title()} Latency (n={n}): naive vs optimized",
+            hist_naive.get(op, {}).get(n, []),
+            hist_opt.get(op, {}).get(n, []),
         )
 
 
@@ -0,0 +1,233 @@
+import bisect
+import csv
+import decimal
+import random
+
+
+# Message kinds of a workload stream: (kind, a, b)
+#   ADD    -> a = order dict, b = None
+#   CANCEL -> a = order_id,   b = None
+#   AMEND  -> a = order_id,   b = new quantity
+#   TOP    -> top-of-book read (best_bid + best_ask), a = b = None
+ADD, CANCEL, AMEND, TOP = 0, 1, 2, 3
+ACTIONS = {"add": ADD, "cancel": CANCEL, "amend": AMEND, "top": TOP}
+ACTION_NAMES = {v: k for k, v in ACTIONS.items()}
+
+DEFAULT_MIX = {"add": 0.40, "cancel": 0.40, "amend": 0.10, "top": 0.10}
+
+
+def parse_mix(text):
+    # "add=0.4,cancel=0.4,amend=0.1,top=0.1" -> {action: weight}; missing actions get weight 0
+    mix = {name: 0.0 for name in ACTIONS}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise ValueError(f"Invalid action in mix: {name}")
+        mix[name] = float(weight)
+    if mix["add"] <= 0:
+        raise ValueError("Mix needs a positive add weight")
+    return mix
+
+
+# A message stream: `prefill` adds build the starting book (not timed), `messages` is the workload
+class Workload:
+    def __init__(self, prefill, messages, source="generated"):
+        self.prefill = prefill
+        self.messages = messages
+        self.source = source
+
+    def __len__(self):
+        return len(self.messages)
+
+    def counts(self, n=None):
+        out = {name: 0 for name in ACTIONS}
+        for kind, _, _ in self.messages[:n]:
+            out[ACTION_NAMES[kind]] += 1
+        return out
+
+    def level_profile(self, n=None):
+        # queue shape of the stream before any fills: replays the adds / cancels / amends without a
+        # book (no matching), so it describes the flow, not what a matching book ends up holding
+        live = {}
+        for o in self.prefill:
+            live[o["order_id"]] = (o["side"], o["price"])
+        for kind, a, b in self.messages[:n]:
+            if kind == ADD:
+                live[a["order_id"]] = (a["side"], a["price"])
+            elif kind == CANCEL or (kind == AMEND and b <= 0):
+                live.pop(a, None)
+
+        depth = {}
+        for key in live.values():
+            depth[key] = depth.get(key, 0) + 1
+        queues = sorted(depth.values(), reverse=True)
+        return {
+            "stream_live_orders": len(live),
+            "stream_live_levels": len(queues),
+            "stream_max_queue": queues[0] if queues else 0,
+            "stream_top10_share": sum(queues[:10]) / len(live) if live else 0.0,
+        }
+
+
+# Tick-grid order flow around a drifting mid
+class WorkloadGenerator:
+    """
+    Synthetic order flow shaped like a real book instead of uniform random prices:
+
+    - Prices sit on a `tick` grid. Bids rest k ticks below the mid and asks k ticks above, with
+      k drawn from a power law P(k) ~ k^-alpha (k = 1..max_ticks), so the levels next to the touch
+      are hot and hold deep queues while the tail of the book is thin.
+    - The mid is a random walk that moves one tick with probability `drift` per message, so the
+      hot levels wander and old orders end up behind the touch.
+    - Sides are persistent (the next order repeats the previous side with probability
+      `side_persistence`) instead of strictly alternating; sizes are heavy-tailed round lots.
+    - The message mix (add / cancel / amend / top-of-book read) follows `mix`. Cancels and amends
+      target live orders uniformly; amends reduce size (the common priority-keeping amend).
+    """
+
+    def __init__(self, tick=0.01, mid=100.0, alpha=1.5, max_ticks=200, drift=0.05,
+                 side_persistence=0.6, lot=10, mix=None):
+        if tick <= 0:
+            raise ValueError(f"Invalid tick size: {tick}")
+        self.tick = tick
+        self.mid = mid
+        self.alpha = alpha
+        self.max_ticks = max_ticks
+        self.drift = drift
+        self.side_persistence = side_persistence
+        self.lot = lot
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.decimals = max(0, -decimal.Decimal(str(tick)).as_tuple().exponent)  # rounding keeps prices on the grid
+
+        # cumulative power-law weights of the tick offsets, sampled by bisection
+        self._cum = []
+        total = 0.0
+        for k in range(1, max_ticks + 1):
+            total += k ** -alpha
+            self._cum.append(total)
+
+    def generate(self, n, depth=1000, seed=2024, first_id=1):
+        rng = random.Random(seed)
+        tick = self.tick
+        cum = self._cum
+        top = cum[-1]
+        mid_ticks = round(self.mid / tick)
+        state = {"side": "bid", "next_id": first_id}
+
+        live_ids = []   # live order ids, cancelled by swap-pop
+        pos = {}        # order_id -> index in live_ids
+        qty_of = {}
+
+        def new_order():
+            nonlocal mid_ticks
+            if rng.random() < self.drift:
+                mid_ticks += 1 if rng.random() < 0.5 else -1
+            if rng.random() >= self.side_persistence:
+                state["side"] = "ask" if state["side"] == "bid" else "bid"
+            side = state["side"]
+            k = bisect.bisect_left(cum, rng.random() * top) + 1
+            price = round((mid_ticks - k if side == "bid" else mid_ticks + k) * tick, self.decimals)
+            qty = self.lot * min(int(rng.paretovariate(1.5)), 100)
+
+            oid = state["next_id"]
+            state["next_id"] += 1
+            pos[oid] = len(live_ids)
+            live_ids.append(oid)
+            qty_of[oid] = qty
+            return {"order_id": oid, "price": price, "quantity": qty, "side": side}
+
+        def pick_live():
+            return live_ids[int(rng.random() * len(live_ids))]
+
+        def remove_live(oid):
+            j = pos.pop(oid)
+            last = live_ids.pop()
+            if last != oid:
+                live_ids[j] = last
+                pos[last] = j
+            del qty_of[oid]
+
+        prefill = [new_order() for _ in range(depth)]
+
+        names = list(ACTIONS)
+        cum_mix = []
+        total = 0.0
+        for name in names:
+            total += self.mix.get(name, 0.0)
+            cum_mix.append(total)
+
+        messages = []
+        for _ in range(n):
+            kind = ACTIONS[names[bisect.bisect_left(cum_mix, rng.random() * total)]]
+            if kind != ADD and kind != TOP and not live_ids:
+                kind = ADD
+            if kind == ADD:
+                messages.append((ADD, new_order(), None))
+            elif kind == CANCEL:
+                oid = pick_live()
+                remove_live(oid)
+                messages.append((CANCEL, oid, None))
+            elif kind == AMEND:
+                oid = pick_live()
+                new_qty = rng.randint(1, qty_of[oid])
+                qty_of[oid] = new_qty
+                messages.append((AMEND, oid, new_qty))
+            else:
+                messages.append((TOP, None, None))
+        return Workload(prefill, messages)
+
+
+# Recorded message files: CSV with columns action, order_id, side, price, quantity[, phase]
+# phase = "prefill" marks the adds that build the starting book; blank (or no phase column) = timed stream
+def write_messages(workload, path):
+    # prefill adds are written first and tagged, so a replay rebuilds the same book before timing starts
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["action", "order_id", "side", "price", "quantity", "phase"])
+        for o in workload.prefill:
+            w.writerow(["add", o["order_id"], o["side"], o["price"], o["quantity"], "prefill"])
+        for kind, a, b in workload.messages:
+            if kind == ADD:
+                w.writerow(["add", a["order_id"], a["side"], a["price"], a["quantity"], ""])
+            elif kind == CANCEL:
+                w.writerow(["cancel", a, "", "", "", ""])
+            elif kind == AMEND:
+                w.writerow(["amend", a, "", "", b, ""])
+            else:
+                w.writerow(["top", "", "", "", "", ""])
+
+
+def read_messages(path):
+    # prefill-tagged adds go to Workload.prefill (untimed); everything else is the timed stream
+    prefill = []
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, row in enumerate(csv.DictReader(f), start=2):
+            action = row["action"].strip().lower()
+            kind = ACTIONS.get(action)
+            if kind is None:
+                raise ValueError(f"{path}:{lineno}: invalid action: {action}")
+            phase = (row.get("phase") or "").strip().lower()
+            if phase not in ("", "prefill"):
+                raise ValueError(f"{path}:{lineno}: invalid phase: {phase}")
+            if phase == "prefill" and (kind != ADD or messages):
+                raise ValueError(f"{path}:{lineno}: prefill rows must be adds before the first stream message")
+            if kind == ADD:
+                o = {
+                    "order_id": int(row["order_id"]),
+                    "price": float(row["price"]),
+                    "quantity": int(row["quantity"]),
+                    "side": row["side"].strip(),
+                }
+                if phase == "prefill":
+                    prefill.append(o)
+                else:
+                    messages.append((ADD, o, None))
+            elif kind == CANCEL:
+                messages.append((CANCEL, int(row["order_id"]), None))
+            elif kind == AMEND:
+                messages.append((AMEND, int(row["order_id"]), int(row["quantity"])))
+            else:
+                messages.append((TOP, None, None))
+    return Workload(prefill, messages, source=path)
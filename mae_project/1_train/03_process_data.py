@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
 import json
 import argparse
+import glob
 from typing import Dict, List, Tuple, Optional
 
 import numpy as np
 import pandas as pd
 import torch
 
+# Shared helpers live in ../2_backtest
+if BACKTEST_DIR not in sys.path:
+    sys.path.insert(0, BACKTEST_DIR)
+from pack_io import MMAP_SUFFIX, remove_mmap_pack, save_mmap_pack
+
 
 # -------------------------
 # Parsing helpers
@@ -103,6 +113,13 @@ def main():
     parser.add_argument("--test", type=str, default="2026-2026")
 
     parser.add_argument("--drop_rolling", type=int, default=20, help="Drop first N rows due to rolling features.")
+    parser.add_argument(
+        "--pack_format",
+        type=str,
+        default="pt",
+        choices=["pt", "mmap", "both"],
+        help="pt: torch.save dict; mmap: raw float32 X/R + .mmap.json manifest (zero-copy loads, see pack_io.py)",
+    )
     args = parser.parse_args()
 
     base_dir = args.base_dir
@@ -297,7 +314,17 @@ def main():
 
         base = f"market_{split}_{start}_to_{end}"
         pt_path = os.path.join(out_dir, f"{base}.pt")
-        torch.save(pack, pt_path)
+        saved = []
+        if args.pack_format == "pt":
+            # mmap packs of this split from an earlier run no longer match the data: drop them
+            for stale in glob.glob(os.path.join(out_dir, f"market_{split}_*{MMAP_SUFFIX}")):
+                remove_mmap_pack(stale)
+                print(f"[DROP] stale mmap pack {os.path.basename(stale)}")
+        if args.pack_format in ("pt", "both"):
+            torch.save(pack, pt_path)
+            saved.append(pt_path)
+        if args.pack_format in ("mmap", "both"):
+            saved.append(save_mmap_pack(pack, os.path.join(out_dir, f"{base}{MMAP_SUFFIX}")))
 
         # previews
         preview_rows = pd.concat([X_split.head(10), X_split.tail(10)])
@@ -309,9 +336,9 @@ def main():
         with open(os.path.join(out_dir, f"{base}__manifest.json"), "w", encoding="utf-8") as f:
             json.dump(pack["meta"], f, ensure_ascii=False, indent=2)
 
-        print(f"[SAVE] {split}: X={tuple(X_t.shape)}, R={tuple(R_t.shape)} -> {pt_path}")
+        print(f"[SAVE] {split}: X={tuple(X_t.shape)}, R={tuple(R_t.shape)} -> {', '.join(saved)}")
 
-    print("\nDONE: Saved dict-style .pt packs + previews + manifest.")
+    print(f"\nDONE: Saved packs (format={args.pack_format}) + previews + manifest.")
     print(f"Out dir: {os.path.abspath(out_dir)}")
 
 
@@ -1,21 +1,50 @@
 # -*- coding: utf-8 -*-
 import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
 import math
 import copy
+import time
+import argparse
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.utils.data import Dataset, DataLoader
+from torch.utils.data.distributed import DistributedSampler
+
+# Shared helpers live in ../2_backtest
+if BACKTEST_DIR not in sys.path:
+    sys.path.insert(0, BACKTEST_DIR)
+from pack_io import find_pack, load_pack
 
 # ==============================================================================
 # 1) DATASET (load dict pack)
 # ==============================================================================
 class MarketMAEDataset(Dataset):
-    def __init__(self, pt_pack: str, window_size: int = 20, return_stats: bool = False, return_meta: bool = False):
+    """
+    Rolling windows X[idx:idx+W] with per-window normalization.
+
+    precompute=True builds every normalized window once as a single [num_windows, W, F] tensor
+    (unfold over time, normalized in one vectorized pass), so __getitem__ / get_batch are pure
+    index lookups instead of recomputing mean/std for the same overlapping windows every epoch.
+    """
+
+    def __init__(
+        self,
+        pt_pack: str,
+        window_size: int = 20,
+        return_stats: bool = False,
+        return_meta: bool = False,
+        precompute: bool = False,
+    ):
         if not os.path.exists(pt_pack):
             raise FileNotFoundError(f"PT pack not found: {pt_pack}")
 
-        pack = torch.load(pt_pack, map_location="cpu")
+        pack = load_pack(pt_pack)
         if not isinstance(pack, dict) or "X" not in pack:
             raise TypeError(f"Expected dict with key 'X' in {pt_pack}, got keys={list(pack.keys()) if isinstance(pack, dict) else type(pack)}")
 
@@ -38,20 +67,52 @@ class MarketMAEDataset(Dataset):
         if len(self.data) < self.window_size:
             raise ValueError(f"Data too short: T={len(self.data)} < window_size={self.window_size}")
 
+        # Optional cache of all normalized windows (+ their stats)
+        self.windows = None   # [num_windows, W, F]
+        self.win_mu = None    # [num_windows, 1, F]
+        self.win_std = None   # [num_windows, 1, F]
+        if precompute:
+            self.precompute()
+
         # Optional sanity prints
         if self.meta:
             print(f"[DATA] split={self.meta.get('split')} X={tuple(self.data.shape)} range={self.meta.get('start_date')}..{self.meta.get('end_date')}")
 
+    def precompute(self) -> None:
+        # unfold -> [num, F, W]; transpose to [num, W, F] (view, no copy until normalization)
+        w = self.data.unfold(0, self.window_size, 1).transpose(1, 2)
+        mu = w.mean(dim=1, keepdim=True)
+        std = w.std(dim=1, keepdim=True, unbiased=False).add(1e-5)
+        self.windows = ((w - mu) / std).contiguous()
+        self.win_mu = mu.contiguous()
+        self.win_std = std.contiguous()
+
     def __len__(self):
         return max(0, len(self.data) - self.window_size + 1)
 
+    def get_batch(self, idx: torch.Tensor):
+        """
+        Gather a batch of precomputed windows by index: [B, W, F] (plus [B,1,F] mu/std if return_stats).
+        """
+        if self.windows is None:
+            self.precompute()
+        x = self.windows.index_select(0, idx)
+        if self.return_stats:
+            return x, self.win_mu.index_select(0, idx), self.win_std.index_select(0, idx)
+        return x
+
     def __getitem__(self, idx: int):
-        w = self.data[idx: idx + self.window_size]  # [W,F]
+        if self.windows is not None:
+            x = self.windows[idx]
+            mu = self.win_mu[idx]
+            std = self.win_std[idx]
+        else:
+            w = self.data[idx: idx + self.window_size]  # [W,F]
 
-        # Window normalization (your preference)
-        mu = w.mean(dim=0, keepdim=True)
-        std = w.std(dim=0, keepdim=True, unbiased=False).add(1e-5)
-        x = (w - mu) / std
+            # Window normalization (your preference)
+            mu = w.mean(dim=0, keepdim=True)
+            std = w.std(dim=0, keepdim=True, unbiased=False).add(1e-5)
+            x = (w - mu) / std
 
         if self.return_stats or self.return_meta:
             out = [x]
@@ -70,24 +131,139 @@ class MarketMAEDataset(Dataset):
         return x
 
 
+class ResidentBatchLoader:
+    """
+    DataLoader replacement for a precomputed MarketMAEDataset: the window tensor lives on `device`
+    and each batch is one index_select, so there is no per-item __getitem__ call and no collate.
+    Same batching semantics as DataLoader(batch_size, shuffle, drop_last).
+
+    sampler (e.g. DistributedSampler) overrides shuffle: batches are cut from the sampler's index
+    order, so each rank only gathers its own shard. Call sampler.set_epoch(epoch) as usual.
+
+    Each iter() draws from the RNG exactly like a DataLoader iterator (one base-seed draw, then
+    RandomSampler's seed draw + randperm when shuffling), so a seeded run sees the same batch order
+    and the same global RNG stream as the per-item DataLoader path.
+    Batches are (x, mu, std) when the dataset has return_stats; return_meta is not supported.
+    """
+
+    def __init__(
+        self,
+        ds: MarketMAEDataset,
+        batch_size: int,
+        shuffle: bool = False,
+        drop_last: bool = False,
+        device: torch.device = torch.device("cpu"),
+        generator: torch.Generator = None,
+        sampler=None,
+    ):
+        if ds.return_meta:
+            raise ValueError("ResidentBatchLoader does not serve return_meta (dates); use a DataLoader")
+        if ds.windows is None:
+            ds.precompute()
+        self.windows = ds.windows.to(device)
+        self.return_stats = ds.return_stats
+        if self.return_stats:
+            self.win_mu = ds.win_mu.to(device)
+            self.win_std = ds.win_std.to(device)
+        self.batch_size = int(batch_size)
+        self.shuffle = bool(shuffle)
+        self.drop_last = bool(drop_last)
+        self.generator = generator
+        self.sampler = sampler
+
+    def __len__(self):
+        n = len(self.sampler) if self.sampler is not None else self.windows.shape[0]
+        return n // self.batch_size if self.drop_last else math.ceil(n / self.batch_size)
+
+    def __iter__(self):
+        n = self.windows.shape[0]
+        # DataLoader iterator: base seed for workers, drawn even with num_workers=0
+        torch.empty((), dtype=torch.int64).random_(generator=self.generator)
+        if self.sampler is not None:
+            order = torch.as_tensor(list(iter(self.sampler)), dtype=torch.long)
+        elif self.shuffle:
+            # RandomSampler: without a generator it seeds a fresh one from the global RNG
+            gen = self.generator
+            if gen is None:
+                gen = torch.Generator()
+                gen.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+            order = torch.randperm(n, generator=gen)
+        else:
+            order = torch.arange(n)
+        return self._batches(order.to(self.windows.device))
+
+    def _batches(self, order: torch.Tensor):
+        for b in range(len(self)):
+            idx = order[b * self.batch_size : (b + 1) * self.batch_size]
+            x = self.windows.index_select(0, idx)
+            if self.return_stats:
+                yield x, self.win_mu.index_select(0, idx), self.win_std.index_select(0, idx)
+            else:
+                yield x
+
+
 # ==============================================================================
 # 2) EMA
 # ==============================================================================
 class EMA:
-    def __init__(self, model: nn.Module, decay: float = 0.999):
+    """
+    Exponential moving average of a model's parameters and floating-point buffers.
+
+    The EMA tensors and the live model's tensors are gathered once into flat lists, and each update
+    is one torch._foreach_mul_ + torch._foreach_add_ over the whole list (no state_dict rebuild /
+    load_state_dict per step). Non-float buffers are copied.
+
+    update_every=k : blend only every k-th call, with decay**k, so the EMA horizon in optimizer
+                     steps is unchanged (k steps of d == one step of d**k on the latest weights)
+    device         : keep the EMA copy elsewhere (e.g. "cpu" while training on cuda)
+    """
+
+    def __init__(self, model: nn.Module, decay: float = 0.999, update_every: int = 1, device=None):
         self.decay = float(decay)
+        self.update_every = max(1, int(update_every))
         self.ema_model = copy.deepcopy(model).eval()
+        if device is not None:
+            self.ema_model.to(device)
         for p in self.ema_model.parameters():
             p.requires_grad_(False)
+        self.device = next(self.ema_model.parameters()).device
+        self.num_updates = 0
+
+        self._ema_float, self._ema_other = self._gather(self.ema_model)
+        self._src_model = None
+        self._src_float, self._src_other = [], []
+        self._bind(model)
+
+    @staticmethod
+    def _gather(module: nn.Module):
+        # state_dict order: every parameter and buffer exactly once
+        tensors = list(module.state_dict(keep_vars=True).values())
+        floats = [t.data for t in tensors if t.is_floating_point()]
+        others = [t.data for t in tensors if not t.is_floating_point()]
+        return floats, others
+
+    def _bind(self, model: nn.Module) -> None:
+        self._src_model = model
+        self._src_float, self._src_other = self._gather(model)
+        if len(self._src_float) != len(self._ema_float) or len(self._src_other) != len(self._ema_other):
+            raise ValueError("EMA.update: model structure differs from the EMA copy")
 
     @torch.no_grad()
     def update(self, model: nn.Module):
-        d = self.decay
-        msd = model.state_dict()
-        esd = self.ema_model.state_dict()
-        for k in esd.keys():
-            esd[k].mul_(d).add_(msd[k], alpha=1.0 - d)
-        self.ema_model.load_state_dict(esd, strict=True)
+        self.num_updates += 1
+        if self.num_updates % self.update_every != 0:
+            return
+        if model is not self._src_model:
+            self._bind(model)
+
+        d = self.decay ** self.update_every
+        src = self._src_float
+        if src and src[0].device != self.device:
+            src = [t.to(self.device, non_blocking=True) for t in src]
+        torch._foreach_mul_(self._ema_float, d)
+        torch._foreach_add_(self._ema_float, src, alpha=1.0 - d)
+        for e, m in zip(self._ema_other, self._src_other):
+            e.copy_(m)
 
 
 # ==============================================================================
@@ -244,18 +420,88 @@ class MacroConditionedMAE(nn.Module):
 
 
 # ==============================================================================
-# 5) TRAIN
+# 5) DISTRIBUTED (torchrun + gloo)
 # ==============================================================================
-def train():
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+def init_distributed(backend: str = "gloo"):
+    """
+    Join the process group when launched by torchrun (WORLD_SIZE > 1 in the environment).
+    Returns (rank, world_size, local_rank); (0, 1, 0) for a plain single-process run.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    if world_size <= 1:
+        return 0, 1, 0
+    rank = int(os.environ["RANK"])
+    local_rank = int(os.environ.get("LOCAL_RANK", "0"))
+    dist.init_process_group(backend=backend, rank=rank, world_size=world_size)
+    return rank, world_size, local_rank
+
+
+def all_reduce_sum(values, device: torch.device):
+    """
+    Sum a list of python floats over all ranks (no-op when not distributed).
+    """
+    if not (dist.is_available() and dist.is_initialized()):
+        return list(values)
+    t = torch.tensor(list(values), dtype=torch.float64, device=device)
+    dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return t.tolist()
+
+
+def broadcast_int(value: int, device: torch.device, src: int = 0) -> int:
+    """
+    Rank `src`'s value of a python int on every rank (no-op when not distributed).
+    """
+    if not (dist.is_available() and dist.is_initialized()):
+        return int(value)
+    t = torch.tensor([int(value) % (1 << 63)], dtype=torch.int64, device=device)   # initial_seed() is uint64
+    dist.broadcast(t, src=src)
+    return int(t.item())
+
+
+@torch.no_grad()
+def broadcast_module_(module: nn.Module, src: int = 0) -> None:
+    """
+    Overwrite every parameter/buffer of `module` with rank `src`'s copy.
+    """
+    if not (dist.is_available() and dist.is_initialized()):
+        return
+    for t in list(module.parameters()) + list(module.buffers()):
+        dist.broadcast(t.data, src=src)
+
+
+# ==============================================================================
+# 6) TRAIN
+# ==============================================================================
+def train(args):
+    rank, world_size, local_rank = init_distributed(args.backend)
+    distributed = world_size > 1
+    is_main = rank == 0
+
+    if distributed and args.backend == "gloo":
+        device = torch.device("cpu")
+        # split the node's cores between the local workers instead of oversubscribing them
+        local_world = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+        torch.set_num_threads(args.threads_per_proc or max(1, (os.cpu_count() or 1) // local_world))
+    elif distributed:
+        device = torch.device(f"cuda:{local_rank}")
+        torch.cuda.set_device(device)
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    # identical init on every rank (DDP also broadcasts rank 0's weights), distinct mask / dropout noise.
+    # Without --seed every rank starts from its own random seed, so rank 0's is shared: the
+    # DistributedSampler shuffle must use the same seed everywhere for the shards to be disjoint.
+    if args.seed is not None:
+        torch.manual_seed(args.seed)
+    model_seed = broadcast_int(torch.initial_seed(), device)
 
     # NOTE: now we load dict packs
-    data_dir = "../data/data_pt"
-    train_pack = os.path.join(data_dir, "market_train_2020-01-31_to_2024-12-31.pt")
-    val_pack = os.path.join(data_dir, "market_val_2025-01-02_to_2025-12-31.pt")
+    data_dir = args.data_dir
+    train_pack = find_pack(data_dir, "train")   # .mmap.json manifest if converted, else .pt
+    val_pack = find_pack(data_dir, "val")
 
-    EPOCHS = 300
-    BATCH_SIZE = 64
+    EPOCHS = args.epochs
+    BATCH_SIZE = args.batch_size                # global batch; each rank takes BATCH_SIZE // world_size
     WINDOW_SIZE = 20
 
     MAX_LR = 5.0e-4
@@ -263,6 +509,7 @@ def train():
     WEIGHT_DECAY = 0.10
     DROPOUT = 0.20
     EMA_DECAY = 0.999
+    PRECOMPUTE_WINDOWS = True   # cache all normalized windows once; False = per-item DataLoader path
 
     TRAIN_MASK_START = 0.15
     TRAIN_MASK_END = 0.30
@@ -270,34 +517,59 @@ def train():
     VAL_MASK_RATIO = 0.20
     VAL_MASK_SEED = 1234
 
+    if BATCH_SIZE % world_size != 0:
+        raise ValueError(f"batch_size={BATCH_SIZE} must be divisible by world_size={world_size}")
+    local_batch = BATCH_SIZE // world_size
+
     model = MacroConditionedMAE(
         num_feat=22, seq_len=WINDOW_SIZE, patch_size=5,
         embed_dim=256, enc_layers=6, dec_layers=3, dropout=DROPOUT
     ).to(device)
-    ema = EMA(model, decay=EMA_DECAY)
-
-    train_ds = MarketMAEDataset(train_pack, window_size=WINDOW_SIZE)
-    val_ds = MarketMAEDataset(val_pack, window_size=WINDOW_SIZE)
-
-    train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True, drop_last=True, pin_memory=torch.cuda.is_available())
-    val_loader = DataLoader(val_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=True, pin_memory=torch.cuda.is_available())
+    if distributed:
+        torch.manual_seed(model_seed + rank)
+        model = DDP(model)                      # broadcasts rank 0's parameters, all-reduces grads
+    raw_model = model.module if distributed else model
+
+    # Built after the DDP broadcast, so every rank starts from the same EMA. Gradients are all-reduced,
+    # so the optimizer steps (and the EMA updates that follow) are identical on every rank.
+    ema = EMA(raw_model, decay=EMA_DECAY, update_every=args.ema_every, device=args.ema_device)
+
+    train_ds = MarketMAEDataset(train_pack, window_size=WINDOW_SIZE, precompute=PRECOMPUTE_WINDOWS)
+    val_ds = MarketMAEDataset(val_pack, window_size=WINDOW_SIZE, precompute=PRECOMPUTE_WINDOWS)
+
+    train_sampler = val_sampler = None
+    if distributed:
+        train_sampler = DistributedSampler(train_ds, num_replicas=world_size, rank=rank, shuffle=True, seed=model_seed, drop_last=True)
+        val_sampler = DistributedSampler(val_ds, num_replicas=world_size, rank=rank, shuffle=False, drop_last=True)
+
+    if PRECOMPUTE_WINDOWS:
+        # normalized windows resident on the training device; batches are index gathers
+        train_loader = ResidentBatchLoader(train_ds, batch_size=local_batch, shuffle=True, drop_last=True, device=device, sampler=train_sampler)
+        val_loader = ResidentBatchLoader(val_ds, batch_size=local_batch, shuffle=False, drop_last=True, device=device, sampler=val_sampler)
+    else:
+        train_loader = DataLoader(train_ds, batch_size=local_batch, shuffle=train_sampler is None, sampler=train_sampler, drop_last=True, pin_memory=torch.cuda.is_available())
+        val_loader = DataLoader(val_ds, batch_size=local_batch, shuffle=False, sampler=val_sampler, drop_last=True, pin_memory=torch.cuda.is_available())
 
     optimizer = optim.AdamW(model.parameters(), lr=MAX_LR, weight_decay=WEIGHT_DECAY)
     total_steps = EPOCHS * len(train_loader)
     warmup_steps = int(0.05 * total_steps)
     global_step = 0
 
-    model_root = "../model"
+    model_root = args.model_dir
     os.makedirs(model_root, exist_ok=True)
 
     best_fixed_val = float("inf")
     best_raw_path = os.path.join(model_root, "market_encoder_best_raw.pth")
     best_ema_path = os.path.join(model_root, "market_encoder_best_ema.pth")
 
-    print(f"--- Training MacroConditionedMAE on {device} ---")
+    if is_main:
+        print(f"--- Training MacroConditionedMAE on {device} | world_size={world_size} | batch={BATCH_SIZE} ({local_batch}/rank) | threads/rank={torch.get_num_threads()} ---")
+    t_start = time.perf_counter()
 
     for epoch in range(EPOCHS):
         train_mr = mask_ratio_schedule(epoch, EPOCHS, start=TRAIN_MASK_START, end=TRAIN_MASK_END)
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
 
         model.train()
         train_sum = 0.0
@@ -314,13 +586,14 @@ def train():
             torch.nn.utils.clip_grad_norm_(model.parameters(), 0.5)
             optimizer.step()
 
-            ema.update(model)
+            ema.update(raw_model)
             train_sum += float(loss.item())
             global_step += 1
 
-        avg_train = train_sum / max(1, len(train_loader))
+        # keep the EMA bit-identical across ranks (guards against any drift in the per-rank updates)
+        broadcast_module_(ema.ema_model, src=0)
 
-        ema_model = ema.ema_model.to(device)
+        ema_model = ema.ema_model
         ema_model.eval()
 
         fixed_val_sum = 0.0
@@ -328,7 +601,7 @@ def train():
 
         with torch.no_grad():
             for batch in val_loader:
-                batch = batch.to(device, non_blocking=True)
+                batch = batch.to(ema.device, non_blocking=True)
 
                 v_fixed = ema_model(batch, mask_ratio=VAL_MASK_RATIO, mask_seed=VAL_MASK_SEED, noise_std=0.0, visible_loss_weight=0.0)
                 fixed_val_sum += float(v_fixed.item())
@@ -336,25 +609,55 @@ def train():
                 v_robust = ema_model(batch, mask_ratio=train_mr, mask_seed=VAL_MASK_SEED, noise_std=0.0, visible_loss_weight=0.0)
                 robust_val_sum += float(v_robust.item())
 
-        fixed_val = fixed_val_sum / max(1, len(val_loader))
-        robust_val = robust_val_sum / max(1, len(val_loader))
+        # per-batch means averaged over every rank's batches
+        train_sum, n_train, fixed_val_sum, robust_val_sum, n_val = all_reduce_sum(
+            [train_sum, len(train_loader), fixed_val_sum, robust_val_sum, len(val_loader)], device
+        )
+        avg_train = train_sum / max(1, n_train)
+        fixed_val = fixed_val_sum / max(1, n_val)
+        robust_val = robust_val_sum / max(1, n_val)
 
-        if (epoch + 1) % 5 == 0 or epoch == 0:
+        if is_main and ((epoch + 1) % 5 == 0 or epoch == 0):
             print(
                 f"Epoch {epoch+1:03d} | train_mr={train_mr:.2f} | "
                 f"Train: {avg_train:.4f} | ValFixed(EMA,mr={VAL_MASK_RATIO:.2f}): {fixed_val:.4f} | "
-                f"ValRobust(EMA,mr={train_mr:.2f}): {robust_val:.4f} | LR: {optimizer.param_groups[0]['lr']:.2e}"
+                f"ValRobust(EMA,mr={train_mr:.2f}): {robust_val:.4f} | LR: {optimizer.param_groups[0]['lr']:.2e} | "
+                f"{time.perf_counter() - t_start:.1f}s"
             )
 
+        # fixed_val is identical on every rank after the all-reduce, so they agree on "best"
         if fixed_val < best_fixed_val:
             best_fixed_val = fixed_val
-            torch.save(model.state_dict(), best_raw_path)
-            torch.save(ema.ema_model.state_dict(), best_ema_path)
-
-    print(f"Done. Best ValFixed(EMA)={best_fixed_val:.6f}")
-    print(f"Saved best raw: {best_raw_path}")
-    print(f"Saved best ema: {best_ema_path}")
+            if is_main:
+                torch.save(raw_model.state_dict(), best_raw_path)
+                torch.save(ema.ema_model.state_dict(), best_ema_path)
+
+    if is_main:
+        print(f"Done in {time.perf_counter() - t_start:.1f}s. Best ValFixed(EMA)={best_fixed_val:.6f}")
+        print(f"Saved best raw: {best_raw_path}")
+        print(f"Saved best ema: {best_ema_path}")
+
+    if distributed:
+        dist.barrier()
+        dist.destroy_process_group()
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(
+        description="Pretrain MacroConditionedMAE. Single process: python 04_train_mae.py | "
+                    "data-parallel on CPU: torchrun --standalone --nproc_per_node=4 04_train_mae.py"
+    )
+    ap.add_argument("--data_dir", type=str, default="../data/data_pt")
+    ap.add_argument("--model_dir", type=str, default="../model")
+    ap.add_argument("--epochs", type=int, default=300)
+    ap.add_argument("--batch_size", type=int, default=64, help="global batch size (split evenly across ranks)")
+    ap.add_argument("--ema_every", type=int, default=1, help="EMA update every k optimizer steps (decay**k per update)")
+    ap.add_argument("--ema_device", type=str, default=None, help="device for the EMA copy (default: training device)")
+    ap.add_argument("--seed", type=int, default=None, help="base seed; each rank draws masks/dropout from seed + rank")
+    ap.add_argument("--backend", type=str, default="gloo", choices=["gloo", "nccl"], help="torch.distributed backend under torchrun")
+    ap.add_argument("--threads_per_proc", type=int, default=0, help="torch threads per rank (0 = cores / local workers)")
+    return ap.parse_args()
 
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    train(parse_args())
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Hyper-parameter Search for the Downstream Return Model (trains with 05_train_return.fit):
+- Search space: comma lists for epochs / batch_size / lr / weight_decay / lambda_corr / huber_beta
+  (full grid, or --n_trials configs sampled from it)
+- Successive halving on validation Huber loss (fixed eval beta, see EVAL_HUBER_BETA):
+    every live trial trains up to the rung budget (min_epochs, min_epochs*eta, ...), the best 1/eta
+    continue; a continued trial resumes from its full training-state checkpoint, so it ends exactly
+    where an uninterrupted run of the same config would (the LR schedule always spans its own epochs)
+- Trial directories are named by index + config hash and only resumed within one search; a trial
+  starting its first rung clears what an earlier search left in its directory
+- Trials run in a local process pool. Packs and the MAE init are loaded ONCE by the driver:
+    * cleaned train/val X/R are written as .npy and memory-mapped by every worker (one page-cache copy)
+    * the MAE-initialized ReturnFullModel state_dict is saved once and loaded once per worker
+- Writes leaderboard.csv (one row per trial: status, epochs trained, best/last val, checkpoint paths)
+  and search_config.json under --out_dir
+"""
+
+import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
+import argparse
+import hashlib
+import importlib.util
+import itertools
+import json
+import math
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import torch
+
+# Shared helpers live in ../2_backtest
+if BACKTEST_DIR not in sys.path:
+    sys.path.insert(0, BACKTEST_DIR)
+from pack_io import find_pack
+
+
+def _load_trainer():
+    # 05_train_return.py is not importable by name (digit prefix)
+    spec = importlib.util.spec_from_file_location("train_return", os.path.join(THIS_DIR, "05_train_return.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+trainer = _load_trainer()
+
+SEARCH_KEYS = ("epochs", "batch_size", "lr", "weight_decay", "lambda_corr", "huber_beta")
+_CASTS = {"epochs": int, "batch_size": int}
+
+# Per-process state installed by _init_worker (shared datasets + init weights)
+_WORKER: Dict[str, object] = {}
+
+
+def _parse_list(s: str, cast) -> list:
+    return [cast(x.strip()) for x in str(s).split(",") if x.strip()]
+
+
+def build_trials(args) -> List[dict]:
+    values = [_parse_list(getattr(args, k), _CASTS.get(k, float)) for k in SEARCH_KEYS]
+    grid = [dict(zip(SEARCH_KEYS, combo)) for combo in itertools.product(*values)]
+    if args.n_trials and args.n_trials < len(grid):
+        grid = random.Random(args.search_seed).sample(grid, args.n_trials)
+    return [{"trial": i, **cfg} for i, cfg in enumerate(grid)]
+
+
+def trial_dir(out_dir: str, trial: dict, seed: int) -> str:
+    # config hash in the name: a later search with a different grid never lands on this trial's files
+    cfg = {k: trial[k] for k in SEARCH_KEYS}
+    digest = hashlib.sha1(json.dumps({**cfg, "seed": int(seed)}, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(out_dir, "trials", f"trial_{trial['trial']:03d}_{digest}")
+
+
+# -------------------------
+# Shared data (driver side)
+# -------------------------
+def export_shared(args, shared_dir: str) -> dict:
+    """
+    Load train/val packs + MAE init once; write the arrays workers memory-map.
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    spec = {}
+    for split in ("train", "val"):
+        ds = trainer.ReturnPredDataset(find_pack(args.pt_dir, split), window_size=20)
+        for key in ("X", "R"):
+            path = os.path.join(shared_dir, f"{split}_{key}.npy")
+            np.save(path, getattr(ds, key).numpy())
+            spec[f"{split}_{key}"] = path
+        spec[f"{split}_meta"] = ds.meta
+
+    # Same init a standalone run with this seed gets: seeded head + MAE encoder weights
+    trainer.set_seed(args.seed)
+    model = trainer.build_model(mae_init_ckpt=args.mae_ckpt)
+    spec["init_state"] = os.path.join(shared_dir, "init_state.pt")
+    torch.save(model.state_dict(), spec["init_state"])
+    return spec
+
+
+# -------------------------
+# Worker side
+# -------------------------
+def _init_worker(spec: dict, threads: int) -> None:
+    torch.set_num_threads(max(1, int(threads)))
+    for split in ("train", "val"):
+        # copy-on-write maps: every worker reads the same physical pages
+        pack = {
+            "meta": spec[f"{split}_meta"],
+            "X": torch.from_numpy(np.load(spec[f"{split}_X"], mmap_mode="c")),
+            "R": torch.from_numpy(np.load(spec[f"{split}_R"], mmap_mode="c")),
+        }
+        _WORKER[f"{split}_ds"] = trainer.ReturnPredDataset(pack, window_size=20)
+    _WORKER["init_state"] = torch.load(spec["init_state"], map_location="cpu")
+
+
+def run_trial(trial: dict, budget: int, trial_dir: str, seed: int, resume: bool) -> dict:
+    # resume=True only for a trial this search already trained at an earlier rung
+    cfg = {k: trial[k] for k in SEARCH_KEYS}
+    if not resume and os.path.isdir(trial_dir):
+        shutil.rmtree(trial_dir)      # leftovers of an earlier search with the same config
+    os.makedirs(trial_dir, exist_ok=True)
+    save_path = os.path.join(trial_dir, "best.pth")
+    state_path = os.path.join(trial_dir, "state.pt")
+
+    t0 = time.perf_counter()
+    res = trainer.fit(
+        cfg,
+        _WORKER["train_ds"],
+        _WORKER["val_ds"],
+        save_path=save_path,
+        state_path=state_path,
+        init_state=_WORKER["init_state"],
+        resume=resume,
+        ckpt_every=0,                 # only the stop-epoch state, which the next rung resumes from
+        stop_after_epoch=budget,
+        device=torch.device("cpu"),
+        seed=seed,
+        verbose=False,
+    )
+    return {
+        "trial": trial["trial"],
+        "epochs_trained": res["epoch"],
+        "best_val": res["best_val"],
+        "last_val": res["last_val"],
+        "ckpt": save_path,
+        "state": state_path,
+        "wall_s": time.perf_counter() - t0,
+    }
+
+
+# -------------------------
+# Successive halving (driver side)
+# -------------------------
+def successive_halving(trials: List[dict], args, spec: dict) -> pd.DataFrame:
+    rows = {t["trial"]: {**t, "status": "pending", "epochs_trained": 0, "best_val": math.inf, "last_val": math.nan, "wall_s": 0.0} for t in trials}
+    live = [t["trial"] for t in trials]
+    budget = int(args.min_epochs)
+    rung = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(spec, args.threads_per_worker)) as pool:
+        while live:
+            t0 = time.perf_counter()
+            futs = {}
+            for tid in live:
+                target = min(budget, int(rows[tid]["epochs"]))
+                if rows[tid]["epochs_trained"] >= target:
+                    continue              # completed at an earlier rung, already scored
+                resume = rows[tid]["epochs_trained"] > 0
+                futs[pool.submit(run_trial, rows[tid], target, rows[tid]["dir"], args.seed, resume)] = tid
+            for fut in as_completed(futs):
+                res = fut.result()
+                wall = rows[res["trial"]]["wall_s"] + res.pop("wall_s")
+                rows[res["trial"]].update(res, wall_s=wall, rung=rung)
+
+            # rank every live trial at this rung by best val Huber so far; the top 1/eta survive
+            live.sort(key=lambda tid: rows[tid]["best_val"])
+            n_keep = max(1, len(live) // int(args.eta))
+            for tid in live[n_keep:]:
+                rows[tid]["status"] = f"pruned@{rows[tid]['epochs_trained']}"
+            live = live[:n_keep]
+            for tid in live:
+                rows[tid]["status"] = "completed" if rows[tid]["epochs_trained"] >= rows[tid]["epochs"] else "running"
+
+            best = rows[live[0]]
+            print(
+                f"[RUNG {rung}] budget={budget} ran={len(futs)} kept={len(live)} | "
+                f"best trial={best['trial']} val={best['best_val']:.6f} | {time.perf_counter() - t0:.1f}s"
+            )
+            if all(rows[tid]["status"] == "completed" for tid in live):
+                break
+            budget *= int(args.eta)
+            rung += 1
+
+    df = pd.DataFrame(list(rows.values()))
+    df = df.sort_values(["best_val", "epochs_trained"], ascending=[True, False]).reset_index(drop=True)
+    df.insert(0, "rank", np.arange(1, len(df) + 1))
+    return df
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Successive-halving hyper-parameter search for 05_train_return")
+    ap.add_argument("--pt_dir", type=str, default=os.path.abspath(os.path.join(THIS_DIR, "..", "data", "data_pt")))
+    ap.add_argument("--mae_ckpt", type=str, default=os.path.abspath(os.path.join(THIS_DIR, "..", "model", "market_encoder_best_ema.pth")))
+    ap.add_argument("--out_dir", type=str, default=os.path.abspath(os.path.join(THIS_DIR, "..", "model", "hpsearch_return")))
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    ap.add_argument("--threads_per_worker", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=42, help="training seed shared by every trial")
+
+    # Search space: comma-separated lists (a single value = fixed)
+    d = trainer.DEFAULT_CONFIG
+    for k in SEARCH_KEYS:
+        ap.add_argument(f"--{k}", type=str, default=str(d[k]))
+    ap.add_argument("--n_trials", type=int, default=0, help="sample this many configs from the grid (0 = full grid)")
+    ap.add_argument("--search_seed", type=int, default=0)
+
+    # Successive halving
+    ap.add_argument("--min_epochs", type=int, default=5, help="budget of the first rung")
+    ap.add_argument("--eta", type=int, default=3, help="keep 1/eta trials per rung, multiply the budget by eta")
+    args = ap.parse_args()
+    if args.eta < 2:
+        raise ValueError("--eta must be >= 2")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    trials = build_trials(args)
+    for t in trials:
+        t["dir"] = trial_dir(args.out_dir, t, args.seed)
+    print(f"[SEARCH] {len(trials)} trials | workers={args.workers} | min_epochs={args.min_epochs} eta={args.eta}")
+
+    t0 = time.perf_counter()
+    spec = export_shared(args, os.path.join(args.out_dir, "shared"))
+    print(f"[SHARED] datasets + MAE init exported in {time.perf_counter() - t0:.2f}s")
+
+    with open(os.path.join(args.out_dir, "search_config.json"), "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "trials": trials}, f, indent=2)
+
+    board = successive_halving(trials, args, spec)
+    out_csv = os.path.join(args.out_dir, "leaderboard.csv")
+    board.to_csv(out_csv, index=False)
+
+    cols = ["rank", "trial", "status", "epochs_trained", "best_val", *SEARCH_KEYS]
+    print(board[cols].head(10).to_string(index=False))
+    print(f"[SAVE] {out_csv} | total {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Linear / MLP Probing of MAE Checkpoints (model selection for 04_train_mae.py runs):
+- Each checkpoint's patch_proj + pos_embed + encoder (loaded exactly as ReturnFullModel.init_from_mae
+  does) runs ONCE, in eval mode, over every train/val window; the mean-pooled embeddings
+  [n_windows, embed_dim] and next-day return targets are cached under --cache_dir, keyed by the
+  checkpoint's content hash and a hash of the split data, so re-probing (new heads, new alphas) never
+  re-runs the encoder, while regenerated data does
+- Heads fitted on the cached embeddings only:
+    * ridge : closed form on standardized embeddings (float64, one eigendecomposition for all alphas)
+    * mlp   : ReturnFullModel's own head (LayerNorm -> Linear -> GELU -> Linear), AdamW on
+              Huber + lambda_corr * cross-section corr loss, like 05_train_return.py
+- Scored with 05_train_return's selection metric: inverse-vol weighted Huber at EVAL_HUBER_BETA on val,
+  plus the cross-section corr loss and the pred/target std ratio (collapse check)
+- Writes probe_results.csv (one row per checkpoint x head, best alpha / epoch) under --out_dir
+"""
+
+import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
+import argparse
+import glob
+import hashlib
+import importlib.util
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+
+# Shared helpers live in ../2_backtest
+if BACKTEST_DIR not in sys.path:
+    sys.path.insert(0, BACKTEST_DIR)
+from pack_io import find_pack
+
+
+def _load_trainer():
+    # 05_train_return.py is not importable by name (digit prefix)
+    spec = importlib.util.spec_from_file_location("train_return", os.path.join(THIS_DIR, "05_train_return.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+trainer = _load_trainer()
+
+CACHE_VERSION = 2
+
+
+def file_digest(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def data_digest(ds) -> str:
+    # content of the arrays the cache is built from (X windows and the R targets)
+    h = hashlib.sha1()
+    for t in (ds.X, ds.R):
+        a = t.detach().cpu().contiguous().numpy()
+        h.update(str((a.shape, a.dtype.str)).encode("utf-8"))
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+# -------------------------
+# Embedding cache
+# -------------------------
+@torch.no_grad()
+def embed_windows(model: nn.Module, ds, batch_size: int, device: torch.device) -> torch.Tensor:
+    """
+    Mean-pooled encoder embeddings [len(ds), embed_dim] for every window of ds (same windows and
+    normalization as ReturnPredDataset.__getitem__, built batch-wise from a strided view).
+    """
+    model.eval()
+    W = ds.window_size
+    windows = ds.X.unfold(0, W, 1).transpose(1, 2)[: len(ds)]   # [N,W,F] view, row i = X[i:i+W]
+    out = []
+    for s in range(0, windows.shape[0], batch_size):
+        w = windows[s : s + batch_size].to(device)
+        mu = w.mean(dim=1, keepdim=True)
+        std = w.std(dim=1, keepdim=True, unbiased=False).add(1e-5)
+        x = (w - mu) / std
+        B, T, F = x.shape
+        tokens = model.patch_proj(x.reshape(B, T // model.patch_size, model.patch_size * F)) + model.pos_embed
+        out.append(model.encoder(tokens).mean(dim=1).float().cpu())
+    return torch.cat(out, dim=0)
+
+
+def cached_embeddings(ckpt: str, datasets: Dict[str, object], args, device: torch.device) -> Dict[str, object]:
+    """
+    {"digest", "embed_s", "cached", split: {"emb", "y"}} for one checkpoint; computed and saved on a miss.
+    """
+    digest = file_digest(ckpt)
+    splits = {
+        split: {"n": len(ds), "pack": ds.meta.get("split"), "data": data_digest(ds)}
+        for split, ds in datasets.items()
+    }
+    data_key = hashlib.sha1(repr(sorted((k, v["data"]) for k, v in splits.items())).encode("utf-8")).hexdigest()
+    path = os.path.join(args.cache_dir, f"{os.path.splitext(os.path.basename(ckpt))[0]}_{digest[:12]}_{data_key[:8]}.pt")
+
+    if os.path.isfile(path):
+        cache = torch.load(path, map_location="cpu", weights_only=False)
+        if cache.get("version") == CACHE_VERSION and cache.get("digest") == digest and cache.get("splits") == splits:
+            return {**cache, "cached": True}
+
+    t0 = time.perf_counter()
+    model = trainer.build_model(mae_init_ckpt=ckpt).to(device)
+    cache = {"version": CACHE_VERSION, "ckpt": os.path.abspath(ckpt), "digest": digest, "splits": splits}
+    for split, ds in datasets.items():
+        cache[split] = {
+            "emb": embed_windows(model, ds, args.batch_size, device),
+            "y": ds.R[ds.window_size : ds.window_size + len(ds)].clone(),   # target of window i = R[i+W]
+        }
+    cache["embed_s"] = time.perf_counter() - t0
+    os.makedirs(args.cache_dir, exist_ok=True)
+    torch.save(cache, path)
+    return {**cache, "cached": False}
+
+
+# -------------------------
+# Scoring
+# -------------------------
+@torch.no_grad()
+def score(pred: torch.Tensor, y: torch.Tensor, loss_fn: nn.Module, corr_loss_fn: nn.Module) -> Dict[str, float]:
+    pred, y = pred.float(), y.float()
+    ratio = pred.std(dim=0, unbiased=False) / (y.std(dim=0, unbiased=False) + 1e-12)
+    return {
+        "val_huber": float(loss_fn(pred, y).item()),
+        "val_corr": float(corr_loss_fn(pred, y).item()),
+        "std_ratio": float(ratio.mean().item()),
+    }
+
+
+# -------------------------
+# Heads
+# -------------------------
+def fit_ridge(Xtr: torch.Tensor, Ytr: torch.Tensor, Xva: torch.Tensor, alphas: List[float]) -> Dict[float, torch.Tensor]:
+    """
+    Closed-form ridge on standardized features with an unpenalized intercept; returns val
+    predictions per alpha. X^T X is eigendecomposed once, so every alpha is one matmul.
+    """
+    Xtr, Ytr, Xva = Xtr.double(), Ytr.double(), Xva.double()
+    mu = Xtr.mean(dim=0)
+    sd = Xtr.std(dim=0, unbiased=False).clamp_min(1e-8)
+    Ztr, Zva = (Xtr - mu) / sd, (Xva - mu) / sd
+    y_mu = Ytr.mean(dim=0)
+
+    evals, evecs = torch.linalg.eigh(Ztr.T @ Ztr)      # [D], [D,D]
+    proj = evecs.T @ (Ztr.T @ (Ytr - y_mu))             # [D,out]
+    out = {}
+    for a in alphas:
+        W = evecs @ (proj / (evals + float(a)).unsqueeze(1))
+        out[a] = Zva @ W + y_mu
+    return out
+
+
+def fit_mlp(Xtr, Ytr, Xva, Yva, loss_fn, val_loss_fn, corr_loss_fn, args, device) -> Dict[str, object]:
+    """
+    ReturnFullModel's head on cached embeddings (no dropout in the head, so cached eval-mode
+    embeddings are exactly what the fine-tune's head would see with the encoder frozen).
+    Returns the val predictions of the best epoch by val Huber.
+    """
+    torch.manual_seed(args.seed)
+    embed_dim = Xtr.shape[1]
+    head = trainer.ReturnFullModel(embed_dim=embed_dim).head.to(device)
+    opt = torch.optim.AdamW(head.parameters(), lr=args.mlp_lr, weight_decay=args.mlp_weight_decay)
+
+    Xtr, Ytr, Xva, Yva = Xtr.to(device), Ytr.to(device), Xva.to(device), Yva.to(device)
+    g = torch.Generator().manual_seed(args.seed)
+    best = {"val_huber": float("inf"), "epoch": 0, "pred": None}
+    for ep in range(1, args.mlp_epochs + 1):
+        head.train()
+        perm = torch.randperm(Xtr.shape[0], generator=g).to(device)
+        for s in range(0, Xtr.shape[0] - args.mlp_batch_size + 1, args.mlp_batch_size):
+            idx = perm[s : s + args.mlp_batch_size]
+            pred = head(Xtr[idx])
+            loss = loss_fn(pred, Ytr[idx]) + args.lambda_corr * corr_loss_fn(pred, Ytr[idx])
+            opt.zero_grad(set_to_none=True)
+            loss.backward()
+            opt.step()
+
+        head.eval()
+        with torch.no_grad():
+            pred_va = head(Xva)
+            va = float(val_loss_fn(pred_va, Yva).item())
+        if va < best["val_huber"] or best["pred"] is None:   # NaN losses still leave a prediction to score
+            best = {"val_huber": va, "epoch": ep, "pred": pred_va.cpu()}
+    return best
+
+
+# -------------------------
+# Main
+# -------------------------
+def resolve_ckpts(patterns: List[str]) -> List[str]:
+    out = []
+    for p in patterns:
+        hits = sorted(glob.glob(p)) or ([p] if os.path.isfile(p) else [])
+        if not hits:
+            print(f"[SKIP] no checkpoint matches {p}")
+        out.extend(h for h in hits if h not in out)
+    return out
+
+
+def probe(args):
+    device = torch.device(args.device)
+    datasets = {split: trainer.ReturnPredDataset(find_pack(args.pt_dir, split), window_size=20) for split in ("train", "val")}
+
+    # same inverse-vol weights and selection metric as 05_train_return.fit
+    target_std = datasets["train"].R[20:].std(dim=0, unbiased=False).clamp_min(1e-6)
+    inv_vol = 1.0 / target_std
+    inv_vol = inv_vol / inv_vol.mean()
+    loss_fn = trainer.WeightedHuberLoss(beta=args.huber_beta, weights=inv_vol).to(device)
+    val_loss_fn = trainer.WeightedHuberLoss(beta=trainer.EVAL_HUBER_BETA, weights=inv_vol).to(device)
+    corr_loss_fn = trainer.BatchCrossSectionCorrLoss().to(device)
+    score_fns = (trainer.WeightedHuberLoss(beta=trainer.EVAL_HUBER_BETA, weights=inv_vol), trainer.BatchCrossSectionCorrLoss())
+
+    heads = [h.strip() for h in args.heads.split(",") if h.strip()]
+    if not heads or set(heads) - {"ridge", "mlp"}:
+        raise ValueError(f"--heads must be a comma list from ridge,mlp (got {args.heads})")
+    if "mlp" in heads and args.mlp_epochs < 1:
+        raise ValueError(f"--mlp_epochs must be >= 1 for the mlp head (got {args.mlp_epochs})")
+    alphas = [float(a) for a in args.ridge_alphas.split(",") if a.strip()]
+    ckpts = resolve_ckpts(args.ckpts)
+    print(f"[PROBE] {len(ckpts)} checkpoints | heads={heads} | cache={args.cache_dir}")
+
+    rows = []
+    for ckpt in ckpts:
+        cache = cached_embeddings(ckpt, datasets, args, device)
+        Xtr, Ytr = cache["train"]["emb"], cache["train"]["y"]
+        Xva, Yva = cache["val"]["emb"], cache["val"]["y"]
+        base = {"ckpt": ckpt, "digest": cache["digest"][:12], "cached": cache["cached"], "embed_s": cache.get("embed_s", 0.0)}
+        how = "cache hit" if cache["cached"] else f"computed in {base['embed_s']:.1f}s"
+        print(f"[EMBED] {ckpt} | train={tuple(Xtr.shape)} val={tuple(Xva.shape)} | {how}")
+
+        if "ridge" in heads:
+            t0 = time.perf_counter()
+            preds = fit_ridge(Xtr, Ytr, Xva, alphas)
+            fit_s = time.perf_counter() - t0
+            scored = {a: score(p, Yva, *score_fns) for a, p in preds.items()}
+            a_best = min(scored, key=lambda a: scored[a]["val_huber"])
+            rows.append({**base, "head": "ridge", "alpha": a_best, "epoch": np.nan, **scored[a_best], "fit_s": fit_s})
+
+        if "mlp" in heads:
+            t0 = time.perf_counter()
+            best = fit_mlp(Xtr, Ytr, Xva, Yva, loss_fn, val_loss_fn, corr_loss_fn, args, device)
+            fit_s = time.perf_counter() - t0
+            rows.append({**base, "head": "mlp", "alpha": np.nan, "epoch": best["epoch"], **score(best["pred"], Yva, *score_fns), "fit_s": fit_s})
+
+        for r in rows[-len(heads):]:
+            print(f"  {r['head']:<5} val_huber={r['val_huber']:.6f} val_corr={r['val_corr']:.4f} "
+                  f"std_ratio={r['std_ratio']:.3f} fit={r['fit_s']:.2f}s")
+
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df = df.sort_values(["head", "val_huber"]).reset_index(drop=True)
+    os.makedirs(args.out_dir, exist_ok=True)
+    out_csv = os.path.join(args.out_dir, "probe_results.csv")
+    df.to_csv(out_csv, index=False)
+    if not df.empty:
+        print(df[["head", "val_huber", "val_corr", "std_ratio", "alpha", "epoch", "ckpt"]].to_string(index=False))
+    print(f"[SAVE] {out_csv}")
+
+
+def parse_args():
+    model_dir = os.path.abspath(os.path.join(THIS_DIR, "..", "model"))
+    ap = argparse.ArgumentParser(description="Probe MAE checkpoints with ridge / MLP heads on cached frozen-encoder embeddings")
+    ap.add_argument("--ckpts", type=str, nargs="+",
+                    default=[os.path.join(model_dir, "market_encoder_best_ema.pth"), os.path.join(model_dir, "market_encoder_best_raw.pth")],
+                    help="MAE checkpoint paths or glob patterns")
+    ap.add_argument("--pt_dir", type=str, default=os.path.abspath(os.path.join(THIS_DIR, "..", "data", "data_pt")))
+    ap.add_argument("--cache_dir", type=str, default=os.path.join(model_dir, "probe_cache"))
+    ap.add_argument("--out_dir", type=str, default=os.path.join(model_dir, "probe"))
+    ap.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    ap.add_argument("--batch_size", type=int, default=1024, help="windows per encoder forward when building the cache")
+    ap.add_argument("--heads", type=str, default="ridge,mlp", help="comma list from ridge,mlp")
+    ap.add_argument("--ridge_alphas", type=str, default="0.1,1,10,100,1000,10000,100000")
+
+    # MLP head (defaults follow 05_train_return's DEFAULT_CONFIG)
+    d = trainer.DEFAULT_CONFIG
+    ap.add_argument("--mlp_epochs", type=int, default=100)
+    ap.add_argument("--mlp_batch_size", type=int, default=d["batch_size"])
+    ap.add_argument("--mlp_lr", type=float, default=1e-3)
+    ap.add_argument("--mlp_weight_decay", type=float, default=d["weight_decay"])
+    ap.add_argument("--huber_beta", type=float, default=d["huber_beta"])
+    ap.add_argument("--lambda_corr", type=float, default=d["lambda_corr"])
+    ap.add_argument("--seed", type=int, default=42)
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    probe(parse_args())
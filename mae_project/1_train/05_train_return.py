@@ -10,31 +10,39 @@ Modified to reduce "mean-collapse" (mu_hat nearly constant):
 
 Scheme B added:
 - cross-sectional correlation auxiliary loss (per-sample over 5 assets)
+
+Resumable:
+- full training state (model, AdamW, LambdaLR, RNG, epoch, best val) saved atomically every
+  --ckpt_every epochs to --state_path; --resume continues the run bit-for-bit
 """
 
 import os
-import glob
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
 import math
-from typing import Tuple
+import argparse
+from typing import Dict, Tuple
 
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Subset
 from torch.optim.lr_scheduler import LambdaLR
 
+# Shared helpers live in ../2_backtest; train_checkpoint sits next to this script
+for _d in (BACKTEST_DIR, THIS_DIR):
+    if _d not in sys.path:
+        sys.path.insert(0, _d)
+from pack_io import find_pack, load_pack
+from train_checkpoint import load_training_state, save_training_state
+
 
 # -------------------------
 # Utils
 # -------------------------
-def find_pack(pt_dir: str, split: str) -> str:
-    cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*.pt")))
-    if not cand:
-        raise FileNotFoundError(f"Cannot find pack for split='{split}' under {pt_dir}")
-    return cand[0]
-
-
 def set_seed(seed: int = 42):
     torch.manual_seed(seed)
     np.random.seed(seed)
@@ -209,23 +217,32 @@ class ReturnFullModel(nn.Module):
 # -------------------------
 # Dataset
 # -------------------------
+def _finite_float(t: torch.Tensor) -> torch.Tensor:
+    # already-clean float32 input (e.g. a shared memmap) is used as-is instead of copied
+    t = t.float()
+    if bool(torch.isfinite(t).all()):
+        return t
+    return torch.nan_to_num(t, nan=0.0, posinf=0.0, neginf=0.0)
+
+
 class ReturnPredDataset(Dataset):
     """
     Each sample:
       input  : X[idx:idx+20] (20,22) window-normalized
       target : R[idx+20]     (5,)   next-day raw log returns
     """
-    def __init__(self, pt_pack: str, window_size: int = 20):
-        pack = torch.load(pt_pack, map_location="cpu")
+    def __init__(self, pt_pack, window_size: int = 20):
+        # pt_pack: pack path, or an already-loaded {"meta", "X", "R"} dict (e.g. shared memmap arrays)
+        pack = load_pack(pt_pack) if isinstance(pt_pack, str) else pt_pack
         if not isinstance(pack, dict) or "X" not in pack or "R" not in pack:
-            raise TypeError(f"Bad pack format: {pt_pack}")
+            raise TypeError(f"Bad pack format: {pt_pack if isinstance(pt_pack, str) else type(pt_pack)}")
 
         self.meta = pack.get("meta", {})
         X = pack["X"]
         R = pack["R"]
 
-        self.X = torch.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0).float()
-        self.R = torch.nan_to_num(R, nan=0.0, posinf=0.0, neginf=0.0).float()
+        self.X = _finite_float(X)
+        self.R = _finite_float(R)
 
         self.window_size = int(window_size)
         if self.window_size != 20:
@@ -314,94 +331,155 @@ class BatchCrossSectionCorrLoss(nn.Module):
 # Eval
 # -------------------------
 @torch.no_grad()
-def eval_loss(model: nn.Module, loader: DataLoader, device: torch.device, loss_fn: nn.Module) -> float:
+def evaluate(
+    model: nn.Module,
+    loader: DataLoader,
+    device: torch.device,
+    loss_fn: nn.Module,
+    corr_loss_fn: nn.Module = None,
+) -> Dict[str, object]:
+    """
+    One forward per batch for every eval metric:
+      huber    : sample-weighted mean of loss_fn
+      corr     : sample-weighted mean of corr_loss_fn (if given)
+      pred_std / tgt_std : per-asset population std of predictions / targets (collapse diagnostics),
+                           from float64 running sums, so predictions are never concatenated
+    """
     model.eval()
-    s = 0.0
+    s_huber = 0.0
+    s_corr = 0.0
     n = 0
+    sums = None
     for x, y in loader:
         x = x.to(device, non_blocking=True)
         y = y.to(device, non_blocking=True)
         pred = model(x)
-        loss = loss_fn(pred, y)
-        s += float(loss.item()) * x.size(0)
-        n += x.size(0)
-    return s / max(1, n)
+        b = x.size(0)
+        s_huber += float(loss_fn(pred, y).item()) * b
+        if corr_loss_fn is not None:
+            s_corr += float(corr_loss_fn(pred, y).item()) * b
 
+        p64, y64 = pred.double(), y.double()
+        batch_sums = torch.stack([p64.sum(0), (p64 * p64).sum(0), y64.sum(0), (y64 * y64).sum(0)])
+        sums = batch_sums if sums is None else sums + batch_sums
+        n += b
 
-@torch.no_grad()
-def eval_corr_loss(model: nn.Module, loader: DataLoader, device: torch.device, corr_loss_fn: nn.Module) -> float:
-    model.eval()
-    s = 0.0
-    n = 0
-    for x, y in loader:
-        x = x.to(device, non_blocking=True)
-        y = y.to(device, non_blocking=True)
-        pred = model(x)
-        loss_corr = corr_loss_fn(pred, y)
-        s += float(loss_corr.item()) * x.size(0)
-        n += x.size(0)
-    return s / max(1, n)
+    out = {"n": n, "huber": s_huber / max(1, n), "corr": s_corr / max(1, n) if corr_loss_fn is not None else float("nan")}
+    if n > 0:
+        mean_p, sq_p, mean_y, sq_y = (sums / n).cpu().numpy()
+        out["pred_std"] = np.sqrt(np.maximum(sq_p - mean_p ** 2, 0.0))
+        out["tgt_std"] = np.sqrt(np.maximum(sq_y - mean_y ** 2, 0.0))
+    return out
 
 
-@torch.no_grad()
-def eval_pred_stats(model: nn.Module, loader: DataLoader, device: torch.device) -> Tuple[np.ndarray, np.ndarray]:
+def eval_subset(ds: Dataset, max_samples: int) -> Dataset:
     """
-    Return per-asset std of predictions and targets on a loader.
-    Useful to detect collapse (pred std too small).
+    Fixed, evenly spaced subsample of ds (max_samples <= 0 or >= len(ds): the whole set).
+    Deterministic, so train-eval numbers are comparable across epochs.
     """
-    model.eval()
-    pred_list = []
-    tgt_list = []
-    for x, y in loader:
-        x = x.to(device, non_blocking=True)
-        pred = model(x).cpu()
-        pred_list.append(pred)
-        tgt_list.append(y)
-
-    P = torch.cat(pred_list, dim=0).numpy()
-    Y = torch.cat(tgt_list, dim=0).numpy()
-    return P.std(axis=0), Y.std(axis=0)
+    if max_samples <= 0 or max_samples >= len(ds):
+        return ds
+    idx = np.linspace(0, len(ds) - 1, int(max_samples)).round().astype(int)
+    return Subset(ds, np.unique(idx).tolist())
 
 
 # -------------------------
 # Train
 # -------------------------
-def train():
-    set_seed(42)
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Hyper-parameters exposed to train() and the search driver (05_hpsearch_return.py)
+DEFAULT_CONFIG = {
+    "epochs": 100,
+    "batch_size": 32,        # smaller batch often helps avoid over-smoothing in noisy financial prediction
+    "lr": 2e-4,
+    "weight_decay": 0.01,    # reduced from 0.05
+    "lambda_corr": 0.2,      # Scheme B weight; try 0.1~0.3
+    "huber_beta": 0.01,      # smaller beta for daily return scale
+}
 
-    # Data
-    pt_dir = "../data/data_pt"
-    train_pack = find_pack(pt_dir, "train")
-    val_pack = find_pack(pt_dir, "val")
+# Validation Huber beta used for model selection, fixed so runs with different training betas compare
+EVAL_HUBER_BETA = 0.01
 
-    train_ds = ReturnPredDataset(train_pack, window_size=20)
-    val_ds = ReturnPredDataset(val_pack, window_size=20)
 
-    # smaller batch often helps avoid over-smoothing in noisy financial prediction
-    BATCH_SIZE = 32
+def build_model(init_state: dict = None, mae_init_ckpt: str = None) -> "ReturnFullModel":
+    """
+    ReturnFullModel with the random head init of the current RNG state, then either a full
+    pre-initialized state_dict (init_state) or the MAE encoder weights (mae_init_ckpt).
+    """
+    model = ReturnFullModel(
+        num_feat=22,
+        seq_len=20,
+        patch_size=5,
+        embed_dim=256,
+        enc_layers=6,
+        dropout=0.1,
+        out_dim=5,
+    )
+    if init_state is not None:
+        model.load_state_dict(init_state, strict=True)
+    elif mae_init_ckpt is not None:
+        model.init_from_mae(mae_init_ckpt)
+    return model
+
+
+def fit(
+    cfg: dict,
+    train_ds: ReturnPredDataset,
+    val_ds: ReturnPredDataset,
+    save_path: str,
+    state_path: str = None,
+    init_state: dict = None,
+    mae_init_ckpt: str = None,
+    resume: bool = False,
+    ckpt_every: int = 1,
+    stop_after_epoch: int = None,
+    device: torch.device = None,
+    seed: int = 42,
+    verbose: bool = True,
+    eval_batch_size: int = 256,
+    train_eval_samples: int = 0,
+) -> dict:
+    """
+    Train one config. The LR schedule always spans cfg["epochs"]; stop_after_epoch ends the run
+    early with a training-state checkpoint, so a later resume=True call continues it exactly
+    (used by successive halving). Returns {"epoch", "best_val", "last_val", "history"}.
+
+    Evaluation is inference-only, so it runs with eval_batch_size; the train-eval diagnostics
+    (printed every 5 epochs) use a fixed subsample of train_eval_samples windows (0 = all).
+    """
+    cfg = {**DEFAULT_CONFIG, **cfg}
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    log = print if verbose else (lambda *a, **k: None)
 
+    BATCH_SIZE = int(cfg["batch_size"])
+
+    # Every DataLoader iterator draws a base seed from its generator (the global RNG if none), so
+    # the loaders get their own generators: how often we evaluate must not shift the shuffle
+    # order or the dropout stream of training.
+    shuffle_gen = torch.Generator().manual_seed(int(seed))
     train_loader = DataLoader(
         train_ds,
         batch_size=BATCH_SIZE,
         shuffle=True,
         drop_last=True,
         pin_memory=torch.cuda.is_available(),
+        generator=shuffle_gen,
     )
     # for fair train eval & std diagnostics
     train_eval_loader = DataLoader(
-        train_ds,
-        batch_size=BATCH_SIZE,
+        eval_subset(train_ds, train_eval_samples),
+        batch_size=int(eval_batch_size),
         shuffle=False,
         drop_last=False,
         pin_memory=torch.cuda.is_available(),
+        generator=torch.Generator(),
     )
     val_loader = DataLoader(
         val_ds,
-        batch_size=BATCH_SIZE,
+        batch_size=int(eval_batch_size),
         shuffle=False,
         drop_last=False,
         pin_memory=torch.cuda.is_available(),
+        generator=torch.Generator(),
     )
 
     # build per-asset inverse-vol weights from train targets
@@ -410,38 +488,30 @@ def train():
     target_std = R_train_targets.std(dim=0, unbiased=False).clamp_min(1e-6)
     inv_vol = (1.0 / target_std)
     inv_vol = inv_vol / inv_vol.mean()  # normalize around 1
-    print(f"[LOSS] target_std={target_std.numpy()} inv_vol_w={inv_vol.numpy()}")
+    log(f"[LOSS] target_std={target_std.numpy()} inv_vol_w={inv_vol.numpy()}")
 
-    # Model + MAE init
-    mae_init_ckpt = "../model/market_encoder_best_ema.pth"  # init only
-    model = ReturnFullModel(
-        num_feat=22,
-        seq_len=20,
-        patch_size=5,
-        embed_dim=256,
-        enc_layers=6,
-        dropout=0.1,
-        out_dim=5,
-    )
-    model.init_from_mae(mae_init_ckpt)
+    # Model + MAE init (seeded here so the head init and the shuffle order only depend on `seed`)
+    set_seed(seed)
+    model = build_model(init_state=init_state, mae_init_ckpt=mae_init_ckpt)
     model = model.to(device)
+    torch.manual_seed(seed + 1)   # dropout stream independent of how the init weights were obtained
 
     # train ALL params
     params = [p for p in model.parameters() if p.requires_grad]
-    print(f"[INFO] Trainable params: {sum(p.numel() for p in params):,}")
+    log(f"[INFO] Trainable params: {sum(p.numel() for p in params):,}")
 
-    EPOCHS = 100
-    LR = 2e-4
-    WEIGHT_DECAY = 0.01  # reduced from 0.05
+    EPOCHS = int(cfg["epochs"])
+    LR = float(cfg["lr"])
+    WEIGHT_DECAY = float(cfg["weight_decay"])
 
     optimizer = optim.AdamW(params, lr=LR, weight_decay=WEIGHT_DECAY)
 
-    # key change: smaller beta for daily return scale
-    loss_fn = WeightedHuberLoss(beta=0.01, weights=inv_vol).to(device)
+    loss_fn = WeightedHuberLoss(beta=float(cfg["huber_beta"]), weights=inv_vol).to(device)
+    val_loss_fn = loss_fn if float(cfg["huber_beta"]) == EVAL_HUBER_BETA else WeightedHuberLoss(beta=EVAL_HUBER_BETA, weights=inv_vol).to(device)
 
     # Scheme B auxiliary loss
     corr_loss_fn = BatchCrossSectionCorrLoss().to(device)
-    LAMBDA_CORR = 0.2  # try 0.1~0.3; start from 0.2
+    LAMBDA_CORR = float(cfg["lambda_corr"])
 
     # Scheduler: warmup + cosine decay (per-step)
     steps_per_epoch = len(train_loader)
@@ -460,12 +530,31 @@ def train():
     scheduler = LambdaLR(optimizer, lr_lambda=lr_lambda)
 
     best_val = float("inf")
-    save_path = "../model/downstream_return_full.pth"
 
-    print(f"\n--- Train Return FULL model on {device} | save={save_path} ---")
-    print(f"[AUX] Using corr loss: total = huber + {LAMBDA_CORR:.3f} * corr_loss")
-
-    for ep in range(1, EPOCHS + 1):
+    # everything that shapes the step sequence; a resumed run must match it
+    run_config = {
+        "epochs": EPOCHS, "batch_size": BATCH_SIZE, "lr": LR, "weight_decay": WEIGHT_DECAY,
+        "lambda_corr": LAMBDA_CORR, "huber_beta": float(cfg["huber_beta"]), "seed": int(seed),
+        "n_train": len(train_ds), "n_val": len(val_ds),
+    }
+    start_ep = 1
+    history = []
+    if resume and state_path and os.path.isfile(state_path):
+        state = load_training_state(state_path, model, optimizer, scheduler, config=run_config)
+        start_ep = state["epoch"] + 1
+        best_val = state["best_val"]
+        history = list(state["extra"].get("history", []))
+        shuffle_gen.set_state(state["extra"]["shuffle_rng"])
+        log(f"[RESUME] {state_path} -> epoch {start_ep} | best_val={best_val:.6f}")
+    elif resume:
+        log(f"[RESUME] no state at {state_path}; starting from scratch")
+
+    last_ep = EPOCHS if stop_after_epoch is None else min(EPOCHS, int(stop_after_epoch))
+
+    log(f"\n--- Train Return FULL model on {device} | save={save_path} ---")
+    log(f"[AUX] Using corr loss: total = huber + {LAMBDA_CORR:.3f} * corr_loss")
+
+    for ep in range(start_ep, last_ep + 1):
         model.train()
         s = 0.0
         s_huber = 0.0
@@ -497,12 +586,10 @@ def train():
         tr_running_huber = s_huber / max(1, n)
         tr_running_corr = s_corr / max(1, n)
 
-        # fair comparison: eval() huber loss on train and val
-        tr_eval = eval_loss(model, train_eval_loader, device, loss_fn)
-        va = eval_loss(model, val_loader, device, loss_fn)
-
-        # auxiliary metric (not used for model selection by default)
-        va_corr = eval_corr_loss(model, val_loader, device, corr_loss_fn)
+        # single val pass: selection Huber + corr + std diagnostics
+        va_stats = evaluate(model, val_loader, device, val_loss_fn, corr_loss_fn)
+        va = va_stats["huber"]
+        history.append(va)
 
         if va < best_val:
             best_val = va
@@ -511,29 +598,90 @@ def train():
         if ep == 1 or ep % 5 == 0:
             cur_lr = optimizer.param_groups[0]["lr"]
 
+            # fair comparison: eval() huber loss on train (+ collapse diagnostics), one pass
+            tr_stats = evaluate(model, train_eval_loader, device, loss_fn)
+            tr_eval = tr_stats["huber"]
+
+            # auxiliary metric (not used for model selection by default)
+            va_corr = va_stats["corr"]
+
             # collapse diagnostics
-            pred_std_tr, tgt_std_tr = eval_pred_stats(model, train_eval_loader, device)
-            pred_std_va, tgt_std_va = eval_pred_stats(model, val_loader, device)
+            pred_std_tr, tgt_std_tr = tr_stats["pred_std"], tr_stats["tgt_std"]
+            pred_std_va, tgt_std_va = va_stats["pred_std"], va_stats["tgt_std"]
 
-            print(
+            log(
                 f"Epoch {ep:03d} | lr={cur_lr:.6e} | "
                 f"train_total={tr_running:.6f} | train_huber={tr_running_huber:.6f} | train_corr={tr_running_corr:.6f} | "
                 f"train_eval={tr_eval:.6f} | val={va:.6f} | val_corr={va_corr:.6f} | best_val={best_val:.6f}"
             )
-            print(
+            log(
                 f"   [STD train] pred={np.round(pred_std_tr, 6)} "
                 f"tgt={np.round(tgt_std_tr, 6)} "
                 f"| ratio={np.round(pred_std_tr / (tgt_std_tr + 1e-12), 3)}"
             )
-            print(
+            log(
                 f"   [STD val  ] pred={np.round(pred_std_va, 6)} "
                 f"tgt={np.round(tgt_std_va, 6)} "
                 f"| ratio={np.round(pred_std_va / (tgt_std_va + 1e-12), 3)}"
             )
 
-    print(f"\nDone. Best val={best_val:.6f} saved to {save_path}")
+        # periodic state, plus always at the end of a budgeted (stop_after_epoch) call so it can be continued
+        periodic = ckpt_every > 0 and (ep % ckpt_every == 0 or ep == last_ep)
+        if state_path and (periodic or (ep == last_ep and stop_after_epoch is not None)):
+            save_training_state(
+                state_path, ep, model, optimizer, scheduler, best_val,
+                config=run_config, extra={"history": history, "shuffle_rng": shuffle_gen.get_state()},
+            )
+
+    return {
+        "epoch": max(last_ep, start_ep - 1),
+        "best_val": best_val,
+        "last_val": history[-1] if history else float("nan"),
+        "history": history,
+    }
+
+
+def train(args):
+    # Data
+    pt_dir = "../data/data_pt"
+    train_pack = find_pack(pt_dir, "train")
+    val_pack = find_pack(pt_dir, "val")
+
+    train_ds = ReturnPredDataset(train_pack, window_size=20)
+    val_ds = ReturnPredDataset(val_pack, window_size=20)
+
+    cfg = {**DEFAULT_CONFIG, "epochs": args.epochs}
+    save_path = "../model/downstream_return_full.pth"
+    mae_init_ckpt = "../model/market_encoder_best_ema.pth"  # init only
+
+    res = fit(
+        cfg,
+        train_ds,
+        val_ds,
+        save_path=save_path,
+        state_path=args.state_path,
+        mae_init_ckpt=mae_init_ckpt,
+        resume=args.resume,
+        ckpt_every=args.ckpt_every,
+        eval_batch_size=args.eval_batch_size,
+        train_eval_samples=args.train_eval_samples,
+    )
+
+    print(f"\nDone. Best val={res['best_val']:.6f} saved to {save_path}")
     print("Infer should load ONLY this .pth (no mae_ckpt needed).")
 
 
+def parse_args():
+    ap = argparse.ArgumentParser(description="Train the full return-prediction model (MAE-initialized)")
+    ap.add_argument("--epochs", type=int, default=DEFAULT_CONFIG["epochs"])
+    ap.add_argument("--state_path", type=str, default="../model/downstream_return_full.state.pt",
+                    help="full training-state checkpoint (model + optimizer + scheduler + RNG)")
+    ap.add_argument("--ckpt_every", type=int, default=1, help="write the training state every N epochs (0 = never)")
+    ap.add_argument("--resume", action="store_true", help="continue from --state_path if it exists")
+    ap.add_argument("--eval_batch_size", type=int, default=256, help="batch size of the no-grad eval passes")
+    ap.add_argument("--train_eval_samples", type=int, default=0, help="train-eval diagnostics on a fixed subsample (0 = all)")
+    return ap.parse_args()
+
+
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    train(parse_args())
@@ -23,12 +23,26 @@ Gradual Unfreeze Plan (80 epochs total):
     ep 51-60: last 5 layers
     ep 61-70: last 6 layers (all)
 - patch_proj + pos_embed are unfrozen after encoder reaches 3 layers (from ep 31).
-- IMPORTANT: optimizer param_groups are created ONCE (no add_param_group) to avoid scheduler crash.
+- AdamW starts with the head group only; each block gets its own param group when it unfreezes
+  (sync_param_groups; LambdaLR is rebuilt at the current step), so frozen tensors hold no optimizer state and
+  step() never visits them. Groups are never removed, so Adam moments carry over.
+- While patch_proj/pos_embed are frozen, the frozen leading encoder layers run forward-only
+  (no autograd graph). --cache_frozen goes further: their activations are computed once per unfreeze
+  stage in eval mode (no dropout in the frozen layers) and batches gather them, so early epochs only
+  run the trainable top of the encoder + head.
+
+Resumable:
+- full training state (model, AdamW, LambdaLR, RNG, epoch, unfreeze stage, best val) saved atomically
+  every --ckpt_every epochs to --state_path; --resume continues the run bit-for-bit
 """
 
 import os
-import glob
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
 import math
+import argparse
 from typing import Tuple, Dict
 
 import numpy as np
@@ -38,17 +52,17 @@ import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
 from torch.optim.lr_scheduler import LambdaLR
 
+# Shared helpers live in ../2_backtest; train_checkpoint sits next to this script
+for _d in (BACKTEST_DIR, THIS_DIR):
+    if _d not in sys.path:
+        sys.path.insert(0, _d)
+from pack_io import find_pack, load_pack
+from train_checkpoint import load_training_state, read_training_state, save_training_state
+
 
 # -------------------------
 # Utils
 # -------------------------
-def find_pack(pt_dir: str, split: str) -> str:
-    cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*.pt")))
-    if not cand:
-        raise FileNotFoundError(f"Cannot find pack for split='{split}' under {pt_dir}")
-    return cand[0]
-
-
 def set_seed(seed: int = 42):
     torch.manual_seed(seed)
     np.random.seed(seed)
@@ -178,8 +192,8 @@ class ReturnFullModel(nn.Module):
             nn.Softmax(dim=-1),  # output weights sum to 1
         )
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        # x: [B,20,22]
+    def embed(self, x: torch.Tensor) -> torch.Tensor:
+        # x: [B,20,22] -> patch tokens + positions [B,P,embed_dim]
         B, T, F = x.shape
         if T != self.seq_len or F != self.num_feat:
             raise ValueError(
@@ -190,11 +204,32 @@ class ReturnFullModel(nn.Module):
         patch_dim = self.patch_size * self.num_feat
 
         x_patches = x.reshape(B, P, patch_dim)
-        tokens = self.patch_proj(x_patches) + self.pos_embed
-        latent = self.encoder(tokens)  # [B,P,embed_dim]
+        return self.patch_proj(x_patches) + self.pos_embed
+
+    def encode(self, h: torch.Tensor, start: int = 0, end: int = None) -> torch.Tensor:
+        # encoder layers [start, end) on tokens h
+        layers = self.encoder.layers
+        if start == 0 and (end is None or end == len(layers)):
+            return self.encoder(h)
+        for layer in layers[start:end]:
+            h = layer(h)
+        return h
+
+    def forward_from(self, h: torch.Tensor, start_layer: int = 0) -> torch.Tensor:
+        # h: tokens after the first `start_layer` encoder layers -> weights [B,5]
+        latent = self.encode(h, start_layer)  # [B,P,embed_dim]
         emb = latent.mean(dim=1)  # [B,embed_dim]
         return self.head(emb)  # [B,5]
 
+    def forward(self, x: torch.Tensor, frozen_prefix: int = 0) -> torch.Tensor:
+        # frozen_prefix=k: patch_proj/pos_embed and the first k encoder layers are frozen, so they run
+        # without building an autograd graph (backward stops at layer k)
+        if frozen_prefix > 0:
+            with torch.no_grad():
+                h = self.encode(self.embed(x), 0, frozen_prefix)
+            return self.forward_from(h, frozen_prefix)
+        return self.forward_from(self.embed(x), 0)
+
     @torch.no_grad()
     def init_from_mae(self, mae_ckpt_path: str):
         """
@@ -230,10 +265,12 @@ class PortfolioTrajectoryDataset(Dataset):
     Each sample outputs a continuous temporal block (trajectory):
       input  : X_seq [seq_len, window_size, 22] (normalized rolling windows)
       target : R_seq [seq_len, 5] (corresponding next-day log returns)
+    Normalized windows are built once ([T-W, W, F], one per trajectory step start); a trajectory is then
+    a strided view of S consecutive windows, and batches are a single index gather (get_batch).
     """
 
     def __init__(self, pt_pack: str, window_size: int = 20, seq_len: int = 20):
-        pack = torch.load(pt_pack, map_location="cpu")
+        pack = load_pack(pt_pack)
         if not isinstance(pack, dict) or "X" not in pack or "R" not in pack:
             raise TypeError(f"Bad pack format: {pt_pack}")
 
@@ -255,6 +292,18 @@ class PortfolioTrajectoryDataset(Dataset):
         if self.max_start_idx < 0:
             raise ValueError(f"T too short: T={len(self.X)} need at least {self.window_size + self.seq_len}")
 
+        # windows[j] = window_normalize(X[j:j+W]) paired with r_next[j] = R[j+W], j = 0..T-W-1
+        n_win = len(self.X) - self.window_size
+        w = self.X.unfold(0, self.window_size, 1)[:n_win].transpose(1, 2)     # [n_win, W, F] view
+        mu = w.mean(dim=1, keepdim=True)
+        std = w.std(dim=1, keepdim=True, unbiased=False).add(1e-5)
+        self.windows = ((w - mu) / std).contiguous()
+        self.r_next = self.R[self.window_size :].contiguous()                 # [n_win, N]
+
+        # trajectory views (no copy): traj_x[i] = windows[i:i+S], traj_r[i] = r_next[i:i+S]
+        self.traj_x = self.windows.unfold(0, self.seq_len, 1).permute(0, 3, 1, 2)   # [num_traj, S, W, F]
+        self.traj_r = self.r_next.unfold(0, self.seq_len, 1).permute(0, 2, 1)       # [num_traj, S, N]
+
         print(
             f"[DATA] {self.meta.get('split')} X={tuple(self.X.shape)} "
             f"seq_len={self.seq_len} samples={len(self)}"
@@ -264,15 +313,72 @@ class PortfolioTrajectoryDataset(Dataset):
         return max(0, self.max_start_idx + 1)
 
     def __getitem__(self, idx: int):
-        X_seq = torch.zeros((self.seq_len, self.window_size, self.X.shape[1]), dtype=torch.float32)
-        R_seq = torch.zeros((self.seq_len, self.R.shape[1]), dtype=torch.float32)
+        return self.windows[idx : idx + self.seq_len], self.r_next[idx : idx + self.seq_len]
+
+    def get_batch(self, idx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Trajectories for a batch of start indices: ([B, S, W, F], [B, S, N]).
+        """
+        return self.traj_x[idx], self.traj_r[idx]
+
+
+class TrajectoryBatchLoader:
+    """
+    DataLoader replacement for PortfolioTrajectoryDataset: draws batch start indices and gathers
+    whole batches with get_batch (no per-item __getitem__, no collate). Same batching semantics as
+    DataLoader(batch_size, shuffle, drop_last); data can be moved to `device` once up front.
+    Each iter() draws from the RNG exactly like a DataLoader iterator (base seed, then RandomSampler's
+    seed + randperm), so seeded runs get the same batch order and RNG stream as the DataLoader path.
+    """
+
+    def __init__(
+        self,
+        ds: PortfolioTrajectoryDataset,
+        batch_size: int,
+        shuffle: bool = False,
+        drop_last: bool = False,
+        device: torch.device = torch.device("cpu"),
+        generator: torch.Generator = None,
+    ):
+        self.n = len(ds)
+        self.seq_len = ds.seq_len
+        self.windows = ds.windows.to(device)
+        self.traj_x = self.windows.unfold(0, ds.seq_len, 1).permute(0, 3, 1, 2)
+        self.traj_r = ds.r_next.to(device).unfold(0, ds.seq_len, 1).permute(0, 2, 1)
+        self.batch_size = int(batch_size)
+        self.shuffle = bool(shuffle)
+        self.drop_last = bool(drop_last)
+        self.generator = generator
+
+    def set_window_features(self, feats: torch.Tensor = None) -> None:
+        """
+        Serve per-window features (e.g. cached frozen-encoder activations [n_win, P, D]) instead of
+        the raw windows: batches become [B, S, P, D]. None switches back to raw windows.
+        """
+        src = self.windows if feats is None else feats.to(self.windows.device)
+        self.traj_x = src.unfold(0, self.seq_len, 1).movedim(-1, 1)
 
-        for i in range(self.seq_len):
-            w = self.X[idx + i : idx + i + self.window_size]  # [20, 22]
-            X_seq[i] = window_normalize(w)
-            R_seq[i] = self.R[idx + i + self.window_size]  # [5]  (next-day return)
+    def __len__(self):
+        return self.n // self.batch_size if self.drop_last else math.ceil(self.n / self.batch_size)
+
+    def __iter__(self):
+        # DataLoader iterator: base seed for workers, drawn even with num_workers=0
+        torch.empty((), dtype=torch.int64).random_(generator=self.generator)
+        if self.shuffle:
+            # RandomSampler: without a generator it seeds a fresh one from the global RNG
+            gen = self.generator
+            if gen is None:
+                gen = torch.Generator()
+                gen.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+            order = torch.randperm(self.n, generator=gen)
+        else:
+            order = torch.arange(self.n)
+        return self._batches(order.to(self.traj_x.device))
 
-        return X_seq, R_seq
+    def _batches(self, order: torch.Tensor):
+        for b in range(len(self)):
+            idx = order[b * self.batch_size : (b + 1) * self.batch_size]
+            yield self.traj_x[idx], self.traj_r[idx]
 
 
 # -------------------------
@@ -348,7 +454,11 @@ def eval_sharpe_loss(
     loader: DataLoader,
     device: torch.device,
     loss_fn: EndToEndSharpeLoss,
+    start_layer: int = 0,
 ) -> Tuple[float, float, float]:
+    """
+    start_layer > 0: the loader serves cached activations after that many encoder layers.
+    """
     model.eval()
     total_loss, total_sharpe, total_turnover = 0.0, 0.0, 0.0
     n = 0
@@ -357,10 +467,10 @@ def eval_sharpe_loss(
         x_seq = x_seq.to(device, non_blocking=True)  # [B,S,20,22]
         r_seq = r_seq.to(device, non_blocking=True)  # [B,S,5]
 
-        B, S, T, F = x_seq.shape
-        x_flat = x_seq.view(B * S, T, F)
+        B, S = x_seq.shape[:2]
+        x_flat = x_seq.flatten(0, 1)
 
-        weights_flat = model(x_flat)  # [B*S,5]
+        weights_flat = model.forward_from(x_flat, start_layer) if start_layer > 0 else model(x_flat)  # [B*S,5]
         weights_seq = weights_flat.view(B, S, -1)  # [B,S,5]
 
         loss, stats = loss_fn(weights_seq, r_seq)
@@ -415,13 +525,73 @@ def apply_gradual_unfreeze(
     return {
         "unfrozen_encoder_layers": num_layers_to_unfreeze,
         "patch_pos_on": int(patch_pos_on),
+        # leading encoder layers with nothing trainable below them: forward-only (no autograd graph)
+        "frozen_prefix": 0 if patch_pos_on else L - num_layers_to_unfreeze,
     }
 
 
+def unfreeze_param_blocks(model: ReturnFullModel):
+    """
+    Encoder-side parameter blocks in unfreeze order (last layer first, then patch_proj + pos_embed),
+    as (group_name, params).
+    """
+    L = len(model.encoder.layers)
+    blocks = [(f"encoder.layers.{li}", list(model.encoder.layers[li].parameters())) for li in range(L - 1, -1, -1)]
+    blocks.append(("patch_pos", list(model.patch_proj.parameters()) + [model.pos_embed]))
+    return blocks
+
+
+def sync_param_groups(optimizer: optim.Optimizer, model: ReturnFullModel, lr: float, weight_decay: float, order=None):
+    """
+    Add one AdamW param group per newly trainable block, so the optimizer only ever holds tensors that
+    train. Groups are never removed (the schedule only unfreezes), so Adam moments carry over.
+    `order` (group names saved with a checkpoint) re-adds groups in the order the saved run added them,
+    which optimizer.load_state_dict needs. Returns the names of the groups added; the caller rebuilds
+    the LR scheduler when that is non-empty (see rebuild_scheduler).
+    """
+    blocks = dict(unfreeze_param_blocks(model))
+    names = [name for name in (order or blocks) if name in blocks]
+    have = {g.get("name") for g in optimizer.param_groups}
+    added = []
+    for name in names:
+        params = blocks[name]
+        if name in have or not all(p.requires_grad for p in params):
+            continue
+        optimizer.add_param_group({"params": params, "lr": lr, "weight_decay": weight_decay, "name": name, "initial_lr": lr})
+        added.append(name)
+    return added
+
+
+def rebuild_scheduler(optimizer: optim.Optimizer, lr_lambda, scheduler: LambdaLR = None) -> LambdaLR:
+    """
+    LambdaLR over the optimizer's current groups, continuing at the old scheduler's step: every group
+    (including ones just added, via their initial_lr) gets initial_lr * lr_lambda(step).
+    """
+    if scheduler is None:
+        return LambdaLR(optimizer, lr_lambda=lr_lambda)
+    return LambdaLR(optimizer, lr_lambda=lr_lambda, last_epoch=scheduler.last_epoch - 1)
+
+
+@torch.no_grad()
+def frozen_prefix_features(model: ReturnFullModel, windows: torch.Tensor, n_layers: int, batch_size: int = 1024) -> torch.Tensor:
+    """
+    Activations after embed + the first n_layers encoder layers for every window [n_win, P, D],
+    in eval mode (no dropout). Valid for as long as those layers stay frozen.
+    """
+    was_training = model.training
+    model.eval()
+    out = [
+        model.encode(model.embed(windows[s : s + batch_size]), 0, n_layers)
+        for s in range(0, windows.shape[0], batch_size)
+    ]
+    model.train(was_training)
+    return torch.cat(out, dim=0)
+
+
 # -------------------------
 # Train
 # -------------------------
-def train():
+def train(args):
     set_seed(42)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -434,6 +604,7 @@ def train():
     SEQ_LEN = 64
     WINDOW_SIZE = 20
     BATCH_SIZE = 32
+    RESIDENT_BATCHES = True   # batch gathers from precomputed windows; False = per-item DataLoader path
 
     # Transaction-cost proxy:
     # - cost_rate multiplies one-way turnover (0..1) and subtracts from daily return.
@@ -441,8 +612,8 @@ def train():
     COST_RATE = 0.0005
 
     # Gradual unfreeze schedule
-    EPOCHS = 80
-    UNFREEZE_EVERY = 10               # every 10 epochs unfreeze 1 more encoder layer (from last -> first)
+    EPOCHS = args.epochs
+    UNFREEZE_EVERY = args.unfreeze_every  # default 10: every 10 epochs unfreeze 1 more encoder layer (from last -> first)
     UNFREEZE_PATCH_POS_AFTER_K = 3    # unfreeze patch_proj + pos_embed after >=3 encoder layers are unfrozen
 
     # LR
@@ -453,15 +624,21 @@ def train():
     train_ds = PortfolioTrajectoryDataset(train_pack, window_size=WINDOW_SIZE, seq_len=SEQ_LEN)
     val_ds = PortfolioTrajectoryDataset(val_pack, window_size=WINDOW_SIZE, seq_len=SEQ_LEN)
 
-    train_loader = DataLoader(
-        train_ds, batch_size=BATCH_SIZE, shuffle=True, drop_last=True, pin_memory=torch.cuda.is_available()
-    )
-    train_eval_loader = DataLoader(
-        train_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=False, pin_memory=torch.cuda.is_available()
-    )
-    val_loader = DataLoader(
-        val_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=False, pin_memory=torch.cuda.is_available()
-    )
+    if RESIDENT_BATCHES:
+        # precomputed windows on the training device; each batch is one strided gather
+        train_loader = TrajectoryBatchLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True, drop_last=True, device=device)
+        train_eval_loader = TrajectoryBatchLoader(train_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=False, device=device)
+        val_loader = TrajectoryBatchLoader(val_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=False, device=device)
+    else:
+        train_loader = DataLoader(
+            train_ds, batch_size=BATCH_SIZE, shuffle=True, drop_last=True, pin_memory=torch.cuda.is_available()
+        )
+        train_eval_loader = DataLoader(
+            train_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=False, pin_memory=torch.cuda.is_available()
+        )
+        val_loader = DataLoader(
+            val_ds, batch_size=BATCH_SIZE, shuffle=False, drop_last=False, pin_memory=torch.cuda.is_available()
+        )
 
     # Model + MAE init
     mae_init_ckpt = "../model/market_encoder_best_ema.pth"  # init only
@@ -481,9 +658,7 @@ def train():
 
     model = model.to(device)
 
-    # Build optimizer param groups ONCE (do not add groups later).
-    # We include all encoder + patch_proj params in the optimizer from the start, even if frozen.
-    encoder_params = list(model.encoder.parameters()) + list(model.patch_proj.parameters()) + [model.pos_embed]
+    # Optimizer starts with the head only; encoder blocks join via sync_param_groups as they unfreeze.
     head_params = []
     for name, p in model.named_parameters():
         if name.startswith("encoder.") or name.startswith("patch_proj.") or name == "pos_embed":
@@ -492,15 +667,14 @@ def train():
 
     optimizer = optim.AdamW(
         [
-            {"params": head_params, "lr": LR_HEAD, "weight_decay": WEIGHT_DECAY},
-            {"params": encoder_params, "lr": LR_ENCODER, "weight_decay": WEIGHT_DECAY},
+            {"params": head_params, "lr": LR_HEAD, "weight_decay": WEIGHT_DECAY, "name": "head"},
         ],
     )
 
     # Loss
     loss_fn = EndToEndSharpeLoss(cost_rate=COST_RATE, ann_factor=252, eps=1e-6).to(device)
 
-    # Scheduler: warmup + cosine decay (works because param_groups count is constant)
+    # Scheduler: warmup + cosine decay (rebuilt at the current step whenever sync_param_groups adds groups)
     steps_per_epoch = len(train_loader)
     total_steps = EPOCHS * steps_per_epoch
     warmup_steps = int(0.08 * total_steps)
@@ -513,11 +687,36 @@ def train():
         cosine = 0.5 * (1.0 + math.cos(math.pi * progress))
         return min_lr_ratio + (1.0 - min_lr_ratio) * cosine
 
-    scheduler = LambdaLR(optimizer, lr_lambda=lr_lambda)
+    scheduler = rebuild_scheduler(optimizer, lr_lambda)
 
     best_val_loss = float("inf")
     save_path = "../model/downstream_e2e_sharpe.pth"
 
+    # everything that shapes the step sequence; a resumed run must match it
+    run_config = {
+        "epochs": EPOCHS, "seq_len": SEQ_LEN, "batch_size": BATCH_SIZE, "cost_rate": COST_RATE,
+        "unfreeze_every": UNFREEZE_EVERY, "unfreeze_patch_pos_after_k": UNFREEZE_PATCH_POS_AFTER_K,
+        "lr_head": LR_HEAD, "lr_encoder": LR_ENCODER, "weight_decay": WEIGHT_DECAY,
+        "n_train": len(train_ds), "n_val": len(val_ds),
+    }
+    start_ep = 1
+    if args.resume and os.path.isfile(args.state_path):
+        # re-create the param groups that existed when the state was saved, then load into them
+        state = read_training_state(args.state_path)
+        apply_gradual_unfreeze(model, ep=state["epoch"], unfreeze_every=UNFREEZE_EVERY, unfreeze_patch_pos_after_k=UNFREEZE_PATCH_POS_AFTER_K)
+        if sync_param_groups(optimizer, model, LR_ENCODER, WEIGHT_DECAY, order=state["extra"].get("param_groups")):
+            scheduler = rebuild_scheduler(optimizer, lr_lambda, scheduler)
+        state = load_training_state(args.state_path, model, optimizer, scheduler, config=run_config, state=state)
+        start_ep = state["epoch"] + 1
+        best_val_loss = state["best_val"]
+        uinfo = state["extra"].get("unfreeze", {})
+        print(
+            f"[RESUME] {args.state_path} -> epoch {start_ep} | best_val_loss={best_val_loss:.6f} | "
+            f"unfrozen_encoder_layers={uinfo.get('unfrozen_encoder_layers')} patch+pos={uinfo.get('patch_pos_on')}"
+        )
+    elif args.resume:
+        print(f"[RESUME] no state at {args.state_path}; starting from scratch")
+
     print(f"\n--- Train E2E Portfolio Model on {device} | save={save_path} ---")
     print(
         f"[CONFIG] EPOCHS={EPOCHS} | Traj SEQ_LEN={SEQ_LEN} | COST_RATE={COST_RATE} | "
@@ -525,7 +724,10 @@ def train():
         f"LR_HEAD={LR_HEAD} | LR_ENCODER={LR_ENCODER}"
     )
 
-    for ep in range(1, EPOCHS + 1):
+    cache_frozen = bool(args.cache_frozen) and RESIDENT_BATCHES
+    feat_layer = 0   # >0: loaders serve cached activations after this many encoder layers
+
+    for ep in range(start_ep, EPOCHS + 1):
         # Apply gradual unfreeze schedule (idempotent; safe to call every epoch)
         uinfo = apply_gradual_unfreeze(
             model,
@@ -533,11 +735,23 @@ def train():
             unfreeze_every=UNFREEZE_EVERY,
             unfreeze_patch_pos_after_k=UNFREEZE_PATCH_POS_AFTER_K,
         )
-
-        if ep == 1 or ep % UNFREEZE_EVERY == 1:
+        added = sync_param_groups(optimizer, model, LR_ENCODER, WEIGHT_DECAY)
+        if added:
+            scheduler = rebuild_scheduler(optimizer, lr_lambda, scheduler)
+        frozen_prefix = uinfo["frozen_prefix"]
+
+        if cache_frozen and frozen_prefix != feat_layer:
+            # (re)build the activation cache for this stage, or drop it once patch_proj trains
+            for loader in (train_loader, train_eval_loader, val_loader):
+                feats = frozen_prefix_features(model, loader.windows, frozen_prefix) if frozen_prefix > 0 else None
+                loader.set_window_features(feats)
+            feat_layer = frozen_prefix
+
+        if ep == start_ep or ep % UNFREEZE_EVERY == 1 or added:
             print(
                 f"[UNFREEZE_PLAN] ep={ep:03d} unfrozen_encoder_layers={uinfo['unfrozen_encoder_layers']} "
-                f"patch+pos={'ON' if uinfo['patch_pos_on'] else 'OFF'}"
+                f"patch+pos={'ON' if uinfo['patch_pos_on'] else 'OFF'} | frozen_prefix={frozen_prefix}"
+                f"{' (cached)' if feat_layer else ''} | opt_groups={[g['name'] for g in optimizer.param_groups]}"
             )
 
         model.train()
@@ -548,12 +762,15 @@ def train():
             x_seq = x_seq.to(device, non_blocking=True)
             r_seq = r_seq.to(device, non_blocking=True)
 
-            B, S, T, F = x_seq.shape
-            x_flat = x_seq.view(B * S, T, F)
+            B, S = x_seq.shape[:2]
+            x_flat = x_seq.flatten(0, 1)
 
             optimizer.zero_grad(set_to_none=True)
 
-            weights_flat = model(x_flat)
+            if feat_layer:
+                weights_flat = model.forward_from(x_flat, feat_layer)
+            else:
+                weights_flat = model(x_flat, frozen_prefix=frozen_prefix)
             weights_seq = weights_flat.view(B, S, -1)
 
             loss, stats = loss_fn(weights_seq, r_seq)
@@ -573,7 +790,7 @@ def train():
         tr_turn = s_turn / max(1, n)
 
         # Evaluate
-        va_loss, va_sharpe, va_turn = eval_sharpe_loss(model, val_loader, device, loss_fn)
+        va_loss, va_sharpe, va_turn = eval_sharpe_loss(model, val_loader, device, loss_fn, start_layer=feat_layer)
 
         if va_loss < best_val_loss:
             best_val_loss = va_loss
@@ -582,7 +799,7 @@ def train():
         if ep == 1 or ep % 5 == 0:
             # show each group's current lr for debugging
             lrs = [g["lr"] for g in optimizer.param_groups]
-            te_loss, te_sharpe, te_turn = eval_sharpe_loss(model, train_eval_loader, device, loss_fn)
+            te_loss, te_sharpe, te_turn = eval_sharpe_loss(model, train_eval_loader, device, loss_fn, start_layer=feat_layer)
             print(
                 f"Epoch {ep:03d} | lrs={','.join([f'{x:.2e}' for x in lrs])} | "
                 f"Train: loss={tr_loss:.4f}, sharpe={tr_sharpe:.4f}, turn={tr_turn:.4f} | "
@@ -591,8 +808,28 @@ def train():
                 f"BestValLoss={best_val_loss:.4f}"
             )
 
+        if args.ckpt_every > 0 and (ep % args.ckpt_every == 0 or ep == EPOCHS):
+            save_training_state(
+                args.state_path, ep, model, optimizer, scheduler, best_val_loss,
+                config=run_config,
+                extra={"unfreeze": uinfo, "param_groups": [g["name"] for g in optimizer.param_groups]},
+            )
+
     print(f"\nDone. Best val loss={best_val_loss:.6f} saved to {save_path}")
 
 
+def parse_args():
+    ap = argparse.ArgumentParser(description="Train the end-to-end Sharpe portfolio model with gradual unfreeze")
+    ap.add_argument("--epochs", type=int, default=80)
+    ap.add_argument("--unfreeze_every", type=int, default=10, help="epochs per gradual-unfreeze stage")
+    ap.add_argument("--cache_frozen", action="store_true",
+                    help="cache frozen-prefix encoder activations per unfreeze stage (eval-mode, no dropout in frozen layers)")
+    ap.add_argument("--state_path", type=str, default="../model/downstream_e2e_sharpe.state.pt",
+                    help="full training-state checkpoint (model + optimizer + scheduler + RNG + unfreeze stage)")
+    ap.add_argument("--ckpt_every", type=int, default=1, help="write the training state every N epochs (0 = never)")
+    ap.add_argument("--resume", action="store_true", help="continue from --state_path if it exists")
+    return ap.parse_args()
+
+
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    train(parse_args())
\ No newline at end of file
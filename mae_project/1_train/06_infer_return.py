@@ -16,8 +16,9 @@ import os
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 PT_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "data", "data_pt"))
 MODEL_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "model"))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
 
-import glob
+import sys
 import math
 import argparse
 from typing import Dict, Optional
@@ -25,7 +26,14 @@ from typing import Dict, Optional
 import numpy as np
 import torch
 import torch.nn as nn
-from scipy.optimize import minimize
+
+# Shared helpers live in ../2_backtest
+if BACKTEST_DIR not in sys.path:
+    sys.path.insert(0, BACKTEST_DIR)
+from oracle_cache import ORACLE_CACHE_DIR, oracle_weights_matrix
+from pack_io import find_pack, load_pack
+from portfolio_opt import solve_max_sharpe
+from rolling_cov import RollingCovariance
 
 
 np.set_printoptions(suppress=True, precision=6)
@@ -35,13 +43,6 @@ torch.set_printoptions(precision=6, sci_mode=False)
 # -----------------------------
 # Utils
 # -----------------------------
-def find_pack(pt_dir: str, split: str) -> str:
-    cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*.pt")))
-    if not cand:
-        raise FileNotFoundError(f"Cannot find pack for split='{split}' under {pt_dir}")
-    return cand[0]
-
-
 def window_normalize(w: torch.Tensor, eps: float = 1e-5) -> torch.Tensor:
     mu = w.mean(dim=0, keepdim=True)
     std = w.std(dim=0, keepdim=True, unbiased=False).add(eps)
@@ -119,92 +120,6 @@ class ReturnFullModel(nn.Module):
         return self.head(emb)  # [B,5]
 
 
-# -----------------------------
-# Optimizer with turnover penalty
-# -----------------------------
-def max_sharpe_long_only(
-    mu: np.ndarray,
-    Sigma: np.ndarray,
-    w_prev: Optional[np.ndarray] = None,
-    gamma_turn: float = 0.0,
-    turnover_l1: bool = False,
-    eps: float = 1e-8,
-) -> np.ndarray:
-    """
-    Solve:
-        maximize  Sharpe(w; mu, Sigma) - gamma_turn * penalty(w, w_prev)
-    subject to:
-        w>=0, sum(w)=1
-
-    penalty:
-        if turnover_l1: ||w - w_prev||_1
-        else:          ||w - w_prev||_2^2   (default, smoother & easier)
-    """
-    mu = np.asarray(mu, dtype=np.float64)
-    Sigma = np.asarray(Sigma, dtype=np.float64)
-    N = mu.shape[0]
-    Sigma = Sigma + np.eye(N) * 1e-6
-
-    w0 = np.ones(N, dtype=np.float64) / N
-
-    if w_prev is not None:
-        w_prev = np.asarray(w_prev, dtype=np.float64).clip(0.0, 1.0)
-        s = w_prev.sum()
-        w_prev = (w_prev / s) if s > 0 else w0
-        w0 = w_prev.copy()
-
-    def neg_objective(w):
-        num = float(np.dot(w, mu))
-        den = float(np.sqrt(np.dot(w, Sigma @ w) + eps))
-        sharpe = num / den
-
-        if (w_prev is None) or (gamma_turn <= 0.0):
-            pen = 0.0
-        else:
-            if turnover_l1:
-                pen = gamma_turn * float(np.sum(np.abs(w - w_prev)))
-            else:
-                d = (w - w_prev)
-                pen = gamma_turn * float(np.dot(d, d))  # L2^2
-
-        return -(sharpe - pen)
-
-    cons = ({'type': 'eq', 'fun': lambda w: np.sum(w) - 1.0},)
-    bounds = [(0.0, 1.0)] * N
-
-    res = minimize(
-        neg_objective,
-        w0,
-        method="SLSQP",
-        bounds=bounds,
-        constraints=cons,
-        options={"maxiter": 200, "ftol": 1e-9},
-    )
-    if (not res.success) or np.any(np.isnan(res.x)):
-        return w0
-
-    w = res.x.clip(0.0, 1.0)
-    s = w.sum()
-    return w0 if s <= 0 else (w / s)
-
-
-def oracle_teacher_weights(returns_21xN: np.ndarray) -> np.ndarray:
-    R = np.asarray(returns_21xN, dtype=np.float64)
-    mu = R.mean(axis=0)
-    Sigma = np.cov(R, rowvar=False)
-    return max_sharpe_long_only(mu, Sigma)
-
-
-def estimate_cov_pastK(returns_TxN: np.ndarray, end_idx_inclusive: int, K: int) -> np.ndarray:
-    start = max(0, end_idx_inclusive - K + 1)
-    win = returns_TxN[start:end_idx_inclusive + 1]
-    N = returns_TxN.shape[1]
-    if win.shape[0] < 2:
-        return np.eye(N) * 1e-3
-    Sigma = np.cov(win, rowvar=False)
-    return Sigma + np.eye(N) * 1e-6
-
-
 # -----------------------------
 # Metrics (same set)
 # -----------------------------
@@ -263,7 +178,14 @@ def main():
     default=os.path.join(MODEL_DIR, "downstream_return_full.pth"),
     help="FULL model checkpoint (one pth)",)
     ap.add_argument("--cov_window", type=int, default=60, help="past K days for covariance estimate")
+    ap.add_argument("--cov_method", type=str, default="sample", choices=["sample", "ewma", "ledoit_wolf"],
+                    help="rolling covariance estimator (sample = np.cov over past K days)")
+    ap.add_argument("--cov_ewma_lambda", type=float, default=0.94, help="decay for --cov_method ewma")
     ap.add_argument("--device", type=str, default="cuda")
+    ap.add_argument("--oracle_cache_dir", type=str, default=ORACLE_CACHE_DIR,
+                    help="on-disk oracle-teacher weights cache keyed by pack content hash ('' = no cache)")
+    ap.add_argument("--oracle_workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                    help="process pool size for oracle solves on a cache miss")
 
     # New knobs for turnover control
     ap.add_argument("--gamma_turn", type=float, default=0.0, help="turnover penalty strength (0=baseline)")
@@ -275,7 +197,7 @@ def main():
     device = torch.device(args.device if (args.device == "cpu" or torch.cuda.is_available()) else "cpu")
 
     pack_path = find_pack(args.pt_dir, args.split)
-    pack = torch.load(pack_path, map_location="cpu")
+    pack = load_pack(pack_path)
     X = pack["X"].float()  # [T,22]
     R = pack["R"].float()  # [T,5]
     meta = pack.get("meta", {})
@@ -302,11 +224,19 @@ def main():
 
     R_np = R.numpy()
 
+    # Oracle teacher weights depend only on R: cached per pack content hash, row idx <-> R[idx:idx+21]
+    oracle_W = oracle_weights_matrix(R_np, window=21, cache_dir=args.oracle_cache_dir, workers=args.oracle_workers)
+
     w_pred_list, w_oracle_list = [], []
     port_pred, port_oracle = [], []
 
     w_prev = None
     mu_ema_vec = None
+    solve_reports = []
+    cov_est = RollingCovariance(
+        n_assets=R_np.shape[1], window=args.cov_window, method=args.cov_method, ewma_lambda=args.cov_ewma_lambda,
+        returns_TxN=R_np,
+    )
 
     for idx in range(max_idx + 1):
         xw = window_normalize(X[idx:idx + 20]).unsqueeze(0).to(device)  # [1,20,22]
@@ -326,10 +256,10 @@ def main():
             mu_use = r_hat
 
         t_idx = idx + 19
-        Sigma = estimate_cov_pastK(R_np, end_idx_inclusive=t_idx, K=args.cov_window)
+        Sigma = cov_est.cov_at(end_idx_inclusive=t_idx)
 
         # Pred strategy: with optional turnover penalty
-        w_pred = max_sharpe_long_only(
+        w_pred, rep = solve_max_sharpe(
             mu=mu_use,
             Sigma=Sigma,
             w_prev=w_prev,
@@ -337,9 +267,10 @@ def main():
             turnover_l1=args.turnover_l1,
         )
         w_prev = w_pred
+        solve_reports.append(rep)
 
         # Oracle teacher
-        w_oracle = oracle_teacher_weights(R_np[idx:idx + 21, :])
+        w_oracle = oracle_W[idx]
 
         r_real = R_np[idx + 20, :]
         port_pred.append(float(np.dot(w_pred, r_real)))
@@ -369,6 +300,15 @@ def main():
         "OracleTeacher": m_oracle,
     })
 
+    methods = sorted({r.method for r in solve_reports})
+    print(
+        f"\n[OPT] solves={len(solve_reports)} "
+        f"methods={ {m: sum(r.method == m for r in solve_reports) for m in methods} } "
+        f"not_converged={sum(not r.converged for r in solve_reports)} "
+        f"mean_iters={np.mean([r.iterations for r in solve_reports]):.1f} "
+        f"total_wall={sum(r.wall_time_s for r in solve_reports):.3f}s"
+    )
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -11,7 +11,10 @@ Infer/Eval (End-to-End): Model directly outputs portfolio weights
 """
 
 import os
-import glob
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKTEST_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "2_backtest"))
+
+import sys
 import math
 import argparse
 from typing import Dict, Optional
@@ -19,7 +22,12 @@ from typing import Dict, Optional
 import numpy as np
 import torch
 import torch.nn as nn
-from scipy.optimize import minimize
+
+# Shared helpers live in ../2_backtest
+if BACKTEST_DIR not in sys.path:
+    sys.path.insert(0, BACKTEST_DIR)
+from oracle_cache import ORACLE_CACHE_DIR, oracle_weights_matrix
+from pack_io import find_pack, load_pack
 
 
 np.set_printoptions(suppress=True, precision=6)
@@ -29,13 +37,6 @@ torch.set_printoptions(precision=6, sci_mode=False)
 # -----------------------------
 # Utils
 # -----------------------------
-def find_pack(pt_dir: str, split: str) -> str:
-    cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*.pt")))
-    if not cand:
-        raise FileNotFoundError(f"Cannot find pack for split='{split}' under {pt_dir}")
-    return cand[0]
-
-
 def window_normalize(w: torch.Tensor, eps: float = 1e-5) -> torch.Tensor:
     mu = w.mean(dim=0, keepdim=True)
     std = w.std(dim=0, keepdim=True, unbiased=False).add(eps)
@@ -112,52 +113,6 @@ class ReturnFullModel(nn.Module):
         return self.head(emb)  # [B,5]
 
 
-# -----------------------------
-# Oracle Optimizer (Retained only for the Oracle Teacher Baseline)
-# -----------------------------
-def max_sharpe_long_only(
-    mu: np.ndarray,
-    Sigma: np.ndarray,
-    eps: float = 1e-8,
-) -> np.ndarray:
-    mu = np.asarray(mu, dtype=np.float64)
-    Sigma = np.asarray(Sigma, dtype=np.float64)
-    N = mu.shape[0]
-    Sigma = Sigma + np.eye(N) * 1e-6
-
-    w0 = np.ones(N, dtype=np.float64) / N
-
-    def neg_objective(w):
-        num = float(np.dot(w, mu))
-        den = float(np.sqrt(np.dot(w, Sigma @ w) + eps))
-        return -(num / den)
-
-    cons = ({'type': 'eq', 'fun': lambda w: np.sum(w) - 1.0},)
-    bounds = [(0.0, 1.0)] * N
-
-    res = minimize(
-        neg_objective,
-        w0,
-        method="SLSQP",
-        bounds=bounds,
-        constraints=cons,
-        options={"maxiter": 200, "ftol": 1e-9},
-    )
-    if (not res.success) or np.any(np.isnan(res.x)):
-        return w0
-
-    w = res.x.clip(0.0, 1.0)
-    s = w.sum()
-    return w0 if s <= 0 else (w / s)
-
-
-def oracle_teacher_weights(returns_21xN: np.ndarray) -> np.ndarray:
-    R = np.asarray(returns_21xN, dtype=np.float64)
-    mu = R.mean(axis=0)
-    Sigma = np.cov(R, rowvar=False)
-    return max_sharpe_long_only(mu, Sigma)
-
-
 # -----------------------------
 # Metrics (same set)
 # -----------------------------
@@ -212,13 +167,17 @@ def main():
     ap.add_argument("--split", type=str, default="val", choices=["train", "val", "test"])
     ap.add_argument("--ckpt", type=str, default="../model/downstream_e2e_sharpe.pth", help="FULL model checkpoint")
     ap.add_argument("--device", type=str, default="cuda")
+    ap.add_argument("--oracle_cache_dir", type=str, default=ORACLE_CACHE_DIR,
+                    help="on-disk oracle-teacher weights cache keyed by pack content hash ('' = no cache)")
+    ap.add_argument("--oracle_workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                    help="process pool size for oracle solves on a cache miss")
 
     args = ap.parse_args()
 
     device = torch.device(args.device if (args.device == "cpu" or torch.cuda.is_available()) else "cpu")
 
     pack_path = find_pack(args.pt_dir, args.split)
-    pack = torch.load(pack_path, map_location="cpu")
+    pack = load_pack(pack_path)
     X = pack["X"].float()  # [T,22]
     R = pack["R"].float()  # [T,5]
     meta = pack.get("meta", {})
@@ -244,6 +203,9 @@ def main():
 
     R_np = R.numpy()
 
+    # Oracle teacher weights depend only on R: cached per pack content hash, row idx <-> R[idx:idx+21]
+    oracle_W = oracle_weights_matrix(R_np, window=21, cache_dir=args.oracle_cache_dir, workers=args.oracle_workers)
+
     w_pred_list, w_oracle_list = [], []
     port_pred, port_oracle = [], []
 
@@ -257,7 +219,7 @@ def main():
         t_idx = idx + 19
 
         # Oracle teacher (用于参照系比对)
-        w_oracle = oracle_teacher_weights(R_np[idx:idx + 21, :])
+        w_oracle = oracle_W[idx]
 
         r_real = R_np[idx + 20, :]
         port_pred.append(float(np.dot(w_pred, r_real)))
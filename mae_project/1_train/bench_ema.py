@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+EMA update benchmark for 04_train_mae.py:
+- legacy   : state_dict blend + load_state_dict(strict=True) every step (previous EMA class)
+- foreach  : EMA from 04_train_mae.py (flat pre-gathered lists, _foreach_mul_/_foreach_add_)
+- foreach k: same with update_every=k (decay**k every k-th step)
+- Same MacroConditionedMAE, same perturbed weights each step; reports us/step and the max
+  |ema - legacy_ema| after N steps (k=1 must match the legacy EMA to float rounding)
+"""
+
+import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+import argparse
+import copy
+import importlib.util
+import time
+
+import torch
+import torch.nn as nn
+
+
+def _load_train_module():
+    spec = importlib.util.spec_from_file_location("train_mae", os.path.join(THIS_DIR, "04_train_mae.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class LegacyEMA:
+    def __init__(self, model: nn.Module, decay: float = 0.999):
+        self.decay = float(decay)
+        self.ema_model = copy.deepcopy(model).eval()
+        for p in self.ema_model.parameters():
+            p.requires_grad_(False)
+
+    @torch.no_grad()
+    def update(self, model: nn.Module):
+        d = self.decay
+        msd = model.state_dict()
+        esd = self.ema_model.state_dict()
+        for k in esd.keys():
+            esd[k].mul_(d).add_(msd[k], alpha=1.0 - d)
+        self.ema_model.load_state_dict(esd, strict=True)
+
+
+def _max_dev(a: nn.Module, b: nn.Module) -> float:
+    sa, sb = a.state_dict(), b.state_dict()
+    return max(float((sa[k].float() - sb[k].float()).abs().max().item()) for k in sa)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark EMA update implementations")
+    ap.add_argument("--steps", type=int, default=300)
+    ap.add_argument("--decay", type=float, default=0.999)
+    ap.add_argument("--every", type=str, default="1,4,16", help="comma list of update_every values for the foreach EMA")
+    ap.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    ap.add_argument("--ema_device", type=str, default=None)
+    args = ap.parse_args()
+
+    mae = _load_train_module()
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    model = mae.MacroConditionedMAE().to(device)
+    n_params = sum(p.numel() for p in model.parameters())
+
+    # precomputed per-step weight perturbations so every variant sees the same trajectory
+    params = list(model.parameters())
+    init = [p.detach().clone() for p in params]
+
+    def set_step(i: int):
+        with torch.no_grad():
+            for p, p0 in zip(params, init):
+                p.copy_(p0).add_(1e-3 * (i % 7))
+
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+
+    variants = [("legacy", lambda: LegacyEMA(model, decay=args.decay))]
+    for k in [int(x) for x in args.every.split(",") if x.strip()]:
+        variants.append((f"foreach(k={k})", lambda k=k: mae.EMA(model, decay=args.decay, update_every=k, device=args.ema_device)))
+
+    print(f"[EMA] MacroConditionedMAE params={n_params:,} device={device} ema_device={args.ema_device or device} steps={args.steps}")
+    results = {}
+    for name, make in variants:
+        set_step(0)
+        ema = make()
+        total = 0.0
+        for i in range(args.steps):
+            set_step(i + 1)
+            sync()
+            t0 = time.perf_counter()
+            ema.update(model)
+            sync()
+            total += time.perf_counter() - t0
+        results[name] = ema
+        dev = _max_dev(ema.ema_model, results["legacy"].ema_model) if name != "legacy" else 0.0
+        print(f"  {name:<14} {1e6 * total / args.steps:9.1f} us/step   max|ema - legacy|={dev:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Full-State Training Checkpoints (used by 05_train_return.py and 05_train_sharpe.py):
+- One file holds everything needed to continue a run exactly where it stopped:
+  model, optimizer, LR scheduler, epoch, best-val tracker, script-specific extras
+  (e.g. the unfreeze stage) and the RNG states (python / numpy / torch CPU / CUDA)
+- Writes are atomic: torch.save to a temp file in the same directory, fsync, os.replace,
+  so a run killed mid-write leaves the previous checkpoint intact
+- A config dict is stored alongside; resuming with a different config is refused,
+  since the LR schedule and data order would no longer line up
+"""
+
+from __future__ import annotations
+
+import os
+import random
+from typing import Any, Dict, Optional
+
+import numpy as np
+import torch
+
+STATE_VERSION = 1
+
+
+def capture_rng_state() -> Dict[str, Any]:
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def atomic_torch_save(obj: Any, path: str) -> None:
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_training_state(
+    path: str,
+    epoch: int,
+    model: torch.nn.Module,
+    optimizer: torch.optim.Optimizer,
+    scheduler,
+    best_val: float,
+    config: Optional[Dict[str, Any]] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Snapshot taken at the END of `epoch` (resume starts at epoch + 1).
+    """
+    atomic_torch_save(
+        {
+            "version": STATE_VERSION,
+            "epoch": int(epoch),
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict(),
+            "best_val": float(best_val),
+            "config": dict(config or {}),
+            "extra": dict(extra or {}),
+            "rng": capture_rng_state(),
+        },
+        path,
+    )
+
+
+def read_training_state(path: str) -> Dict[str, Any]:
+    state = torch.load(path, map_location="cpu", weights_only=False)
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"{path}: training state version {state.get('version')} != {STATE_VERSION}")
+    return state
+
+
+def load_training_state(
+    path: str,
+    model: torch.nn.Module,
+    optimizer: torch.optim.Optimizer,
+    scheduler,
+    config: Optional[Dict[str, Any]] = None,
+    restore_rng: bool = True,
+    state: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Load a save_training_state file into already-built model / optimizer / scheduler.
+    Returns the raw state dict (epoch, best_val, extra, ...). Call restore_rng=False if the caller
+    still has RNG-consuming setup to do and restores state["rng"] itself afterwards.
+    Pass `state` (from read_training_state) when the optimizer layout depends on it, e.g. param
+    groups added during training must be re-added before their state can be loaded.
+    """
+    if state is None:
+        state = read_training_state(path)
+    if config is not None:
+        saved = state.get("config", {})
+        diff = {k: (saved.get(k), v) for k, v in config.items() if saved.get(k) != v}
+        if diff:
+            raise ValueError(f"{path}: config differs from the checkpointed run (saved, current): {diff}")
+
+    model.load_state_dict(state["model"], strict=True)
+    optimizer.load_state_dict(state["optimizer"])
+    scheduler.load_state_dict(state["scheduler"])
+    if restore_rng:
+        restore_rng_state(state["rng"])
+    return state
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Order Audit Sinks for HistoricalGateway:
+- MemoryAuditSink : legacy behaviour, keeps every record in a list (saved to CSV at the end)
+- NullAuditSink   : drops records (sweeps / benchmarks)
+- FileAuditSink   : streams records to an append-only file in batches, memory stays flat
+    * jsonl  : one JSON object per line
+    * binary : length-prefixed frames  <u32 frame_len><u8 action><u16 len>date<u16 len>order_id<payload json>
+    * flush every `flush_every` records or `flush_interval_s` seconds, whichever comes first
+      (sync mode runs a small flusher thread for the interval, so an idle buffer is written too)
+    * async_writer=True moves encoding + I/O to a background thread behind a bounded queue;
+      if that thread fails it keeps draining the queue, and write / flush / close raise the error
+      instead of blocking
+- read_audit_log() iterates either format and stops cleanly at a truncated tail,
+  so a crashed run still leaves a usable partial log (everything up to the last flush)
+"""
+
+from __future__ import annotations
+
+import atexit
+import csv
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, List, Optional
+
+AUDIT_FORMATS = ("jsonl", "binary")
+
+# binary format: fixed action codes (unknown actions are stored as code 255 + "action" in the payload)
+ACTIONS = ("sent", "modified", "cancelled", "filled", "rejected")
+_ACTION_CODE = {a: i for i, a in enumerate(ACTIONS)}
+_OTHER_ACTION = 255
+
+_FRAME = struct.Struct("<I")
+_CODE = struct.Struct("<B")
+_STR_LEN = struct.Struct("<H")
+
+_WAIT_S = 0.1       # poll interval of bounded waits on the async writer
+
+
+def _json_default(o):
+    # numpy scalars and other odd payload values
+    if hasattr(o, "item"):
+        return o.item()
+    return str(o)
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+def encode_jsonl(rec: dict) -> bytes:
+    return (_dumps(rec) + "\n").encode("utf-8")
+
+
+def encode_binary(rec: dict) -> bytes:
+    payload = rec.get("payload") or {}
+    code = _ACTION_CODE.get(rec["action"], _OTHER_ACTION)
+    if code == _OTHER_ACTION:
+        payload = {"action": rec["action"], **payload}
+    date_b = str(rec["date"]).encode("utf-8")
+    oid_b = str(rec["order_id"]).encode("utf-8")
+    body = b"".join([
+        _CODE.pack(code),
+        _STR_LEN.pack(len(date_b)), date_b,
+        _STR_LEN.pack(len(oid_b)), oid_b,
+        _dumps(payload).encode("utf-8"),
+    ])
+    return _FRAME.pack(len(body)) + body
+
+
+def _decode_binary_body(body: bytes) -> dict:
+    pos = 0
+    (code,) = _CODE.unpack_from(body, pos)
+    pos += _CODE.size
+    (n,) = _STR_LEN.unpack_from(body, pos)
+    pos += _STR_LEN.size
+    date = body[pos : pos + n].decode("utf-8")
+    pos += n
+    (n,) = _STR_LEN.unpack_from(body, pos)
+    pos += _STR_LEN.size
+    order_id = body[pos : pos + n].decode("utf-8")
+    pos += n
+    payload = json.loads(body[pos:].decode("utf-8"))
+    action = payload.pop("action") if code == _OTHER_ACTION else ACTIONS[code]
+    return {"date": date, "action": action, "order_id": order_id, "payload": payload}
+
+
+def read_audit_log(path: str, fmt: Optional[str] = None) -> Iterator[dict]:
+    """
+    Stream records back from a FileAuditSink file. A partially written last record
+    (crash mid-flush) is ignored.
+    """
+    fmt = fmt or ("binary" if path.endswith(".bin") else "jsonl")
+    if fmt == "jsonl":
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+    elif fmt == "binary":
+        with open(path, "rb") as f:
+            while True:
+                head = f.read(_FRAME.size)
+                if len(head) < _FRAME.size:
+                    return
+                (n,) = _FRAME.unpack(head)
+                body = f.read(n)
+                if len(body) < n:
+                    return
+                yield _decode_binary_body(body)
+    else:
+        raise ValueError(f"Unknown audit format: {fmt} (expected one of {AUDIT_FORMATS})")
+
+
+def audit_log_to_csv(records, path: str) -> int:
+    """
+    Write audit records (any iterable) to CSV row by row; payload is stored as JSON text.
+    Returns the number of rows written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    n = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["date", "action", "order_id", "payload"])
+        for rec in records:
+            w.writerow([rec["date"], rec["action"], rec["order_id"], _dumps(rec.get("payload") or {})])
+            n += 1
+    return n
+
+
+class AuditSink:
+    def write(self, rec: dict) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryAuditSink(AuditSink):
+    def __init__(self):
+        self.records: List[dict] = []
+
+    def write(self, rec: dict) -> None:
+        self.records.append(rec)
+
+
+class NullAuditSink(AuditSink):
+    def write(self, rec: dict) -> None:
+        pass
+
+
+class FileAuditSink(AuditSink):
+    """
+    Append-only batched writer. At most `flush_every` records (plus the async queue,
+    bounded by `max_queue`) are held in memory at any time.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fmt: str = "jsonl",
+        flush_every: int = 256,
+        flush_interval_s: float = 1.0,
+        async_writer: bool = False,
+        max_queue: int = 65536,
+        fsync: bool = False,
+    ):
+        if fmt not in AUDIT_FORMATS:
+            raise ValueError(f"Unknown audit format: {fmt} (expected one of {AUDIT_FORMATS})")
+        self.path = path
+        self.fmt = fmt
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval_s = float(flush_interval_s)
+        self.fsync = bool(fsync)
+        self._encode = encode_jsonl if fmt == "jsonl" else encode_binary
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "ab")
+        self._buf: List[bytes] = []
+        self._last_flush = time.monotonic()
+        self.n_written = 0
+        self._closed = False
+
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()      # sync mode: caller thread vs the interval flusher
+        self._stop = threading.Event()
+        if async_writer:
+            self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+            self._thread = threading.Thread(target=self._writer_loop, name="audit-writer", daemon=True)
+        elif self.flush_interval_s > 0:
+            # without it the interval would only be checked when the next record arrives
+            self._thread = threading.Thread(target=self._interval_loop, name="audit-flusher", daemon=True)
+        if self._thread is not None:
+            self._thread.start()
+
+        # normal interpreter exit (including an uncaught exception) still flushes the tail
+        atexit.register(self.close)
+
+    # -------------------------
+    # Writer side (caller thread in sync mode, background thread in async mode)
+    # -------------------------
+    def _append(self, rec: dict) -> None:
+        self._buf.append(self._encode(rec))
+        if len(self._buf) >= self.flush_every or (time.monotonic() - self._last_flush) >= self.flush_interval_s:
+            self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        if self._buf:
+            self._f.write(b"".join(self._buf))
+            self.n_written += len(self._buf)
+            self._buf.clear()
+            self._f.flush()
+            if self.fsync:
+                os.fsync(self._f.fileno())
+        self._last_flush = time.monotonic()
+
+    def _interval_loop(self) -> None:
+        # sync mode: flush a buffer that has waited flush_interval_s even if no record follows it
+        while not self._stop.wait(self.flush_interval_s):
+            with self._lock:
+                if self._buf and (time.monotonic() - self._last_flush) >= self.flush_interval_s:
+                    try:
+                        self._flush_buffer()
+                    except BaseException as e:   # surfaced on the caller's next write / flush / close
+                        self._error = e
+                        return
+
+    def _writer_loop(self) -> None:
+        q = self._queue
+        holding = False                    # an item was taken from the queue and not yet marked done
+        try:
+            while True:
+                try:
+                    item = q.get(timeout=self.flush_interval_s)
+                except queue.Empty:
+                    self._flush_buffer()
+                    continue
+                holding = True
+                if item is None:           # close sentinel
+                    self._flush_buffer()
+                    q.task_done()
+                    return
+                if isinstance(item, threading.Event):   # flush marker
+                    self._flush_buffer()
+                    item.set()
+                else:
+                    self._append(item)
+                holding = False
+                q.task_done()
+        except BaseException as e:         # surfaced on the caller's next write / flush / close
+            self._error = e
+            if holding:
+                if isinstance(item, threading.Event):
+                    item.set()
+                q.task_done()
+                if item is None:
+                    return
+        # keep draining until close: nothing queued before or after the failure may block a caller
+        while True:
+            item = q.get()
+            if isinstance(item, threading.Event):
+                item.set()
+            q.task_done()
+            if item is None:
+                return
+
+    def _check_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Audit writer thread failed: {self._error!r}") from self._error
+
+    def _put(self, item) -> None:
+        # bounded waits, so a full queue behind a dead writer raises instead of blocking forever
+        while True:
+            self._check_error()
+            try:
+                self._queue.put(item, timeout=_WAIT_S)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise RuntimeError("Audit writer thread is not running")
+
+    # -------------------------
+    # AuditSink API
+    # -------------------------
+    def write(self, rec: dict) -> None:
+        if self._closed:
+            raise RuntimeError("Audit sink is closed")
+        if self._queue is not None:
+            self._put(rec)
+        else:
+            self._check_error()
+            with self._lock:
+                self._append(rec)
+
+    def flush(self) -> None:
+        if self._closed:
+            return
+        if self._queue is not None:
+            done = threading.Event()
+            self._put(done)
+            while not done.wait(_WAIT_S):
+                if not self._thread.is_alive():
+                    break
+            self._check_error()
+            if not done.is_set():
+                raise RuntimeError("Audit writer thread is not running")
+        else:
+            self._check_error()
+            with self._lock:
+                self._flush_buffer()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        try:
+            if self._queue is not None:
+                # the writer consumes the queue until it sees the sentinel, also after a failure
+                while self._thread.is_alive():
+                    try:
+                        self._queue.put(None, timeout=_WAIT_S)
+                        break
+                    except queue.Full:
+                        continue
+                self._thread.join()
+            else:
+                self._stop.set()
+                if self._thread is not None:
+                    self._thread.join()
+                with self._lock:
+                    self._flush_buffer()
+        finally:
+            self._f.close()
+        self._check_error()
+
+
+def make_audit_sink(kind: str, out_dir: str, **kwargs) -> AuditSink:
+    """
+    kind: memory / none / jsonl / binary  (file sinks write <out_dir>/gateway_audit_log.{jsonl,bin})
+    """
+    if kind == "memory":
+        return MemoryAuditSink()
+    if kind == "none":
+        return NullAuditSink()
+    if kind in AUDIT_FORMATS:
+        ext = "jsonl" if kind == "jsonl" else "bin"
+        path = os.path.join(out_dir, f"gateway_audit_log.{ext}")
+        if os.path.exists(path):
+            os.remove(path)      # a fresh run starts a fresh append-only log
+        return FileAuditSink(path, fmt=kind, **kwargs)
+    raise ValueError(f"Unknown audit sink: {kind}")
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar Backtest Logs:
+- Preallocated NumPy column buffers instead of a list of row dicts per log
+- Matrix columns (e.g. daily target / actual weights) are stored natively as [rows, N] arrays,
+  so metrics read them directly with no JSON round-trip
+- Capacity is sized up front (from the pack length); variable-size logs grow by doubling
+- Export:
+    * CSV  : same schema as before (matrix columns rendered as JSON lists)
+    * NPZ  : every column as an array, matrices kept 2-D
+    * Parquet : matrix columns as list columns (needs pyarrow / fastparquet)
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+# column spec: dtype, or (dtype, width) for a matrix column
+ColumnSpec = Union[str, Tuple[str, int]]
+
+LOG_FORMATS = ("npz", "parquet", "none")
+
+
+def _default_fill(dtype: np.dtype):
+    if dtype.kind == "f":
+        return np.nan
+    if dtype.kind == "O":
+        return None
+    return 0
+
+
+class ColumnarLog:
+    """
+    Append-only table with one preallocated NumPy buffer per column.
+
+    Columns not passed to append() are left at their default (NaN for floats, None for objects),
+    which matches what pd.DataFrame(list_of_dicts) produced for missing keys.
+    """
+
+    def __init__(self, schema: Dict[str, ColumnSpec], capacity: int):
+        self.schema = dict(schema)
+        self._n = 0
+        self._cap = max(1, int(capacity))
+        self._cols: Dict[str, np.ndarray] = {}
+        for name, spec in self.schema.items():
+            self._cols[name] = self._alloc(spec, self._cap)
+
+    @staticmethod
+    def _alloc(spec: ColumnSpec, rows: int) -> np.ndarray:
+        if isinstance(spec, tuple):
+            dtype, width = np.dtype(spec[0]), int(spec[1])
+            shape = (rows, width)
+        else:
+            dtype, shape = np.dtype(spec), (rows,)
+        buf = np.empty(shape, dtype=dtype)
+        buf.fill(_default_fill(dtype))
+        return buf
+
+    def _grow(self) -> None:
+        new_cap = self._cap * 2
+        for name, spec in self.schema.items():
+            buf = self._alloc(spec, new_cap)
+            buf[: self._n] = self._cols[name][: self._n]
+            self._cols[name] = buf
+        self._cap = new_cap
+
+    def append(self, **row) -> None:
+        if self._n == self._cap:
+            self._grow()
+        i = self._n
+        for name, value in row.items():
+            self._cols[name][i] = value
+        self._n += 1
+
+    def __len__(self) -> int:
+        return self._n
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        View of the filled part of a column ([rows] or [rows, width]).
+        """
+        return self._cols[name][: self._n]
+
+    def matrix_columns(self):
+        return [name for name, spec in self.schema.items() if isinstance(spec, tuple)]
+
+    # -------------------------
+    # Export
+    # -------------------------
+    def to_frame(self, matrix_as: str = "json") -> pd.DataFrame:
+        """
+        matrix_as:
+            json : matrix rows rendered as JSON list strings (CSV-compatible, legacy schema)
+            list : matrix rows as Python lists (Parquet list columns)
+        """
+        data = {}
+        for name, spec in self.schema.items():
+            col = self.column(name)
+            if isinstance(spec, tuple):
+                rows = col.tolist()
+                data[name] = [json.dumps(r) for r in rows] if matrix_as == "json" else rows
+            else:
+                data[name] = col
+        return pd.DataFrame(data, columns=list(self.schema.keys()))
+
+    def save_csv(self, path: str) -> None:
+        self.to_frame(matrix_as="json").to_csv(path, index=False)
+
+    def save_npz(self, path: str) -> None:
+        arrays = {}
+        for name in self.schema:
+            col = self.column(name)
+            if col.dtype.kind == "O":
+                col = np.array(["" if v is None else str(v) for v in col], dtype=str)
+            arrays[name] = col
+        np.savez(path, **arrays)
+
+    def save_parquet(self, path: str) -> None:
+        self.to_frame(matrix_as="list").to_parquet(path, index=False)
+
+    def save(self, base_path: str, fmt: str) -> str:
+        """
+        Write the columnar copy next to the CSV (base_path without extension). Returns the file written
+        ("" for fmt='none'). Falls back to NPZ if no Parquet engine is installed.
+        """
+        if fmt not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format: {fmt} (expected one of {LOG_FORMATS})")
+        if fmt == "none":
+            return ""
+        if fmt == "parquet":
+            try:
+                self.save_parquet(base_path + ".parquet")
+                return base_path + ".parquet"
+            except ImportError as e:
+                print(f"[WARN] Parquet engine unavailable ({str(e).splitlines()[0]}); writing NPZ instead")
+        self.save_npz(base_path + ".npz")
+        return base_path + ".npz"
+
+
+def daily_log_schema(n_assets: int) -> Dict[str, ColumnSpec]:
+    return {
+        "signal_date": "O",
+        "eval_date": "O",
+        "idx": "i8",
+        "t_idx": "i8",
+        "equity_before": "f8",
+        "cash": "f8",
+        "realized_ret_next": "f8",
+        "opt_method": "O",
+        "opt_converged": "?",
+        "opt_iterations": "i8",
+        "opt_wall_ms": "f8",
+        "target_weights": ("f8", n_assets),
+        "actual_weights_after_rebalance": ("f8", n_assets),
+    }
+
+
+ORDER_LOG_SCHEMA: Dict[str, ColumnSpec] = {
+    "date": "O",
+    "order_id": "O",
+    "symbol": "O",
+    "side": "O",
+    "qty": "f8",
+    "status": "O",
+    "reason": "O",
+    "filled_qty": "f8",
+    "remaining_qty": "f8",
+    "fill_price": "f8",
+}
+
+TRADE_LOG_SCHEMA: Dict[str, ColumnSpec] = {
+    "date": "O",
+    "order_id": "O",
+    "symbol": "O",
+    "side": "O",
+    "filled_qty": "f8",
+    "fill_price": "f8",
+    "signed_notional": "f8",
+    "status": "O",
+}
+
+
+def make_backtest_logs(n_steps: int, n_assets: int) -> Tuple[ColumnarLog, ColumnarLog, ColumnarLog]:
+    """
+    (daily_log, order_log, trade_log) sized for a run of n_steps rebalances over n_assets:
+    one daily row per step, and room for a sent + fill row per asset per step in the order log.
+    """
+    daily = ColumnarLog(daily_log_schema(n_assets), capacity=n_steps)
+    orders = ColumnarLog(ORDER_LOG_SCHEMA, capacity=2 * n_steps * n_assets)
+    trades = ColumnarLog(TRADE_LOG_SCHEMA, capacity=n_steps * n_assets)
+    return daily, orders, trades
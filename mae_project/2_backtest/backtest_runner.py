@@ -3,7 +3,7 @@
 Strategy Backtesting:
 - Integrates strategy + gateway + order book + order manager + matching engine
 - Simulates daily event-driven rebalancing
-- Logs orders and executions
+- Logs orders and executions into preallocated columnar buffers (CSV + NPZ/Parquet copies)
 - Computes metrics and saves plots/reports
 
 Notes:
@@ -18,11 +18,11 @@ MODEL_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "model"))
 OUT_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "backtest_outputs"))
 
 import argparse
-import glob
 import math
 import json
+from collections.abc import Mapping
 from dataclasses import asdict
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -34,13 +34,10 @@ from order_book import Order, OrderBook
 from order_manager import OrderManager, OrderManagerConfig
 from matching_engine import MatchingEngine
 from strategy_ml_weights import MLReturnToWeightStrategy
-
-
-def find_pack(pt_dir: str, split: str) -> str:
-    cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*.pt")))
-    if not cand:
-        raise FileNotFoundError(f"Cannot find pack for split='{split}' under {pt_dir}")
-    return cand[0]
+from backtest_log import LOG_FORMATS, ColumnarLog, make_backtest_logs
+from audit_sink import AuditSink, make_audit_sink
+from pack_io import PACK_FORMATS, find_pack, load_pack
+from inference_engine import INFER_MODES
 
 
 def compute_metrics(port_ret: np.ndarray, weights: np.ndarray, ann_factor: int = 252) -> Dict[str, float]:
@@ -101,22 +98,77 @@ def print_metrics_table(name_to_metrics: Dict[str, Dict[str, float]]) -> None:
         print(row)
 
 
+class PositionsView(Mapping):
+    """
+    Read-only dict view {symbol: qty} over PortfolioState's quantity vector.
+    OrderManager / strategy / logs keep using positions[s], .get(s), dict(positions).
+    """
+
+    def __init__(self, symbols: List[str], index: Dict[str, int], qty: np.ndarray):
+        self._symbols = symbols
+        self._index = index
+        self._qty = qty
+
+    def __getitem__(self, symbol: str) -> float:
+        return float(self._qty[self._index[symbol]])
+
+    def __iter__(self):
+        return iter(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
 class PortfolioState:
+    """
+    Cash + positions held as a float64 vector over a fixed symbol order.
+    Prices can be passed either as a NumPy vector in that order (fast path, e.g. gateway.price_vector)
+    or as a {symbol: price} dict.
+    """
+
     def __init__(self, symbols: List[str], initial_cash: float):
+        self.symbols = list(symbols)
+        self.index: Dict[str, int] = {s: i for i, s in enumerate(self.symbols)}
         self.cash = float(initial_cash)
-        self.positions: Dict[str, float] = {s: 0.0 for s in symbols}
-
-    def market_value(self, prices: Dict[str, float]) -> float:
-        return sum(self.positions[s] * float(prices[s]) for s in self.positions)
-
-    def total_equity(self, prices: Dict[str, float]) -> float:
+        self.qty = np.zeros(len(self.symbols), dtype=np.float64)
+        self.positions = PositionsView(self.symbols, self.index, self.qty)
+
+    def _price_vector(self, prices) -> np.ndarray:
+        if isinstance(prices, np.ndarray):
+            return prices
+        return np.fromiter((float(prices[s]) for s in self.symbols), dtype=np.float64, count=len(self.symbols))
+
+    def apply_fill(self, symbol: str, side: str, qty: float, price: float) -> None:
+        i = self.index[symbol]
+        notional = float(qty) * float(price)
+        if side == "buy":
+            self.cash -= notional
+            self.qty[i] += qty
+        else:
+            self.cash += notional
+            self.qty[i] = max(0.0, self.qty[i] - qty)
+
+    def market_values(self, prices) -> np.ndarray:
+        return self.qty * self._price_vector(prices)
+
+    def market_value(self, prices) -> float:
+        return float(self.market_values(prices).sum())
+
+    def total_equity(self, prices) -> float:
         return self.cash + self.market_value(prices)
 
-    def weights(self, prices: Dict[str, float], symbol_order: List[str]) -> np.ndarray:
-        eq = self.total_equity(prices)
+    def weights(self, prices, symbol_order: Optional[List[str]] = None) -> np.ndarray:
+        mv = self.market_values(prices)
+        eq = self.cash + float(mv.sum())
         if eq <= 0:
-            return np.zeros(len(symbol_order), dtype=np.float64)
-        return np.array([(self.positions[s] * float(prices[s])) / eq for s in symbol_order], dtype=np.float64)
+            return np.zeros(len(self.symbols) if symbol_order is None else len(symbol_order), dtype=np.float64)
+        w = mv / eq
+        if symbol_order is None or symbol_order == self.symbols:
+            return w
+        return w[[self.index[s] for s in symbol_order]]
 
 
 import matplotlib.dates as mdates
@@ -154,50 +206,17 @@ def save_trade_distribution_plot(trades_df: pd.DataFrame, out_path: str) -> None
     plt.close()
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--pt_dir", type=str, default=PT_DIR)
-    ap.add_argument("--split", type=str, default="test", choices=["train", "val", "test"])
-    ap.add_argument("--ckpt", type=str, default=os.path.join(MODEL_DIR, "downstream_return_full.pth"))
-    ap.add_argument("--out_dir", type=str, default=OUT_DIR)
-    ap.add_argument("--initial_cash", type=float, default=100000.0)
-    ap.add_argument("--device", type=str, default="cpu")
-
-    # Strategy knobs (kept same core logic as user's infer)
-    ap.add_argument("--cov_window", type=int, default=60)
-    ap.add_argument("--gamma_turn", type=float, default=0.5)
-    ap.add_argument("--turnover_l1", action="store_true")
-    ap.add_argument("--mu_ema", type=float, default=0.0)
-    ap.add_argument("--min_trade_notional", type=float, default=10.0)
-
-    # Matching engine knobs
-    ap.add_argument("--seed", type=int, default=42)
-    ap.add_argument("--p_full_fill", type=float, default=0.70)
-    ap.add_argument("--p_partial_fill", type=float, default=0.20)
-    ap.add_argument("--p_cancel", type=float, default=0.10)
-    ap.add_argument("--slippage_bps", type=float, default=2.0)
-
-    # Variant comparison (Part 3 requirement)
-    ap.add_argument("--run_baseline_hold", default=True, help="Run equal-weight buy-and-hold baseline in same report")
-    args = ap.parse_args()
-
-    os.makedirs(args.out_dir, exist_ok=True)
-
-    # Load pack
-    pack_path = find_pack(args.pt_dir, args.split)
-    pack = torch.load(pack_path, map_location="cpu")
-    X = pack["X"].float()
-    R = pack["R"].float()
-    meta = pack.get("meta", {})
-    etf_symbols = meta.get("etfs", None)
-    if not etf_symbols:
-        raise ValueError("Pack meta['etfs'] missing")
-
-    print(f"[PACK] {pack_path}")
-    print(f"       split={meta.get('split')} X={tuple(X.shape)} R={tuple(R.shape)} date_range={meta.get('start_date')}..{meta.get('end_date')}")
-
-    # Components
-    gateway = HistoricalGateway(pack=pack, etf_symbols=etf_symbols)
+def build_execution_components(
+    pack: dict,
+    etf_symbols: List[str],
+    seed: int,
+    p_full_fill: float,
+    p_partial_fill: float,
+    p_cancel: float,
+    slippage_bps: float,
+    audit_sink: Optional[AuditSink] = None,
+) -> Tuple[HistoricalGateway, OrderBook, OrderManager, MatchingEngine]:
+    gateway = HistoricalGateway(pack=pack, etf_symbols=etf_symbols, audit_sink=audit_sink)
     order_book = OrderBook()
     order_manager = OrderManager(OrderManagerConfig(
         max_orders_per_step=200,
@@ -205,36 +224,36 @@ def main():
         allow_fractional_qty=True,
     ))
     matching_engine = MatchingEngine(
-        seed=args.seed,
-        p_full_fill=args.p_full_fill,
-        p_partial_fill=args.p_partial_fill,
-        p_cancel=args.p_cancel,
-        slippage_bps=args.slippage_bps,
+        seed=seed,
+        p_full_fill=p_full_fill,
+        p_partial_fill=p_partial_fill,
+        p_cancel=p_cancel,
+        slippage_bps=slippage_bps,
     )
-    strategy = MLReturnToWeightStrategy(
-        ckpt_path=args.ckpt,
-        etf_symbols=etf_symbols,
-        num_feat=int(X.shape[1]),
-        seq_len=20,
-        cov_window=args.cov_window,
-        gamma_turn=args.gamma_turn,
-        turnover_l1=args.turnover_l1,
-        mu_ema=args.mu_ema,
-        min_trade_notional=args.min_trade_notional,
-        device=args.device,
-    )
-
+    return gateway, order_book, order_manager, matching_engine
+
+
+def run_event_loop(
+    pack: dict,
+    etf_symbols: List[str],
+    gateway: HistoricalGateway,
+    strategy: MLReturnToWeightStrategy,
+    order_book: OrderBook,
+    order_manager: OrderManager,
+    matching_engine: MatchingEngine,
+    initial_cash: float,
+) -> Tuple[ColumnarLog, ColumnarLog, ColumnarLog]:
+    """
+    Daily event-driven rebalance over the whole pack.
+    Returns (daily_log, order_log, trade_log) as preallocated ColumnarLog tables
+    (daily weights are native [days, N] matrices).
+    Shared by main() and sweep_runner.py so a sweep row reproduces a single run with the same knobs/seed.
+    """
     # Backtest state
-    portfolio = PortfolioState(symbols=etf_symbols, initial_cash=args.initial_cash)
-    trade_log: List[dict] = []
-    order_log: List[dict] = []
-    daily_log: List[dict] = []
+    portfolio = PortfolioState(symbols=etf_symbols, initial_cash=initial_cash)
 
-    # Need windows for strategy and future realized return for scoring
     T = len(gateway)
-    if T < 21:
-        raise ValueError(f"Need at least 21 rows in pack, got {T}")
-
+    daily_log, order_log, trade_log = make_backtest_logs(n_steps=max(0, T - 20), n_assets=len(etf_symbols))
     X_all = pack["X"].float()
     R_all = pack["R"].float().numpy()
 
@@ -247,8 +266,9 @@ def main():
         event_date = str(pack["dates"][t_idx])
         eval_date = str(pack["dates"][idx + 20])
 
-        prices = gateway._make_price_proxy(t_idx)
-        equity_before = portfolio.total_equity(prices)
+        px_vec = gateway.price_vector(t_idx)        # [N] in etf_symbols order, for accounting
+        prices = gateway._make_price_proxy(t_idx)   # {symbol: price}, for orders / validation
+        equity_before = portfolio.total_equity(px_vec)
 
         # 1) Generate target weights (same strategy core logic)
         target_w = strategy.generate_target_weights(
@@ -256,6 +276,7 @@ def main():
             all_returns_TxN=R_all,
             t_idx_inclusive=t_idx,
         )
+        solve = strategy.last_solve
 
         # 2) Generate rebalance orders
         raw_orders = strategy.generate_rebalance_orders(
@@ -291,28 +312,28 @@ def main():
         for od in accepted:
             oid = order_book.add(od)
             gateway.log_order_audit(event_date, "sent", oid, payload=od.to_dict())
-            order_log.append({
-                "date": event_date,
-                "order_id": oid,
-                "symbol": od.symbol,
-                "side": od.side,
-                "qty": od.qty,
-                "status": "sent",
-                "reason": "",
-            })
+            order_log.append(
+                date=event_date,
+                order_id=oid,
+                symbol=od.symbol,
+                side=od.side,
+                qty=od.qty,
+                status="sent",
+                reason="",
+            )
 
         for od, reason in rejected:
             od.status = "rejected"
             gateway.log_order_audit(event_date, "rejected", od.order_id, payload={"reason": reason, **od.to_dict()})
-            order_log.append({
-                "date": event_date,
-                "order_id": od.order_id,
-                "symbol": od.symbol,
-                "side": od.side,
-                "qty": od.qty,
-                "status": "rejected",
-                "reason": reason,
-            })
+            order_log.append(
+                date=event_date,
+                order_id=od.order_id,
+                symbol=od.symbol,
+                side=od.side,
+                qty=od.qty,
+                status="rejected",
+                reason=reason,
+            )
 
         # 4) Matching engine simulate fills
         for od in accepted:
@@ -324,14 +345,7 @@ def main():
             fp = float(exec_rpt.fill_price)
 
             if fq > 0:
-                notional = fq * fp
-                if od.side == "buy":
-                    portfolio.cash -= notional
-                    portfolio.positions[od.symbol] += fq
-                else:
-                    portfolio.cash += notional
-                    portfolio.positions[od.symbol] -= fq
-                    portfolio.positions[od.symbol] = max(0.0, portfolio.positions[od.symbol])
+                portfolio.apply_fill(od.symbol, od.side, fq, fp)
 
             if exec_rpt.status == "filled":
                 gateway.log_order_audit(event_date, "filled", od.order_id, payload=exec_rpt.to_dict())
@@ -344,38 +358,38 @@ def main():
             else:
                 gateway.log_order_audit(event_date, "cancelled", od.order_id, payload=exec_rpt.to_dict())
 
-            order_log.append({
-                "date": event_date,
-                "order_id": od.order_id,
-                "symbol": od.symbol,
-                "side": od.side,
-                "qty": od.qty,
-                "filled_qty": exec_rpt.filled_qty,
-                "remaining_qty": exec_rpt.remaining_qty,
-                "fill_price": exec_rpt.fill_price,
-                "status": exec_rpt.status,
-                "reason": exec_rpt.reason,
-            })
+            order_log.append(
+                date=event_date,
+                order_id=od.order_id,
+                symbol=od.symbol,
+                side=od.side,
+                qty=od.qty,
+                filled_qty=exec_rpt.filled_qty,
+                remaining_qty=exec_rpt.remaining_qty,
+                fill_price=exec_rpt.fill_price,
+                status=exec_rpt.status,
+                reason=exec_rpt.reason,
+            )
 
             if exec_rpt.filled_qty > 0:
                 signed_notional = exec_rpt.filled_qty * exec_rpt.fill_price
                 if exec_rpt.side == "sell":
                     signed_notional = -signed_notional
-                trade_log.append({
-                    "date": event_date,
-                    "order_id": exec_rpt.order_id,
-                    "symbol": exec_rpt.symbol,
-                    "side": exec_rpt.side,
-                    "filled_qty": exec_rpt.filled_qty,
-                    "fill_price": exec_rpt.fill_price,
-                    "signed_notional": signed_notional,
-                    "status": exec_rpt.status,
-                })
+                trade_log.append(
+                    date=event_date,
+                    order_id=exec_rpt.order_id,
+                    symbol=exec_rpt.symbol,
+                    side=exec_rpt.side,
+                    filled_qty=exec_rpt.filled_qty,
+                    fill_price=exec_rpt.fill_price,
+                    signed_notional=signed_notional,
+                    status=exec_rpt.status,
+                )
 
         # 5) Compute next-step realized portfolio return using held positions after rebalance
         # Use pack's realized returns on idx+20 to preserve user's evaluation convention.
         r_real = R_all[idx + 20, :]  # [N]
-        w_after = portfolio.weights(prices=prices, symbol_order=etf_symbols)
+        w_after = portfolio.weights(px_vec)
         realized_ret = float(np.dot(w_after, r_real))
 
         # Mark-to-market next day using realized return on equity proxy
@@ -386,39 +400,169 @@ def main():
         # Here we apply realized return to current marked portfolio and leave cash unchanged.
         # Simpler and sufficient for assignment metrics.
         # We log realized return and compute equity curve from returns directly later.
-        daily_log.append({
-            "signal_date": event_date,
-            "eval_date": eval_date,
-            "idx": idx,
-            "t_idx": t_idx,
-            "equity_before": equity_before,
-            "cash": portfolio.cash,
-            "realized_ret_next": realized_ret,
-            "target_weights": json.dumps([float(x) for x in target_w]),
-            "actual_weights_after_rebalance": json.dumps([float(x) for x in w_after]),
-        })
+        daily_log.append(
+            signal_date=event_date,
+            eval_date=eval_date,
+            idx=idx,
+            t_idx=t_idx,
+            equity_before=equity_before,
+            cash=portfolio.cash,
+            realized_ret_next=realized_ret,
+            opt_method=solve.method,
+            opt_converged=solve.converged,
+            opt_iterations=solve.iterations,
+            opt_wall_ms=solve.wall_time_s * 1000.0,
+            target_weights=target_w,
+            actual_weights_after_rebalance=w_after,
+        )
 
-    # Build outputs
-    daily_df = pd.DataFrame(daily_log)
-    order_df = pd.DataFrame(order_log)
-    trade_df = pd.DataFrame(trade_log)
+    return daily_log, order_log, trade_log
 
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pt_dir", type=str, default=PT_DIR)
+    ap.add_argument("--split", type=str, default="test", choices=["train", "val", "test"])
+    ap.add_argument("--pack_format", type=str, default="auto", choices=list(PACK_FORMATS),
+                    help="auto: use the .mmap.json pack when present, else .pt")
+    ap.add_argument("--ckpt", type=str, default=os.path.join(MODEL_DIR, "downstream_return_full.pth"))
+    ap.add_argument("--out_dir", type=str, default=OUT_DIR)
+    ap.add_argument("--initial_cash", type=float, default=100000.0)
+    ap.add_argument("--device", type=str, default="cpu")
+
+    # Strategy knobs (kept same core logic as user's infer)
+    ap.add_argument("--cov_window", type=int, default=60)
+    ap.add_argument("--cov_method", type=str, default="sample", choices=["sample", "ewma", "ledoit_wolf"])
+    ap.add_argument("--cov_ewma_lambda", type=float, default=0.94)
+    ap.add_argument("--gamma_turn", type=float, default=0.5)
+    ap.add_argument("--turnover_l1", action="store_true")
+    ap.add_argument("--mu_ema", type=float, default=0.0)
+    ap.add_argument("--min_trade_notional", type=float, default=10.0)
+    ap.add_argument("--precompute_mu", action=argparse.BooleanOptionalAction, default=False,
+                    help="Predict mu for the whole pack in batched passes before the event loop (faster; batched "
+                         "inference is not bit-identical, so metrics can differ slightly from the default per-step path)")
+    ap.add_argument("--infer_batch_size", type=int, default=1024)
+    ap.add_argument("--infer_mode", type=str, default="fp32", choices=list(INFER_MODES),
+                    help="model inference path (see inference_engine.py); non-fp32 modes report deviation vs fp32")
+
+    # Matching engine knobs
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--p_full_fill", type=float, default=0.70)
+    ap.add_argument("--p_partial_fill", type=float, default=0.20)
+    ap.add_argument("--p_cancel", type=float, default=0.10)
+    ap.add_argument("--slippage_bps", type=float, default=2.0)
+
+    # Outputs
+    ap.add_argument("--log_format", type=str, default="npz", choices=list(LOG_FORMATS),
+                    help="Columnar copy of daily/order/trade logs written next to the CSVs")
+
+    # Audit log sink: stream to an append-only file (bounded memory) or keep the legacy in-memory list
+    ap.add_argument("--audit_sink", type=str, default="jsonl", choices=["jsonl", "binary", "memory", "none"])
+    ap.add_argument("--audit_flush_every", type=int, default=256, help="records per batched write")
+    ap.add_argument("--audit_flush_interval_s", type=float, default=1.0)
+    ap.add_argument("--audit_async", action="store_true", help="encode + write audit records on a background thread")
+
+    # Variant comparison (Part 3 requirement)
+    ap.add_argument("--run_baseline_hold", default=True, help="Run equal-weight buy-and-hold baseline in same report")
+    args = ap.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # Load pack
+    pack_path = find_pack(args.pt_dir, args.split, fmt=args.pack_format)
+    pack = load_pack(pack_path)
+    X = pack["X"].float()
+    R = pack["R"].float()
+    meta = pack.get("meta", {})
+    etf_symbols = meta.get("etfs", None)
+    if not etf_symbols:
+        raise ValueError("Pack meta['etfs'] missing")
+
+    print(f"[PACK] {pack_path}")
+    print(f"       split={meta.get('split')} X={tuple(X.shape)} R={tuple(R.shape)} date_range={meta.get('start_date')}..{meta.get('end_date')}")
+
+    # Components
+    sink_kwargs = {}
+    if args.audit_sink in ("jsonl", "binary"):
+        sink_kwargs = {
+            "flush_every": args.audit_flush_every,
+            "flush_interval_s": args.audit_flush_interval_s,
+            "async_writer": args.audit_async,
+        }
+    audit_sink = make_audit_sink(args.audit_sink, args.out_dir, **sink_kwargs)
+    gateway, order_book, order_manager, matching_engine = build_execution_components(
+        pack=pack,
+        etf_symbols=etf_symbols,
+        seed=args.seed,
+        p_full_fill=args.p_full_fill,
+        p_partial_fill=args.p_partial_fill,
+        p_cancel=args.p_cancel,
+        slippage_bps=args.slippage_bps,
+        audit_sink=audit_sink,
+    )
+    strategy = MLReturnToWeightStrategy(
+        ckpt_path=args.ckpt,
+        etf_symbols=etf_symbols,
+        num_feat=int(X.shape[1]),
+        seq_len=20,
+        cov_window=args.cov_window,
+        cov_method=args.cov_method,
+        cov_ewma_lambda=args.cov_ewma_lambda,
+        gamma_turn=args.gamma_turn,
+        turnover_l1=args.turnover_l1,
+        mu_ema=args.mu_ema,
+        min_trade_notional=args.min_trade_notional,
+        device=args.device,
+        infer_mode=args.infer_mode,
+    )
+    if strategy.engine is not None:
+        print(f"[INFER] mode={strategy.engine.mode} max|dev| vs fp32 on probe batch={strategy.engine.max_abs_dev:.3e}")
+
+    # Need windows for strategy and future realized return for scoring
+    T = len(gateway)
+    if T < 21:
+        raise ValueError(f"Need at least 21 rows in pack, got {T}")
+
+    X_all = pack["X"].float()
+
+    if args.precompute_mu:
+        mu_cache = strategy.precompute_mu(X_all, batch_size=args.infer_batch_size)
+        print(f"[MU] precomputed mu_hat for {mu_cache.shape[0]} windows")
+
+    daily_log, order_log, trade_log = run_event_loop(
+        pack=pack,
+        etf_symbols=etf_symbols,
+        gateway=gateway,
+        strategy=strategy,
+        order_book=order_book,
+        order_manager=order_manager,
+        matching_engine=matching_engine,
+        initial_cash=args.initial_cash,
+    )
+    R_all = pack["R"].float().numpy()
+
+    # Build outputs
+    n_days = len(daily_log)
     daily_csv = os.path.join(args.out_dir, "daily_log.csv")
     orders_csv = os.path.join(args.out_dir, "order_log.csv")
     trades_csv = os.path.join(args.out_dir, "trade_log.csv")
     audit_csv = os.path.join(args.out_dir, "gateway_audit_log.csv")
 
-    daily_df.to_csv(daily_csv, index=False)
-    order_df.to_csv(orders_csv, index=False)
-    trade_df.to_csv(trades_csv, index=False)
-    gateway.save_audit_log(audit_csv)
+    daily_log.save_csv(daily_csv)
+    order_log.save_csv(orders_csv)
+    trade_log.save_csv(trades_csv)
+    if args.audit_sink != "none":
+        gateway.save_audit_log(audit_csv)
+    gateway.close_audit_log()
 
-    # Metrics
-    port_ret = daily_df["realized_ret_next"].values.astype(np.float64) if len(daily_df) else np.array([], dtype=np.float64)
-    if len(daily_df):
-        w_mat = np.vstack(daily_df["actual_weights_after_rebalance"].apply(json.loads).values)
-    else:
-        w_mat = np.zeros((0, len(etf_symbols)), dtype=np.float64)
+    columnar_paths = [
+        log.save(os.path.join(args.out_dir, name), args.log_format)
+        for name, log in (("daily_log", daily_log), ("order_log", order_log), ("trade_log", trade_log))
+    ]
+
+    # Metrics (read the native columns; no JSON parsing)
+    port_ret = daily_log.column("realized_ret_next")
+    w_mat = daily_log.column("actual_weights_after_rebalance")
 
     metrics_main = compute_metrics(port_ret=port_ret, weights=w_mat)
 
@@ -428,23 +572,33 @@ def main():
     if args.run_baseline_hold:
         # Buy-and-hold in this framework = constant equal weights evaluated on same realized returns
         ew = np.ones(len(etf_symbols), dtype=np.float64) / len(etf_symbols)
-        r_mat = R_all[20 : 20 + len(daily_df), :]
-        ew_ret = (r_mat @ ew) if len(daily_df) else np.array([], dtype=np.float64)
-        ew_w = np.tile(ew, (len(daily_df), 1)) if len(daily_df) else np.zeros((0, len(etf_symbols)))
+        r_mat = R_all[20 : 20 + n_days, :]
+        ew_ret = (r_mat @ ew) if n_days else np.array([], dtype=np.float64)
+        ew_w = np.tile(ew, (n_days, 1)) if n_days else np.zeros((0, len(etf_symbols)))
         metrics_map["EqualWeight Hold"] = compute_metrics(port_ret=ew_ret, weights=ew_w)
 
     print_metrics_table(metrics_map)
 
+    if n_days:
+        methods, counts = np.unique(daily_log.column("opt_method").astype(str), return_counts=True)
+        print(
+            f"\n[OPT] solves={n_days} "
+            f"methods={dict(zip(methods.tolist(), counts.tolist()))} "
+            f"not_converged={int((~daily_log.column('opt_converged')).sum())} "
+            f"mean_iters={daily_log.column('opt_iterations').mean():.1f} "
+            f"total_wall={daily_log.column('opt_wall_ms').sum() / 1000.0:.3f}s"
+        )
+
     # Save metrics report
     metrics_path = os.path.join(args.out_dir, "metrics.json")
     with open(metrics_path, "w", encoding="utf-8") as f:
         json.dump(metrics_map, f, indent=2)
 
     # Plots required by Part 3
-    if len(daily_df):
-        equity_curve = np.cumprod(1.0 + daily_df["realized_ret_next"].values.astype(np.float64))
+    if n_days:
+        equity_curve = np.cumprod(1.0 + port_ret)
         save_equity_curve_plot(
-            dates=daily_df["eval_date"].tolist(),
+            dates=daily_log.column("eval_date").tolist(),
             equity=equity_curve.tolist(),
             out_path=os.path.join(args.out_dir, "equity_curve.png"),
         )
@@ -452,7 +606,7 @@ def main():
         pd.DataFrame({"msg": ["No daily rows"]}).to_csv(os.path.join(args.out_dir, "equity_curve_empty.csv"), index=False)
 
     save_trade_distribution_plot(
-        trades_df=trade_df if len(trade_df) else pd.DataFrame({"signed_notional": [0.0]}),
+        trades_df=trade_log.to_frame() if len(trade_log) else pd.DataFrame({"signed_notional": [0.0]}),
         out_path=os.path.join(args.out_dir, "trade_distribution.png"),
     )
 
@@ -460,7 +614,13 @@ def main():
     print(f"  Daily log:   {daily_csv}")
     print(f"  Order log:   {orders_csv}")
     print(f"  Trade log:   {trades_csv}")
-    print(f"  Audit log:   {audit_csv}")
+    if args.audit_sink != "none":
+        print(f"  Audit log:   {audit_csv}")
+    if hasattr(audit_sink, "path"):
+        print(f"  Audit file:  {audit_sink.path}")
+    for path in columnar_paths:
+        if path:
+            print(f"  Columnar:    {path}")
     print(f"  Metrics:     {metrics_path}")
     print(f"  Equity plot: {os.path.join(args.out_dir, 'equity_curve.png')}")
     print(f"  Trade plot:  {os.path.join(args.out_dir, 'trade_distribution.png')}")
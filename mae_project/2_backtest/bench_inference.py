@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+ReturnFullModel CPU Inference Benchmark:
+- Builds one InferenceEngine per requested mode from the same checkpoint (see inference_engine.py)
+- Accuracy : max / mean |r_hat - r_hat_fp32| over every window of the pack
+- Latency  : median ms per single-window prediction (the non-precomputed backtest path)
+             and per backtest year (252 sequential single predictions vs one 252-window batch)
+- Writes inference_bench.csv + inference_bench.json under --out_dir
+"""
+
+import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+PT_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "data", "data_pt"))
+MODEL_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "model"))
+OUT_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "backtest_outputs", "inference_bench"))
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import torch
+
+from inference_engine import INFER_MODES, InferenceEngine
+from pack_io import PACK_FORMATS, find_pack, load_pack
+from strategy_ml_weights import MLReturnToWeightStrategy, rolling_windows, window_normalize_batch
+
+TRADING_DAYS = 252
+
+
+def _time_calls(fn, n_repeat: int) -> List[float]:
+    out = []
+    for _ in range(n_repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+@torch.no_grad()
+def bench_mode(engine: InferenceEngine, windows: torch.Tensor, ref: torch.Tensor, args) -> Dict[str, object]:
+    # accuracy over the whole pack
+    preds = torch.cat([engine(windows[s : s + args.batch_size]) for s in range(0, windows.shape[0], args.batch_size)])
+    dev = (preds - ref).abs()
+
+    year = windows[: min(TRADING_DAYS, windows.shape[0])]
+    single = windows[:1]
+    for _ in range(args.warmup):
+        engine(single)
+        engine(year)
+
+    t_single = _time_calls(lambda: engine(single), args.repeat)
+
+    def sequential_year():
+        for i in range(year.shape[0]):
+            engine(year[i : i + 1])
+
+    t_year_seq = _time_calls(sequential_year, max(1, args.repeat // 20))
+    t_year_batch = _time_calls(lambda: engine(year), max(1, args.repeat // 5))
+
+    scale = TRADING_DAYS / year.shape[0]
+    return {
+        "mode": engine.mode,
+        "max_abs_dev": float(dev.max().item()),
+        "mean_abs_dev": float(dev.mean().item()),
+        "single_ms_p50": 1e3 * float(np.median(t_single)),
+        "single_ms_p95": 1e3 * float(np.percentile(t_single, 95)),
+        "year_sequential_s": scale * float(np.median(t_year_seq)),
+        "year_batched_ms": 1e3 * scale * float(np.median(t_year_batch)),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark ReturnFullModel inference modes on CPU")
+    ap.add_argument("--pt_dir", type=str, default=PT_DIR)
+    ap.add_argument("--split", type=str, default="val", choices=["train", "val", "test"])
+    ap.add_argument("--pack_format", type=str, default="auto", choices=list(PACK_FORMATS))
+    ap.add_argument("--ckpt", type=str, default=os.path.join(MODEL_DIR, "downstream_return_full.pth"))
+    ap.add_argument("--out_dir", type=str, default=OUT_DIR)
+    ap.add_argument("--modes", type=str, default="fp32,bf16,torchscript,int8,compile,onnx",
+                    help=f"comma list from {','.join(INFER_MODES)}; unavailable modes are reported and skipped")
+    ap.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    ap.add_argument("--batch_size", type=int, default=1024, help="batch size for the full-pack accuracy pass")
+    ap.add_argument("--repeat", type=int, default=200, help="timed single-window calls per mode")
+    ap.add_argument("--warmup", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    pack_path = find_pack(args.pt_dir, args.split, fmt=args.pack_format)
+    pack = load_pack(pack_path)
+    X = pack["X"].float()
+    etf_symbols = pack.get("meta", {}).get("etfs", None)
+    if not etf_symbols:
+        raise ValueError("Pack meta['etfs'] missing")
+
+    strategy = MLReturnToWeightStrategy(ckpt_path=args.ckpt, etf_symbols=etf_symbols, num_feat=X.shape[1], device="cpu")
+    model = strategy.model
+    windows = window_normalize_batch(rolling_windows(X, strategy.seq_len)).contiguous()
+    with torch.no_grad():
+        ref = torch.cat([model(windows[s : s + args.batch_size]) for s in range(0, windows.shape[0], args.batch_size)])
+
+    print(f"[PACK] {pack_path} windows={windows.shape[0]} threads={torch.get_num_threads()}")
+    rows = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        t0 = time.perf_counter()
+        try:
+            engine = InferenceEngine(model, mode=mode, example_input=windows[: min(64, windows.shape[0])])
+        except Exception as e:
+            print(f"[SKIP] {mode}: {str(e).splitlines()[0]}")
+            rows.append({"mode": mode, "error": str(e).splitlines()[0]})
+            continue
+        build_s = time.perf_counter() - t0
+        row = bench_mode(engine, windows, ref, args)
+        row["build_s"] = build_s
+        engine.close()
+        rows.append(row)
+        print(
+            f"[{mode:<11}] max|dev|={row['max_abs_dev']:.3e}  single p50={row['single_ms_p50']:.3f}ms  "
+            f"year seq={row['year_sequential_s']:.3f}s  year batched={row['year_batched_ms']:.2f}ms  build={build_s:.1f}s"
+        )
+
+    df = pd.DataFrame(rows)
+    df.to_csv(os.path.join(args.out_dir, "inference_bench.csv"), index=False)
+    with open(os.path.join(args.out_dir, "inference_bench.json"), "w", encoding="utf-8") as f:
+        json.dump({"pack": pack_path, "ckpt": args.ckpt, "threads": torch.get_num_threads(), "results": rows}, f, indent=2)
+    print(f"[SAVE] {os.path.join(args.out_dir, 'inference_bench.csv')}")
+
+
+if __name__ == "__main__":
+    main()
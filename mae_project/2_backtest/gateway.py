@@ -3,7 +3,7 @@
 Gateway for Data Ingestion:
 - Streams historical market data row by row (daily in this project)
 - Provides event records to the backtest runner
-- Maintains an order audit log
+- Maintains an order audit log through a pluggable sink (in-memory list or streaming file, see audit_sink.py)
 """
 
 from __future__ import annotations
@@ -13,9 +13,11 @@ from typing import Dict, Iterator, List, Optional
 
 import json
 import os
-import pandas as pd
+import numpy as np
 import torch
 
+from audit_sink import AuditSink, FileAuditSink, MemoryAuditSink, audit_log_to_csv, read_audit_log
+
 
 @dataclass
 class MarketEvent:
@@ -40,6 +42,7 @@ class HistoricalGateway:
         pack: dict,
         etf_symbols: List[str],
         price_proxy: str = "close_proxy",
+        audit_sink: Optional[AuditSink] = None,
     ):
         self.pack = pack
         self.etf_symbols = etf_symbols
@@ -52,26 +55,39 @@ class HistoricalGateway:
         if len(self.X) != len(self.R) or len(self.X) != len(self.dates):
             raise ValueError("Pack X/R/dates length mismatch")
 
-        self.audit_log: List[dict] = []
+        # Proxy price matrix [T, N], built once (see _make_price_proxy)
+        self.prices_mat = self._build_price_matrix()
+
+        self.audit_sink = audit_sink if audit_sink is not None else MemoryAuditSink()
 
     def __len__(self) -> int:
         return len(self.dates)
 
-    def _make_price_proxy(self, idx: int) -> Dict[str, float]:
+    def _build_price_matrix(self) -> np.ndarray:
         """
         Pack does not contain raw prices. For backtest framework integration we need executable prices.
         We use a normalized proxy price process per ETF from cumulative returns:
             P_t = 100 * prod(1 + r_0..t)
         This is acceptable for assignment framework simulation and keeps strategy logic unchanged.
+        Computed once for all rows with a vectorized cumulative product (float64, like the old per-step loop).
+        """
+        r = self.R.cpu().numpy().astype(np.float64)
+        prices = 100.0 * np.cumprod(1.0 + r, axis=0)
+        return np.maximum(prices, 1e-6)
+
+    def price_vector(self, idx: int) -> np.ndarray:
+        """
+        Proxy prices at row idx as a read-only [N] view (ordered like etf_symbols).
+        """
+        row = self.prices_mat[idx]
+        row.flags.writeable = False
+        return row
+
+    def _make_price_proxy(self, idx: int) -> Dict[str, float]:
+        """
+        Per-step price dict served from the precomputed proxy matrix (O(N) per call).
         """
-        prices: Dict[str, float] = {}
-        for j, sym in enumerate(self.etf_symbols):
-            r_hist = self.R[: idx + 1, j].cpu().numpy()
-            p = 100.0
-            for rv in r_hist:
-                p *= (1.0 + float(rv))
-            prices[sym] = max(p, 1e-6)
-        return prices
+        return dict(zip(self.etf_symbols, self.prices_mat[idx].tolist()))
 
     def stream(self) -> Iterator[MarketEvent]:
         for i in range(len(self.dates)):
@@ -97,8 +113,26 @@ class HistoricalGateway:
             "order_id": order_id,
             "payload": payload or {},
         }
-        self.audit_log.append(rec)
+        self.audit_sink.write(rec)
+
+    @property
+    def audit_log(self) -> List[dict]:
+        """
+        Records held in memory (MemoryAuditSink only; streaming sinks keep nothing resident).
+        """
+        return self.audit_sink.records if isinstance(self.audit_sink, MemoryAuditSink) else []
+
+    def close_audit_log(self) -> None:
+        self.audit_sink.close()
 
     def save_audit_log(self, path: str) -> None:
+        """
+        Same CSV for every sink (date, action, order_id, payload as JSON text).
+        Streaming file sink: close it, then convert the file to CSV record by record (bounded memory).
+        """
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        pd.DataFrame(self.audit_log).to_csv(path, index=False)
\ No newline at end of file
+        if isinstance(self.audit_sink, FileAuditSink):
+            self.audit_sink.close()
+            audit_log_to_csv(read_audit_log(self.audit_sink.path, self.audit_sink.fmt), path)
+        else:
+            audit_log_to_csv(self.audit_log, path)
\ No newline at end of file
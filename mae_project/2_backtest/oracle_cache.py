@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Oracle-Teacher Weight Cache:
+- oracle_teacher_weights(R[idx:idx+window]) is a max-Sharpe solve on realized returns only, so the
+  full [T-window+1, N] matrix depends on the pack's R and the window length, never on a checkpoint
+- Cache file per (R content hash, window, ORACLE_VERSION) under cache_dir, written atomically
+- Misses are filled in parallel with a process pool (each index is an independent solve)
+- Used by 06_infer_return.py and 06_infer_sharpe.py
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from portfolio_opt import max_sharpe_long_only
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+ORACLE_CACHE_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "data", "oracle_cache"))
+
+# Bump when oracle_teacher_weights / the solver changes, so stale cache files are not reused.
+ORACLE_VERSION = 1
+
+
+def oracle_teacher_weights(returns_kxN: np.ndarray) -> np.ndarray:
+    R = np.asarray(returns_kxN, dtype=np.float64)
+    mu = R.mean(axis=0)
+    Sigma = np.cov(R, rowvar=False)
+    return max_sharpe_long_only(mu, Sigma)
+
+
+def returns_content_hash(R_TxN: np.ndarray) -> str:
+    """
+    sha256 over shape + float32 C-order bytes of R (independent of the pack's file format / memory order).
+    """
+    a = np.ascontiguousarray(np.asarray(R_TxN, dtype="<f4"))
+    h = hashlib.sha256()
+    h.update(repr(a.shape).encode("utf-8"))
+    h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def cache_path(cache_dir: str, content_hash: str, window: int) -> str:
+    return os.path.join(cache_dir, f"oracle_v{ORACLE_VERSION}_{content_hash[:20]}_w{int(window)}.npy")
+
+
+def _oracle_rows(args) -> np.ndarray:
+    R, window, start, end = args
+    return np.vstack([oracle_teacher_weights(R[i : i + window]) for i in range(start, end)])
+
+
+def compute_oracle_matrix(R_TxN: np.ndarray, window: int = 21, workers: int = 1) -> np.ndarray:
+    """
+    Row i = oracle_teacher_weights(R[i:i+window]) for i = 0..T-window.
+    """
+    R = np.asarray(R_TxN)
+    n_rows = R.shape[0] - int(window) + 1
+    if n_rows <= 0:
+        return np.zeros((0, R.shape[1]), dtype=np.float64)
+
+    workers = max(1, int(workers))
+    if workers == 1 or n_rows < 2 * workers:
+        return _oracle_rows((R, window, 0, n_rows))
+
+    # a few chunks per worker for load balance; each task ships only the rows it needs
+    n_chunks = min(n_rows, workers * 4)
+    bounds = np.linspace(0, n_rows, n_chunks + 1).astype(int)
+    tasks = [
+        (R[s : e + window - 1], window, 0, e - s)
+        for s, e in zip(bounds[:-1], bounds[1:]) if e > s
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_oracle_rows, tasks))
+    return np.vstack(parts)
+
+
+def oracle_weights_matrix(
+    R_TxN: np.ndarray,
+    window: int = 21,
+    cache_dir: Optional[str] = ORACLE_CACHE_DIR,
+    workers: int = 1,
+    verbose: bool = True,
+) -> np.ndarray:
+    """
+    Cached oracle matrix [T-window+1, N]. cache_dir=None/"" disables the on-disk cache.
+    """
+    t0 = time.perf_counter()
+    path = None
+    if cache_dir:
+        path = cache_path(cache_dir, returns_content_hash(R_TxN), window)
+        if os.path.exists(path):
+            W = np.load(path)
+            if W.shape == (R_TxN.shape[0] - int(window) + 1, R_TxN.shape[1]):
+                if verbose:
+                    print(f"[ORACLE] cache hit {path} ({W.shape[0]} rows, {time.perf_counter() - t0:.3f}s)")
+                return W
+            if verbose:
+                print(f"[ORACLE] ignoring cache with unexpected shape {W.shape}: {path}")
+
+    W = compute_oracle_matrix(R_TxN, window=window, workers=workers)
+
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, W)
+        os.replace(tmp, path)
+    if verbose:
+        where = f" -> {path}" if path else ""
+        print(f"[ORACLE] computed {W.shape[0]} rows with {workers} worker(s) in {time.perf_counter() - t0:.2f}s{where}")
+    return W
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Pack I/O (shared by 1_train and 2_backtest):
+- Two on-disk formats for the same {"meta", "dates", "X" [T,F], "R" [T,N]} pack:
+    * pt   : market_<split>_<start>_to_<end>.pt          (torch.save dict, loaded fully into RAM)
+    * mmap : market_<split>_<start>_to_<end>.mmap.json   (small JSON manifest: meta, dates, array specs)
+             + <base>.X.f32 / <base>.R.f32               (raw contiguous little-endian float32, source memory order)
+- load_pack() picks the reader from the file name; mmap packs come back as zero-copy torch views
+  over copy-on-write memory maps, so opening a pack costs O(manifest) and pages are shared
+  between every process reading the same files
+- find_pack() returns the most recently written pack for a split (the mmap manifest on a tie), so an
+  mmap copy left over from before the .pt packs were regenerated is never picked up silently
+- CLI: convert existing .pt packs in a directory to the mmap format
+    python pack_io.py --pt_dir ../data/data_pt
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+from typing import Dict
+
+import numpy as np
+import torch
+
+PACK_FORMATS = ("auto", "pt", "mmap")
+MMAP_SUFFIX = ".mmap.json"
+MMAP_VERSION = 1
+
+_ARRAY_KEYS = ("X", "R")
+
+
+def is_mmap_pack(path: str) -> bool:
+    return path.endswith(MMAP_SUFFIX)
+
+
+def find_pack(pt_dir: str, split: str, fmt: str = "auto") -> str:
+    """
+    Path of the pack for `split` under pt_dir.
+    fmt='auto' returns the newest pack of either format (by mtime; the mmap manifest wins a tie).
+    """
+    if fmt not in PACK_FORMATS:
+        raise ValueError(f"Unknown pack format: {fmt} (expected one of {PACK_FORMATS})")
+    mmap_cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*{MMAP_SUFFIX}")))
+    pt_cand = sorted(glob.glob(os.path.join(pt_dir, f"market_{split}_*.pt")))
+
+    if fmt == "mmap":
+        cand = mmap_cand
+    elif fmt == "pt":
+        cand = pt_cand
+    else:
+        cand = sorted(mmap_cand + pt_cand, key=lambda p: (os.path.getmtime(p), is_mmap_pack(p)), reverse=True)
+    if not cand:
+        raise FileNotFoundError(f"Cannot find pack for split='{split}' (format={fmt}) under {pt_dir}")
+    if fmt == "auto" and mmap_cand and not is_mmap_pack(cand[0]):
+        print(f"[WARN] {os.path.basename(cand[0])} is newer than the mmap pack(s) for split='{split}'; using the .pt "
+              f"(re-run pack_io.py --overwrite to refresh them)")
+    return cand[0]
+
+
+def _array_file(manifest_path: str, key: str) -> str:
+    base = manifest_path[: -len(MMAP_SUFFIX)]
+    return f"{base}.{key}.f32"
+
+
+def save_mmap_pack(pack: dict, manifest_path: str) -> str:
+    """
+    Write pack X/R as raw float32 files next to `manifest_path` (must end with .mmap.json).
+    The manifest is written last, so a pack is only discoverable once its arrays are complete.
+    """
+    if not is_mmap_pack(manifest_path):
+        raise ValueError(f"Manifest path must end with {MMAP_SUFFIX}: {manifest_path}")
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+
+    arrays = {}
+    for key in _ARRAY_KEYS:
+        t = pack[key]
+        a = t.detach().cpu().numpy() if isinstance(t, torch.Tensor) else np.asarray(t)
+        a = np.asarray(a, dtype="<f4")
+        if a.ndim != 2:
+            raise ValueError(f"pack['{key}'] must be 2-D, got shape {a.shape}")
+        # Keep the tensor's memory order: packs built from pandas .values are column-major, and
+        # float32 reductions (window_normalize over near-constant features) depend on it.
+        order = "F" if (a.flags.f_contiguous and not a.flags.c_contiguous) else "C"
+        path = _array_file(manifest_path, key)
+        (a.T if order == "F" else np.ascontiguousarray(a)).tofile(path)
+        arrays[key] = {"file": os.path.basename(path), "shape": list(a.shape), "dtype": "float32", "order": order}
+
+    manifest = {
+        "format": "mmap",
+        "version": MMAP_VERSION,
+        "meta": pack.get("meta", {}),
+        "dates": [str(d) for d in pack.get("dates", [])],
+        "arrays": arrays,
+    }
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, manifest_path)
+    return manifest_path
+
+
+def remove_mmap_pack(manifest_path: str) -> None:
+    """
+    Delete an mmap pack: the manifest first (so it stops being discoverable), then its arrays.
+    """
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for key in _ARRAY_KEYS:
+        path = _array_file(manifest_path, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _load_mmap_pack(manifest_path: str) -> dict:
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != "mmap":
+        raise TypeError(f"Not an mmap pack manifest: {manifest_path}")
+
+    root = os.path.dirname(manifest_path)
+    pack = {"meta": manifest.get("meta", {}), "dates": manifest.get("dates", [])}
+    for key, spec in manifest["arrays"].items():
+        shape = tuple(int(s) for s in spec["shape"])
+        path = os.path.join(root, spec["file"])
+        expected = int(np.prod(shape)) * 4
+        actual = os.path.getsize(path)
+        if actual != expected:
+            raise ValueError(f"{path}: size {actual} bytes, manifest expects {expected} for shape {shape}")
+        # copy-on-write map: reads are zero-copy and shared, in-place edits stay private to the process
+        order = spec.get("order", "C")
+        arr = np.memmap(path, dtype="<f4", mode="c", shape=shape, order=order) if expected > 0 else np.zeros(shape, np.float32)
+        pack[key] = torch.from_numpy(arr)
+    if len(pack["dates"]) != pack["X"].shape[0]:
+        raise ValueError(f"{manifest_path}: {len(pack['dates'])} dates vs X rows {pack['X'].shape[0]}")
+    return pack
+
+
+def load_pack(path: str) -> dict:
+    """
+    Load a pack in either format (chosen from the file name).
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Pack not found: {path}")
+    if is_mmap_pack(path):
+        return _load_mmap_pack(path)
+    return torch.load(path, map_location="cpu")
+
+
+def convert_pt_dir(pt_dir: str, overwrite: bool = False) -> Dict[str, str]:
+    """
+    Write an mmap copy of every market_*.pt pack under pt_dir. Returns {pt_path: manifest_path}.
+    """
+    out = {}
+    for pt_path in sorted(glob.glob(os.path.join(pt_dir, "market_*.pt"))):
+        manifest_path = pt_path[: -len(".pt")] + MMAP_SUFFIX
+        if os.path.exists(manifest_path) and not overwrite:
+            print(f"[SKIP] {manifest_path} exists")
+            continue
+        pack = torch.load(pt_path, map_location="cpu")
+        save_mmap_pack(pack, manifest_path)
+        print(f"[SAVE] {os.path.basename(pt_path)} -> {os.path.basename(manifest_path)} X={tuple(pack['X'].shape)} R={tuple(pack['R'].shape)}")
+        out[pt_path] = manifest_path
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert .pt packs to the memory-mapped pack format")
+    ap.add_argument("--pt_dir", type=str, default=os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "data_pt")))
+    ap.add_argument("--overwrite", action="store_true")
+    args = ap.parse_args()
+    convert_pt_dir(args.pt_dir, overwrite=args.overwrite)
+
+
+if __name__ == "__main__":
+    main()
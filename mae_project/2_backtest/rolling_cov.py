@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling Covariance Engine:
+- Incremental replacement for a per-step np.cov over the past K returns
+- Running sums updated in O(N^2) per step as rows enter and leave the window
+- Variants:
+    * sample      : same matrix as np.cov(R[t-K+1 : t+1], ddof=1) + ridge within float tolerance
+    * ewma        : exponentially weighted covariance (decay lambda, full history, bias-corrected)
+    * ledoit_wolf : sample covariance shrunk towards (tr(S)/N) * I with Ledoit-Wolf intensity
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+
+COV_METHODS = ("sample", "ewma", "ledoit_wolf")
+
+
+class RollingCovariance:
+    """
+    Covariance of the last `window` rows of a [T, N] returns matrix, maintained incrementally.
+
+    Usage in the event loop:
+        est = RollingCovariance(n_assets=N, window=K, returns_TxN=R_TxN)   # or est.reset(R_TxN)
+        Sigma = est.cov_at(end_idx_inclusive=t)   # t increasing by one per step -> O(N^2)
+
+    Rows are shifted by the first row seen after a reset before being summed; covariance is
+    shift-invariant and this keeps the running sums well conditioned. The windowed sums are
+    rebuilt from the row buffer every `window` evictions to stop floating-point drift
+    (amortized O(N^2) per step).
+    """
+
+    def __init__(
+        self,
+        n_assets: int,
+        window: int,
+        method: str = "sample",
+        ewma_lambda: float = 0.94,
+        ridge: float = 1e-6,
+        returns_TxN: Optional[np.ndarray] = None,
+    ):
+        if method not in COV_METHODS:
+            raise ValueError(f"Unknown cov method: {method} (expected one of {COV_METHODS})")
+        if int(window) <= 0:
+            raise ValueError("window must be positive")
+        if not (0.0 < float(ewma_lambda) < 1.0):
+            raise ValueError("ewma_lambda must be in (0, 1)")
+
+        self.n = int(n_assets)
+        self.window = int(window)
+        self.method = method
+        self.ewma_lambda = float(ewma_lambda)
+        self.ridge = float(ridge)
+
+        self.source: Optional[np.ndarray] = None
+        self.reset(returns_TxN)
+
+    # -------------------------
+    # State
+    # -------------------------
+    def reset(self, returns_TxN: Optional[np.ndarray] = None) -> None:
+        """
+        Clear the window. Passing `returns_TxN` binds it as the source cov_at reads from;
+        without it the current source is kept and cov_at resyncs from it on the next call.
+        """
+        if returns_TxN is not None:
+            if returns_TxN.ndim != 2 or returns_TxN.shape[1] != self.n:
+                raise ValueError(f"returns_TxN must be [T, {self.n}], got {tuple(returns_TxN.shape)}")
+            self.source = returns_TxN
+        self._clear()
+        self._src_end: Optional[int] = None
+
+    def _clear(self) -> None:
+        n = self.n
+        self._shift: Optional[np.ndarray] = None
+
+        # windowed state (sample / ledoit_wolf)
+        self._buf = np.zeros((self.window, n), dtype=np.float64)  # ring buffer of shifted rows
+        self._head = 0          # next write position
+        self._count = 0         # rows currently in the window
+        self._evictions = 0     # since last full rebuild
+        self._s1 = np.zeros(n, dtype=np.float64)        # sum y
+        self._s2 = np.zeros((n, n), dtype=np.float64)   # sum y y^T
+        self._b3 = np.zeros((n, n), dtype=np.float64)   # sum y_i^2 y_j      (ledoit_wolf only)
+        self._a4 = np.zeros((n, n), dtype=np.float64)   # sum y_i^2 y_j^2    (ledoit_wolf only)
+
+        # ewma state
+        self._w = 0.0           # sum of weights
+        self._w2 = 0.0          # sum of squared weights
+        self._pushed = 0
+
+        self._cached: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self._pushed if self.method == "ewma" else self._count
+
+    def _add_moments(self, y: np.ndarray, sign: float) -> None:
+        self._s1 += sign * y
+        self._s2 += sign * np.outer(y, y)
+        if self.method == "ledoit_wolf":
+            y2 = y * y
+            self._b3 += sign * np.outer(y2, y)
+            self._a4 += sign * np.outer(y2, y2)
+
+    def _rebuild(self) -> None:
+        Y = self._window_rows()
+        self._s1 = Y.sum(axis=0)
+        self._s2 = Y.T @ Y
+        if self.method == "ledoit_wolf":
+            Y2 = Y * Y
+            self._b3 = Y2.T @ Y
+            self._a4 = Y2.T @ Y2
+        self._evictions = 0
+
+    def _window_rows(self) -> np.ndarray:
+        if self._count < self.window:
+            return self._buf[: self._count]
+        return np.roll(self._buf, -self._head, axis=0)
+
+    def push(self, row: np.ndarray) -> None:
+        """
+        Append one return row [N]; the oldest row leaves the window once it holds `window` rows.
+        """
+        r = np.asarray(row, dtype=np.float64).reshape(-1)
+        if r.shape[0] != self.n:
+            raise ValueError(f"Row length mismatch: got {r.shape[0]} expected {self.n}")
+        if self._shift is None:
+            self._shift = r.copy()
+        y = r - self._shift
+        self._cached = None
+        self._pushed += 1
+
+        if self.method == "ewma":
+            lam = self.ewma_lambda
+            self._w = lam * self._w + 1.0
+            self._w2 = lam * lam * self._w2 + 1.0
+            self._s1 *= lam
+            self._s2 *= lam
+            self._s1 += y
+            self._s2 += np.outer(y, y)
+            return
+
+        if self._count == self.window:
+            self._add_moments(self._buf[self._head], -1.0)
+            self._evictions += 1
+        else:
+            self._count += 1
+        self._buf[self._head] = y
+        self._add_moments(y, +1.0)
+        self._head = (self._head + 1) % self.window
+
+        if self._evictions >= self.window:
+            self._rebuild()
+
+    # -------------------------
+    # Estimates
+    # -------------------------
+    def _sample_cov(self) -> np.ndarray:
+        k = self._count
+        m = self._s1 / k
+        return (self._s2 - k * np.outer(m, m)) / (k - 1)
+
+    def _ewma_cov(self) -> np.ndarray:
+        # Weighted covariance with reliability-weight bias correction (pandas ewm adjust=True, bias=False).
+        W, W2 = self._w, self._w2
+        m = self._s1 / W
+        biased = self._s2 / W - np.outer(m, m)
+        return biased * (W * W / (W * W - W2))
+
+    def _ledoit_wolf_intensity(self) -> float:
+        """
+        Ledoit-Wolf (2004) shrinkage intensity towards mu*I, in the same form as
+        sklearn.covariance.ledoit_wolf_shrinkage, computed from the running moment sums.
+        """
+        k = float(self._count)
+        p = float(self.n)
+        m = self._s1 / k
+        q = np.diag(self._s2)
+
+        E = self._s2 / k - np.outer(m, m)          # biased empirical covariance (centered X^T X / k)
+        tr = float(np.trace(E))
+        mu = tr / p
+
+        # sum_k x_ki^2 x_kj^2 for centered rows x = y - m, expanded in raw moments
+        mi = m[:, None]
+        mj = m[None, :]
+        x2x2 = (
+            self._a4
+            - 2.0 * mj * self._b3
+            - 2.0 * mi * self._b3.T
+            + (mj ** 2) * q[:, None]
+            + (mi ** 2) * q[None, :]
+            + 4.0 * mi * mj * self._s2
+            - 2.0 * mi * (mj ** 2) * self._s1[:, None]
+            - 2.0 * (mi ** 2) * mj * self._s1[None, :]
+            + k * (mi ** 2) * (mj ** 2)
+        )
+
+        delta_ = float(np.sum(E * E))
+        beta = (float(np.sum(x2x2)) / k - delta_) / (p * k)
+        delta = (delta_ - 2.0 * mu * tr + p * mu * mu) / p
+        beta = min(beta, delta)
+        if beta <= 0.0 or delta <= 0.0:
+            return 0.0
+        return float(beta / delta)
+
+    def covariance(self) -> np.ndarray:
+        """
+        Current estimate [N, N] including the diagonal ridge; fewer than 2 rows -> eye * 1e-3.
+        """
+        if self._cached is not None:
+            return self._cached.copy()
+
+        n = self.n
+        if len(self) < 2:
+            Sigma = np.eye(n) * 1e-3
+        elif self.method == "ewma":
+            Sigma = self._ewma_cov() + np.eye(n) * self.ridge
+        else:
+            S = self._sample_cov()
+            if self.method == "ledoit_wolf":
+                delta = self._ledoit_wolf_intensity()
+                target = np.eye(n) * (np.trace(S) / n)
+                S = (1.0 - delta) * S + delta * target
+            Sigma = S + np.eye(n) * self.ridge
+
+        Sigma = 0.5 * (Sigma + Sigma.T)
+        self._cached = Sigma
+        return Sigma.copy()
+
+    def cov_at(self, end_idx_inclusive: int) -> np.ndarray:
+        """
+        Covariance of the bound source up to row `end_idx_inclusive` (the last `window` rows, or the
+        full history for ewma). Consecutive calls with a non-decreasing end index only push the new
+        rows; going backwards resyncs from scratch. Bind a different array with reset(returns_TxN).
+        """
+        if self.source is None:
+            raise ValueError("No returns bound: pass returns_TxN to the constructor or reset()")
+        end = int(end_idx_inclusive)
+        # a jump of a whole window (or more) is cheaper to rebuild than to replay
+        jump = (self.method != "ewma") and (self._src_end is not None) and (end - self._src_end >= self.window)
+
+        if self._src_end is None or end < self._src_end or jump:
+            self._clear()
+            # ewma uses the full history up to end; windowed methods only need the last `window` rows
+            first = 0 if self.method == "ewma" else max(0, end - self.window + 1)
+            self._src_end = first - 1
+
+        for i in range(self._src_end + 1, end + 1):
+            self.push(self.source[i])
+        self._src_end = end
+        return self.covariance()
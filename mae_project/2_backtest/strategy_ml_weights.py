@@ -2,8 +2,9 @@
 """
 Strategy Class:
 - Predict next-day ETF returns using trained model
-- Estimate covariance from past K realized returns
-- Solve long-only max-Sharpe weights
+  (optionally precomputed for a whole pack in batched no-grad passes)
+- Estimate covariance from past K realized returns (incrementally, see rolling_cov.py)
+- Solve long-only max-Sharpe weights (see portfolio_opt.py)
 - Convert target weights into rebalance orders
 """
 
@@ -16,7 +17,9 @@ from typing import Dict, List, Optional
 import numpy as np
 import torch
 import torch.nn as nn
-from scipy.optimize import minimize
+from portfolio_opt import SolveReport, max_sharpe_long_only, solve_max_sharpe  # noqa: F401 (max_sharpe_long_only re-exported)
+from rolling_cov import RollingCovariance
+from inference_engine import InferenceEngine
 
 
 np.set_printoptions(suppress=True, precision=6)
@@ -29,6 +32,22 @@ def window_normalize(w: torch.Tensor, eps: float = 1e-5) -> torch.Tensor:
     return (w - mu) / std
 
 
+def rolling_windows(X_TxF: torch.Tensor, seq_len: int) -> torch.Tensor:
+    """
+    All rolling windows of X as a strided view [T-seq_len+1, seq_len, F] (no copy), row i = X[i:i+seq_len].
+    """
+    return X_TxF.unfold(0, seq_len, 1).transpose(1, 2)
+
+
+def window_normalize_batch(w: torch.Tensor, eps: float = 1e-5) -> torch.Tensor:
+    """
+    Same as window_normalize, applied independently to every window of a [B, W, F] batch.
+    """
+    mu = w.mean(dim=1, keepdim=True)
+    std = w.std(dim=1, keepdim=True, unbiased=False).add(eps)
+    return (w - mu) / std
+
+
 class ReturnFullModel(nn.Module):
     """
     Must match train/infer model architecture for checkpoint compatibility.
@@ -105,77 +124,6 @@ class ReturnFullModel(nn.Module):
         return self.head(emb)
 
 
-def max_sharpe_long_only(
-    mu: np.ndarray,
-    Sigma: np.ndarray,
-    w_prev: Optional[np.ndarray] = None,
-    gamma_turn: float = 0.0,
-    turnover_l1: bool = False,
-    eps: float = 1e-8,
-) -> np.ndarray:
-    """
-    Same core logic as user's infer code.
-
-    maximize  Sharpe(w; mu, Sigma) - gamma_turn * penalty(w, w_prev)
-    s.t.      w >= 0, sum(w) = 1
-    """
-    mu = np.asarray(mu, dtype=np.float64)
-    Sigma = np.asarray(Sigma, dtype=np.float64)
-    n = mu.shape[0]
-    Sigma = Sigma + np.eye(n) * 1e-6
-
-    w0 = np.ones(n, dtype=np.float64) / n
-
-    if w_prev is not None:
-        w_prev = np.asarray(w_prev, dtype=np.float64).clip(0.0, 1.0)
-        s = w_prev.sum()
-        w_prev = (w_prev / s) if s > 0 else w0
-        w0 = w_prev.copy()
-
-    def neg_objective(w: np.ndarray) -> float:
-        num = float(np.dot(w, mu))
-        den = float(np.sqrt(np.dot(w, Sigma @ w) + eps))
-        sharpe = num / den
-
-        if (w_prev is None) or (gamma_turn <= 0.0):
-            pen = 0.0
-        else:
-            if turnover_l1:
-                pen = gamma_turn * float(np.sum(np.abs(w - w_prev)))
-            else:
-                d = (w - w_prev)
-                pen = gamma_turn * float(np.dot(d, d))
-        return -(sharpe - pen)
-
-    cons = ({"type": "eq", "fun": lambda w: np.sum(w) - 1.0},)
-    bounds = [(0.0, 1.0)] * n
-
-    res = minimize(
-        neg_objective,
-        w0,
-        method="SLSQP",
-        bounds=bounds,
-        constraints=cons,
-        options={"maxiter": 200, "ftol": 1e-9},
-    )
-    if (not res.success) or np.any(np.isnan(res.x)):
-        return w0
-
-    w = res.x.clip(0.0, 1.0)
-    s = w.sum()
-    return w0 if s <= 0 else (w / s)
-
-
-def estimate_cov_pastK(returns_TxN: np.ndarray, end_idx_inclusive: int, K: int) -> np.ndarray:
-    start = max(0, end_idx_inclusive - K + 1)
-    win = returns_TxN[start : end_idx_inclusive + 1]
-    n = returns_TxN.shape[1]
-    if win.shape[0] < 2:
-        return np.eye(n) * 1e-3
-    Sigma = np.cov(win, rowvar=False)
-    return Sigma + np.eye(n) * 1e-6
-
-
 @dataclass
 class RebalanceOrder:
     symbol: str
@@ -196,21 +144,30 @@ class MLReturnToWeightStrategy:
 
     def __init__(
         self,
-        ckpt_path: str,
+        ckpt_path: Optional[str],
         etf_symbols: List[str],
         num_feat: int = 22,
         seq_len: int = 20,
         cov_window: int = 60,
+        cov_method: str = "sample",
+        cov_ewma_lambda: float = 0.94,
         gamma_turn: float = 0.5,
         turnover_l1: bool = False,
         mu_ema: float = 0.0,
         min_trade_notional: float = 10.0,
         lot_size: float = 1e-6,
         device: str = "cpu",
+        infer_mode: str = "fp32",
     ):
         self.etf_symbols = etf_symbols
         self.seq_len = seq_len
         self.cov_window = int(cov_window)
+        self.cov_estimator = RollingCovariance(
+            n_assets=len(etf_symbols),
+            window=self.cov_window,
+            method=cov_method,
+            ewma_lambda=cov_ewma_lambda,
+        )
         self.gamma_turn = float(gamma_turn)
         self.turnover_l1 = bool(turnover_l1)
         self.mu_ema_alpha = float(mu_ema)
@@ -219,30 +176,101 @@ class MLReturnToWeightStrategy:
 
         self.device = torch.device(device if (device == "cpu" or torch.cuda.is_available()) else "cpu")
 
-        self.model = ReturnFullModel(
-            num_feat=num_feat,
-            seq_len=seq_len,
-            patch_size=5,
-            embed_dim=256,
-            enc_layers=6,
-            dropout=0.2,
-            out_dim=len(etf_symbols),
-        )
-        sd = torch.load(ckpt_path, map_location="cpu")
-        self.model.load_state_dict(sd, strict=True)
-        self.model.to(self.device).eval()
+        # ckpt_path=None builds a model-less strategy that serves mu from set_mu_cache() only
+        # (used by sweep workers sharing one set of predictions).
+        self.model: Optional[ReturnFullModel] = None
+        self.engine: Optional[InferenceEngine] = None
+        if ckpt_path is not None:
+            self.model = ReturnFullModel(
+                num_feat=num_feat,
+                seq_len=seq_len,
+                patch_size=5,
+                embed_dim=256,
+                enc_layers=6,
+                dropout=0.2,
+                out_dim=len(etf_symbols),
+            )
+            sd = torch.load(ckpt_path, map_location="cpu")
+            self.model.load_state_dict(sd, strict=True)
+            self.model.to(self.device).eval()
+            # fp32 = plain eager model (no engine, no probe); other modes are verified against it when built
+            if infer_mode != "fp32":
+                self.engine = InferenceEngine(self.model, mode=infer_mode)
 
         self.w_prev: Optional[np.ndarray] = None
         self.mu_ema_vec: Optional[np.ndarray] = None
+        self.last_solve: Optional[SolveReport] = None
+
+        # Raw model predictions for every window of a pack, row i <-> window X[i:i+seq_len] (see precompute_mu);
+        # mu_cache_X is that pack's X, used to check the windows predict_mu is handed
+        self.mu_cache: Optional[np.ndarray] = None
+        self.mu_cache_X: Optional[torch.Tensor] = None
+
+    def _infer(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model(x) if self.engine is None else self.engine(x)
 
     def reset(self) -> None:
+        # The mu cache depends only on the pack, so it survives a reset.
         self.w_prev = None
         self.mu_ema_vec = None
+        self.last_solve = None
+        self.cov_estimator.reset()
+
+    def precompute_mu(self, X_TxF: torch.Tensor, batch_size: int = 1024) -> np.ndarray:
+        """
+        Run the model once over every rolling window of X_TxF in large no-grad batches and cache
+        the raw r_hat matrix [T-seq_len+1, N]. Later predict_mu calls that pass t_idx_inclusive
+        only look rows up; the mu_ema smoothing is still applied causally step by step.
+        Batched inference is not bit-identical to one window at a time, so backtest results can
+        differ slightly (last decimals of the metrics) from a run without the cache.
+        """
+        if self.model is None:
+            raise RuntimeError("precompute_mu needs a model; this strategy was built without ckpt_path")
+        X = X_TxF.float()
+        if X.shape[0] < self.seq_len:
+            raise ValueError(f"Need at least seq_len={self.seq_len} rows to precompute mu, got {X.shape[0]}")
+
+        wins = rolling_windows(X, self.seq_len)
+        out_dim = len(self.etf_symbols)
+        mu_cache = np.empty((wins.shape[0], out_dim), dtype=np.float32)
 
-    def predict_mu(self, x_window_20xF: torch.Tensor) -> np.ndarray:
-        xw = window_normalize(x_window_20xF).unsqueeze(0).to(self.device)
         with torch.no_grad():
-            r_hat = self.model(xw).squeeze(0).cpu().numpy()
+            for start in range(0, wins.shape[0], int(batch_size)):
+                end = min(start + int(batch_size), wins.shape[0])
+                xb = window_normalize_batch(wins[start:end]).to(self.device)
+                mu_cache[start:end] = self._infer(xb).cpu().numpy()
+
+        self.mu_cache = mu_cache
+        self.mu_cache_X = X
+        return mu_cache
+
+    def set_mu_cache(self, mu_cache: np.ndarray, X_TxF: torch.Tensor) -> None:
+        """
+        Install a raw mu_hat matrix produced by precompute_mu (e.g. in another process)
+        together with the X_TxF it was computed from.
+        """
+        mu_cache = np.asarray(mu_cache, dtype=np.float32)
+        if mu_cache.ndim != 2 or mu_cache.shape[1] != len(self.etf_symbols):
+            raise ValueError(f"mu_cache must be [num_windows, {len(self.etf_symbols)}], got {mu_cache.shape}")
+        X = X_TxF.float()
+        if X.shape[0] - self.seq_len + 1 != mu_cache.shape[0]:
+            raise ValueError(f"mu_cache has {mu_cache.shape[0]} rows but X_TxF has {X.shape[0] - self.seq_len + 1} windows")
+        self.mu_cache = mu_cache
+        self.mu_cache_X = X
+
+    def predict_mu(self, x_window_20xF: torch.Tensor, t_idx_inclusive: Optional[int] = None) -> np.ndarray:
+        win_idx = None if t_idx_inclusive is None else int(t_idx_inclusive) - self.seq_len + 1
+        if (self.mu_cache is not None) and (win_idx is not None) and (0 <= win_idx < len(self.mu_cache)):
+            cached_x = self.mu_cache_X[win_idx : win_idx + self.seq_len]
+            if not torch.equal(x_window_20xF.float(), cached_x):
+                raise ValueError(f"x_window for t_idx={t_idx_inclusive} differs from the window mu_cache was computed on")
+            r_hat = self.mu_cache[win_idx].copy()
+        else:
+            if self.model is None:
+                raise RuntimeError(f"No model loaded and no cached mu for t_idx={t_idx_inclusive}")
+            xw = window_normalize(x_window_20xF).unsqueeze(0).to(self.device)
+            with torch.no_grad():
+                r_hat = self._infer(xw).squeeze(0).cpu().numpy()
 
         if self.mu_ema_alpha > 0.0:
             a = self.mu_ema_alpha
@@ -259,9 +287,11 @@ class MLReturnToWeightStrategy:
         all_returns_TxN: np.ndarray,
         t_idx_inclusive: int,
     ) -> np.ndarray:
-        mu = self.predict_mu(x_window_20xF)
-        Sigma = estimate_cov_pastK(all_returns_TxN, end_idx_inclusive=t_idx_inclusive, K=self.cov_window)
-        w = max_sharpe_long_only(
+        mu = self.predict_mu(x_window_20xF, t_idx_inclusive=t_idx_inclusive)
+        if self.cov_estimator.source is not all_returns_TxN:
+            self.cov_estimator.reset(all_returns_TxN)   # bind the (new) returns array explicitly
+        Sigma = self.cov_estimator.cov_at(end_idx_inclusive=t_idx_inclusive)
+        w, self.last_solve = solve_max_sharpe(
             mu=mu,
             Sigma=Sigma,
             w_prev=self.w_prev,
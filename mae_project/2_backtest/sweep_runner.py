@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter Sweep over the Backtest:
+- Loads the pack and the checkpoint ONCE and precomputes mu_hat for every window
+- Fans the grid (cov_window x gamma_turn x mu_ema x slippage_bps x fill probabilities x seeds)
+  out over a process pool; workers share the cached mu_hat and never load the model
+- Each run goes through backtest_runner.run_event_loop, so a sweep row reproduces
+  `backtest_runner.py --precompute_mu` with the same knobs and --seed
+- Writes one consolidated metrics table (one row per run, with its seed) + the sweep config
+"""
+
+import os
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+PT_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "data", "data_pt"))
+MODEL_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "model"))
+OUT_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "backtest_outputs", "sweep"))
+
+import argparse
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import torch
+
+from audit_sink import NullAuditSink
+from backtest_runner import build_execution_components, compute_metrics, run_event_loop
+from pack_io import PACK_FORMATS, find_pack, load_pack
+from strategy_ml_weights import MLReturnToWeightStrategy
+
+
+# Per-process state installed by _init_worker (pack + shared predictions)
+_WORKER: Dict[str, object] = {}
+
+
+def _parse_list(s: str, cast) -> list:
+    return [cast(x.strip()) for x in str(s).split(",") if x.strip()]
+
+
+def _parse_fill_probs(s: str) -> List[tuple]:
+    """
+    "0.7/0.2/0.1,1/0/0" -> [(0.7, 0.2, 0.1), (1.0, 0.0, 0.0)]  (full / partial / cancel)
+    """
+    out = []
+    for item in _parse_list(s, str):
+        parts = [float(x) for x in item.split("/")]
+        if len(parts) != 3:
+            raise ValueError(f"Bad fill probabilities '{item}', expected full/partial/cancel")
+        out.append(tuple(parts))
+    return out
+
+
+def build_grid(args) -> List[dict]:
+    keys = ["cov_window", "gamma_turn", "mu_ema", "slippage_bps", "fill_probs", "seed"]
+    values = [
+        _parse_list(args.cov_window, int),
+        _parse_list(args.gamma_turn, float),
+        _parse_list(args.mu_ema, float),
+        _parse_list(args.slippage_bps, float),
+        _parse_fill_probs(args.fill_probs),
+        _parse_list(args.seeds, int),
+    ]
+    grid = []
+    for run_id, combo in enumerate(itertools.product(*values)):
+        cfg = dict(zip(keys, combo))
+        p_full, p_partial, p_cancel = cfg.pop("fill_probs")
+        cfg.update({
+            "run_id": run_id,
+            "p_full_fill": p_full,
+            "p_partial_fill": p_partial,
+            "p_cancel": p_cancel,
+        })
+        grid.append(cfg)
+    return grid
+
+
+def _init_worker(pack: dict, etf_symbols: List[str], mu_cache: np.ndarray, base: dict) -> None:
+    # One BLAS/torch thread per worker; the pool provides the parallelism.
+    torch.set_num_threads(1)
+    _WORKER["pack"] = pack
+    _WORKER["etf_symbols"] = etf_symbols
+    _WORKER["mu_cache"] = mu_cache
+    _WORKER["base"] = base
+
+
+def run_one(cfg: dict) -> dict:
+    pack = _WORKER["pack"]
+    etf_symbols = _WORKER["etf_symbols"]
+    base = _WORKER["base"]
+
+    t0 = time.perf_counter()
+    gateway, order_book, order_manager, matching_engine = build_execution_components(
+        pack=pack,
+        etf_symbols=etf_symbols,
+        seed=cfg["seed"],
+        p_full_fill=cfg["p_full_fill"],
+        p_partial_fill=cfg["p_partial_fill"],
+        p_cancel=cfg["p_cancel"],
+        slippage_bps=cfg["slippage_bps"],
+        audit_sink=NullAuditSink(),
+    )
+    strategy = MLReturnToWeightStrategy(
+        ckpt_path=None,
+        etf_symbols=etf_symbols,
+        num_feat=int(pack["X"].shape[1]),
+        seq_len=20,
+        cov_window=cfg["cov_window"],
+        cov_method=base["cov_method"],
+        cov_ewma_lambda=base["cov_ewma_lambda"],
+        gamma_turn=cfg["gamma_turn"],
+        turnover_l1=base["turnover_l1"],
+        mu_ema=cfg["mu_ema"],
+        min_trade_notional=base["min_trade_notional"],
+    )
+    strategy.set_mu_cache(_WORKER["mu_cache"], pack["X"])
+
+    daily_log, order_log, trade_log = run_event_loop(
+        pack=pack,
+        etf_symbols=etf_symbols,
+        gateway=gateway,
+        strategy=strategy,
+        order_book=order_book,
+        order_manager=order_manager,
+        matching_engine=matching_engine,
+        initial_cash=base["initial_cash"],
+    )
+
+    metrics = compute_metrics(
+        port_ret=daily_log.column("realized_ret_next"),
+        weights=daily_log.column("actual_weights_after_rebalance"),
+    )
+
+    return {
+        **cfg,
+        **metrics,
+        "n_days": len(daily_log),
+        "n_orders": int((order_log.column("status") == "sent").sum()),
+        "n_trades": len(trade_log),
+        "wall_s": time.perf_counter() - t0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Grid sweep over backtest knobs with one pack/model load")
+    ap.add_argument("--pt_dir", type=str, default=PT_DIR)
+    ap.add_argument("--split", type=str, default="test", choices=["train", "val", "test"])
+    ap.add_argument("--pack_format", type=str, default="auto", choices=list(PACK_FORMATS))
+    ap.add_argument("--ckpt", type=str, default=os.path.join(MODEL_DIR, "downstream_return_full.pth"))
+    ap.add_argument("--out_dir", type=str, default=OUT_DIR)
+    ap.add_argument("--initial_cash", type=float, default=100000.0)
+    ap.add_argument("--device", type=str, default="cpu")
+    ap.add_argument("--infer_batch_size", type=int, default=1024)
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+
+    # Swept knobs: comma-separated lists (a single value = fixed)
+    ap.add_argument("--cov_window", type=str, default="60")
+    ap.add_argument("--gamma_turn", type=str, default="0.5")
+    ap.add_argument("--mu_ema", type=str, default="0.0")
+    ap.add_argument("--slippage_bps", type=str, default="2.0")
+    ap.add_argument("--fill_probs", type=str, default="0.7/0.2/0.1", help="full/partial/cancel triples, comma-separated")
+    ap.add_argument("--seeds", type=str, default="42", help="matching-engine seeds; every grid point runs once per seed")
+
+    # Fixed knobs (same meaning as backtest_runner.py)
+    ap.add_argument("--cov_method", type=str, default="sample", choices=["sample", "ewma", "ledoit_wolf"])
+    ap.add_argument("--cov_ewma_lambda", type=float, default=0.94)
+    ap.add_argument("--turnover_l1", action="store_true")
+    ap.add_argument("--min_trade_notional", type=float, default=10.0)
+    args = ap.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # Load pack + model once
+    pack_path = find_pack(args.pt_dir, args.split, fmt=args.pack_format)
+    pack = load_pack(pack_path)
+    meta = pack.get("meta", {})
+    etf_symbols = meta.get("etfs", None)
+    if not etf_symbols:
+        raise ValueError("Pack meta['etfs'] missing")
+    if len(pack["dates"]) < 21:
+        raise ValueError(f"Need at least 21 rows in pack, got {len(pack['dates'])}")
+    print(f"[PACK] {pack_path}")
+
+    predictor = MLReturnToWeightStrategy(
+        ckpt_path=args.ckpt,
+        etf_symbols=etf_symbols,
+        num_feat=int(pack["X"].shape[1]),
+        seq_len=20,
+        device=args.device,
+    )
+    t0 = time.perf_counter()
+    mu_cache = predictor.precompute_mu(pack["X"].float(), batch_size=args.infer_batch_size)
+    print(f"[MU] precomputed mu_hat for {mu_cache.shape[0]} windows in {time.perf_counter() - t0:.2f}s")
+    del predictor
+
+    grid = build_grid(args)
+    base = {
+        "cov_method": args.cov_method,
+        "cov_ewma_lambda": args.cov_ewma_lambda,
+        "turnover_l1": bool(args.turnover_l1),
+        "min_trade_notional": args.min_trade_notional,
+        "initial_cash": args.initial_cash,
+    }
+    print(f"[SWEEP] runs={len(grid)} workers={args.workers}")
+
+    rows: List[dict] = []
+    t0 = time.perf_counter()
+    if args.workers <= 1:
+        _init_worker(pack, etf_symbols, mu_cache, base)
+        for cfg in grid:
+            rows.append(run_one(cfg))
+            print(f"  run {cfg['run_id']:04d} done Sharpe={rows[-1]['Sharpe']:.4f}")
+    else:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(pack, etf_symbols, mu_cache, base),
+        ) as pool:
+            futures = [pool.submit(run_one, cfg) for cfg in grid]
+            for fut in as_completed(futures):
+                rows.append(fut.result())
+                print(f"  run {rows[-1]['run_id']:04d} done Sharpe={rows[-1]['Sharpe']:.4f}")
+    print(f"[SWEEP] finished in {time.perf_counter() - t0:.2f}s")
+
+    table = pd.DataFrame(rows).sort_values("run_id").reset_index(drop=True)
+    table_csv = os.path.join(args.out_dir, "sweep_metrics.csv")
+    table.to_csv(table_csv, index=False)
+
+    config_path = os.path.join(args.out_dir, "sweep_config.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({"pack": pack_path, "ckpt": args.ckpt, "args": vars(args), "n_runs": len(grid)}, f, indent=2)
+
+    show = ["run_id", "seed", "cov_window", "gamma_turn", "mu_ema", "slippage_bps", "p_full_fill", "Sharpe", "AnnRet", "MaxDD", "AvgTurnover"]
+    print("\n" + table[show].sort_values("Sharpe", ascending=False).head(20).to_string(index=False))
+
+    print("\n[SAVED]")
+    print(f"  Metrics table: {table_csv}")
+    print(f"  Config:        {config_path}")
+
+
+if __name__ == "__main__":
+    main()